@@ -11,6 +11,230 @@ def needs_arg_ptr_stub(decl):
             res = True
     return(res)
 
+def pointer_length(arg):
+    # The byte length of a pointer arg, as a C expression of the other args.
+    # NOTE: each factor is widened to u64, so that a negative count is out of bounds
+    #       instead of wrapping around to a small length
+    argLen = arg['len']
+    typeCName = arg['type'].get('cname', arg['type']['name'])
+
+    factors = []
+    proc = argLen.get('proc')
+    if proc != None:
+        factors.append(proc + '(runtime, ' + ', '.join(argLen['args']) + ')')
+    else:
+        components =  argLen.get('components')
+        countArg = argLen.get('count')
+
+        if components != None:
+            factors.append(str(components))
+        if countArg != None:
+            factors.append(countArg)
+
+    if typeCName.endswith('**') or (typeCName.startswith('void') == False and typeCName.startswith('const void') == False):
+        factors.append('sizeof('+typeCName[:-1]+')')
+
+    return '*'.join('(u64)(' + f + ')' for f in factors)
+
+def gen_capture(apiName, declIndex, decl, argLengths, indent):
+    # Records a call when capturing, with the bytes behind its pointer args.
+    s = '#if OC_BINDGEN_CAPTURE\n'
+    s += indent + 'if(oc_bindgen_capture_enabled())\n'
+    s += indent + '{\n'
+    s += indent + '\toc_bindgen_capture_call(OC_BINDGEN_API_' + apiName.upper() + ', ' + str(declIndex) + ');\n'
+    for arg in decl['args']:
+        argName = arg['name']
+        if arg['type']['tag'] == 'p':
+            s += indent + '\toc_bindgen_capture_buffer(' + argName + ', ' + argLengths.get(argName, '0') + ');\n'
+        else:
+            s += indent + '\toc_bindgen_capture_write(&' + argName + ', sizeof(' + argName + '));\n'
+    s += indent + '}\n'
+    s += '#endif\n'
+    return s
+
+def gen_guest_wrapper(decl, importName, prologue):
+    # Declares a guest import under another name, and defines the function
+    # itself as prologue followed by a call to the import.
+    name = decl['name']
+    params = ', '.join(arg['type']['name'] + ' ' + arg['name'] for arg in decl['args'])
+    if params == '':
+        params = 'void'
+
+    s = decl['ret']['name'] + ' ORCA_IMPORT_AS(' + name + ', ' + importName + ')(' + params + ');\n\n'
+    s += decl['ret']['name'] + ' ' + name + '(' + params + ')\n'
+    s += '{\n'
+    s += '\t' + prologue
+    s += '\t'
+    if decl['ret']['tag'] != 'v':
+        s += 'return '
+    s += importName + '(' + ', '.join(arg['name'] for arg in decl['args']) + ');\n'
+    s += '}\n'
+    return s
+
+def is_batchable(decl, exclude):
+    # A call can be batched if it doesn't return anything or write to the guest's memory,
+    # and the length of each of its buffers only depends on its other args.
+    if decl['name'] in exclude or decl['ret']['tag'] != 'v' or decl.get('gen_stub', True) == False:
+        return False
+    for arg in decl['args']:
+        tag = arg['type']['tag']
+        typeCName = arg['type'].get('cname', arg['type']['name'])
+        if tag == 'S':
+            return False
+        if tag == 'p':
+            argLen = arg.get('len')
+            if argLen == None or argLen.get('proc') != None:
+                return False
+            if typeCName.startswith('const') == False or typeCName.count('*') > 1:
+                return False
+    return True
+
+BATCH_SCALARS = {
+    'i': ('i32', 4),
+    'I': ('i64', 8),
+    'f': ('f32', 4),
+    'F': ('f64', 8),
+}
+
+def gen_batch_stubs(apiName, data, path, exclude):
+    # Guest functions that encode batchable calls into the command buffer (see graphics/orca_gles_batch.c),
+    # and flush it before making the other ones. Each function's command is its index in the spec,
+    # followed by its args in order.
+    prefix = 'oc_' + apiName + '_batch_'
+
+    s = '#if OC_' + apiName.upper() + '_BATCH\n\n'
+
+    for declIndex, decl in enumerate(data):
+        name = decl['name']
+        importName = name + '_import'
+
+        if not is_batchable(decl, exclude):
+            s += gen_guest_wrapper(decl, importName, prefix + 'flush();\n') + '\n'
+            continue
+
+        params = ', '.join(arg['type']['name'] + ' ' + arg['name'] for arg in decl['args'])
+        if params == '':
+            params = 'void'
+
+        s += 'void ORCA_IMPORT_AS(' + name + ', ' + importName + ')(' + params + ');\n\n'
+        s += 'void ' + name + '(' + params + ')\n'
+        s += '{\n'
+
+        size = ['4']
+        for arg in decl['args']:
+            tag = arg['type']['tag']
+            if tag == 'p':
+                s += '\tu64 _' + arg['name'] + 'Len = ' + pointer_length(arg) + ';\n'
+                size.append(prefix + 'buffer_size(_' + arg['name'] + 'Len)')
+            else:
+                size.append(str(BATCH_SCALARS[tag][1]))
+
+        s += '\tchar* _cmd = ' + prefix + 'begin(' + str(declIndex) + ', ' + ' + '.join(size) + ');\n'
+        s += '\tif(_cmd)\n'
+        s += '\t{\n'
+        for arg in decl['args']:
+            tag = arg['type']['tag']
+            if tag == 'p':
+                s += '\t\t_cmd = ' + prefix + 'write_buffer(_cmd, ' + arg['name'] + ', _' + arg['name'] + 'Len);\n'
+            else:
+                scalarType = BATCH_SCALARS[tag][0]
+                s += '\t\t_cmd = ' + prefix + 'write_' + scalarType + '(_cmd, (' + scalarType + ')' + arg['name'] + ');\n'
+        s += '\t\t' + prefix + 'end(_cmd);\n'
+        s += '\t}\n'
+        s += '\telse\n'
+        s += '\t{\n'
+        s += '\t\t' + importName + '(' + ', '.join(arg['name'] for arg in decl['args']) + ');\n'
+        s += '\t}\n'
+        s += '}\n\n'
+
+    s += '#endif // OC_' + apiName.upper() + '_BATCH\n'
+
+    with open(path, 'w') as f:
+        print(s, file=f)
+
+def gen_batch_execute(apiName, data, exclude, profile, capture):
+    # Host side of the batch: decodes a command buffer submitted by the guest and makes its calls, checking
+    # that each buffer is as long as the call expects, as the stubs' bounds checks do for pointer args.
+    s = 'static void bindgen_' + apiName + '_api_batch_execute(oc_bindgen_batch_reader* reader)\n{\n'
+    s += '\twhile(reader->ptr < reader->end)\n'
+    s += '\t{\n'
+    s += '\t\tu32 _command = (u32)oc_bindgen_batch_read_i32(reader);\n'
+    s += '\t\tswitch(_command)\n'
+    s += '\t\t{\n'
+
+    for declIndex, decl in enumerate(data):
+        if not is_batchable(decl, exclude):
+            continue
+
+        cname = decl.get('cname', decl['name'])
+
+        s += '\t\t\tcase ' + str(declIndex) + ':\n'
+        s += '\t\t\t{\n'
+
+        if profile:
+            s += '#if OC_BINDGEN_PROFILE\n'
+            s += '\t\t\t\tf64 _profileStart = oc_clock_time(OC_CLOCK_MONOTONIC);\n'
+            s += '#endif\n'
+
+        argLengths = {}
+        for arg in decl['args']:
+            argName = arg['name']
+            tag = arg['type']['tag']
+            typeCName = arg['type'].get('cname', arg['type']['name'])
+            if tag == 'p':
+                s += '\t\t\t\tu32 _' + argName + 'Size = 0;\n'
+                s += '\t\t\t\t' + typeCName + ' ' + argName + ' = (' + typeCName + ')oc_bindgen_batch_read_buffer(reader, &_' + argName + 'Size);\n'
+                argLengths[argName] = pointer_length(arg)
+            else:
+                s += '\t\t\t\t' + typeCName + ' ' + argName + ' = (' + typeCName + ')oc_bindgen_batch_read_' + BATCH_SCALARS[tag][0] + '(reader);\n'
+
+        for argName, length in argLengths.items():
+            s += '\t\t\t\tif(oc_unlikely(_' + argName + 'Size < ' + length + '))\n'
+            s += '\t\t\t\t{\n'
+            s += '\t\t\t\t\toc_bindgen_batch_fail(reader, "' + cname + ': parameter \\\'' + argName + '\\\' is too short");\n'
+            s += '\t\t\t\t}\n'
+
+        if capture:
+            s += gen_capture(apiName, declIndex, decl, argLengths, '\t\t\t\t')
+
+        s += '\t\t\t\t' + cname + '(' + ', '.join(arg['name'] for arg in decl['args']) + ');\n'
+
+        if profile:
+            s += '#if OC_BINDGEN_PROFILE\n'
+            s += '\t\t\t\toc_bindgen_profile_record(&bindgen_' + apiName + '_api_profile[' + str(declIndex) + '], _profileStart);\n'
+            s += '#endif\n'
+
+        s += '\t\t\t}\n'
+        s += '\t\t\tbreak;\n\n'
+
+    s += '\t\t\tdefault:\n'
+    s += '\t\t\t\toc_bindgen_batch_fail(reader, "unknown ' + apiName + ' command");\n'
+    s += '\t\t\t\treturn;\n'
+    s += '\t\t}\n'
+    s += '\t}\n'
+    s += '}\n\n'
+
+    # the one import the guest calls to submit its command buffer
+    s += 'const void* oc_' + apiName + '_batch_submit_stub(IM3Runtime runtime, IM3ImportContext _ctx, uint64_t* _sp, void* _mem)\n'
+    s += '{\n'
+    s += '\tu64 _memSize = m3_GetMemorySize(runtime);\n'
+    s += '\tu32 offset = *(u32*)&_sp[0];\n'
+    s += '\tu32 size = *(u32*)&_sp[1];\n'
+    s += '\tif(oc_unlikely(!oc_bindgen_in_bounds(_memSize, (u64)offset, (u64)size)))\n'
+    s += '\t{\n'
+    s += '\t\toc_bindgen_bounds_fail(__FILE__, __FUNCTION__, __LINE__, "command buffer");\n'
+    s += '\t}\n'
+    s += '\toc_bindgen_batch_reader reader = {\n'
+    s += '\t\t.start = (char*)_mem + offset,\n'
+    s += '\t\t.ptr = (char*)_mem + offset,\n'
+    s += '\t\t.end = (char*)_mem + offset + size,\n'
+    s += '\t};\n'
+    s += '\tbindgen_' + apiName + '_api_batch_execute(&reader);\n'
+    s += '\treturn(0);\n'
+    s += '}\n'
+
+    return s
+
 def printError(str):
     # This prints a string with a red foreground color.
     # See this link for an explanation of console escape codes: https://stackabuse.com/how-to-print-colored-text-in-python/
@@ -21,6 +245,12 @@ def bindgen(apiName, spec, **kwargs):
     guest_stubs_path = kwargs.get("guest_stubs")
     guest_include = kwargs.get("guest_include")
     wasm3_bindings_path = kwargs.get("wasm3_bindings")
+    profile = kwargs.get("profile", False)
+    capture = kwargs.get("capture", False)
+    # (macro, function): with macro set, the guest stubs call function before each import
+    guest_flush = kwargs.get("guest_flush")
+    batch_stubs_path = kwargs.get("batch_stubs")
+    batch_exclude = kwargs.get("batch_exclude", [])
 
     if guest_stubs_path == None:
         guest_stubs_path = 'bindgen_' + apiName + '_guest_stubs.c'
@@ -39,9 +269,22 @@ def bindgen(apiName, spec, **kwargs):
             if guest_include != None:
                 s = '#include"' + guest_include + '"\n\n'
                 print(s, file=guest_bindings)
+            if guest_flush != None:
+                flushMacro, flushProc = guest_flush
+                print('#if ' + flushMacro + '\nvoid ' + flushProc + '(void);\n#endif\n', file=guest_bindings)
             break
 
-    for decl in data:
+    if profile:
+        # per-stub call counts and host time, only compiled in with OC_BINDGEN_PROFILE
+        s = '#if OC_BINDGEN_PROFILE\n'
+        s += 'static oc_bindgen_profile_entry bindgen_' + apiName + '_api_profile[] = {\n'
+        for decl in data:
+            s += '    { "' + decl['name'] + '" },\n'
+        s += '};\n'
+        s += '#endif\n'
+        print(s, file=host_bindings)
+
+    for declIndex, decl in enumerate(data):
 
         name = decl['name']
         cname = decl.get('cname', name)
@@ -85,6 +328,10 @@ def bindgen(apiName, spec, **kwargs):
                     s += ', '
             s += ')\n'
             s += '{\n'
+            if guest_flush != None:
+                s += '#if ' + guest_flush[0] + '\n'
+                s += '\t' + guest_flush[1] + '();\n'
+                s += '#endif\n'
             s += '\t'
             if decl['ret']['tag'] == 'S':
                 s += decl['ret']['name'] + ' __ret;\n\t'
@@ -112,6 +359,14 @@ def bindgen(apiName, spec, **kwargs):
 
             print(s, file=guest_bindings)
 
+        elif guest_flush != None and guest_bindings != None:
+            # wrap the import, under another name, so that it can call the flush function first.
+            # Otherwise the function's own declaration is imported as usual.
+            s = '#if ' + guest_flush[0] + '\n'
+            s += gen_guest_wrapper(decl, name + '_import', guest_flush[1] + '();\n')
+            s += '#endif\n'
+            print(s, file=guest_bindings)
+
         # host-side stub
         s = 'const void* ' + cname + '_stub(IM3Runtime runtime, IM3ImportContext _ctx, uint64_t* _sp, void* _mem)'
 
@@ -121,10 +376,20 @@ def bindgen(apiName, spec, **kwargs):
         else:
             s += '\n{\n'
 
+            if profile:
+                s += '#if OC_BINDGEN_PROFILE\n'
+                s += '\tf64 _profileStart = oc_clock_time(OC_CLOCK_MONOTONIC);\n'
+                s += '#endif\n'
 
             # NOTE: check and cast arguments
             retTag = decl['ret']['tag']
 
+            # NOTE: bounds checks, as (wasm offset, length, what). The memory size is read once, and each
+            #       pointer is checked with a single range comparison (see oc_bindgen_in_bounds())
+            checks = []
+            argLengths = {}
+            body = ''
+
             firstArgIndex = 0
             if retTag != 'v':
                 firstArgIndex = 1
@@ -132,12 +397,8 @@ def bindgen(apiName, spec, **kwargs):
                 if retTag == 'S':
                     retTypeName = decl['ret']['name']
                     retTypeCName = decl['ret'].get('cname', retTypeName)
-                    s += retTypeCName + '* __retPtr = (' + retTypeCName + '*)((char*)_mem + *(i32*)&_sp[0]);\n'
-
-                    s += '\t{\n'
-                    s += '\t\tOC_ASSERT_DIALOG(((char*)__retPtr >= (char*)_mem) && (((char*)__retPtr - (char*)_mem) < m3_GetMemorySize(runtime)), "return pointer is out of bounds");\n'
-                    s += '\t\tOC_ASSERT_DIALOG((char*)__retPtr + sizeof(' + retTypeCName + ') <= ((char*)_mem + m3_GetMemorySize(runtime)), "return pointer is out of bounds");\n'
-                    s += '\t}\n'
+                    body += '\t' + retTypeCName + '* __retPtr = (' + retTypeCName + '*)((char*)_mem + *(u32*)&_sp[0]);\n'
+                    checks.append(('*(u32*)&_sp[0]', 'sizeof(' + retTypeCName + ')', 'return pointer'))
 
             for argIndex, arg in enumerate(decl['args']):
 
@@ -146,26 +407,26 @@ def bindgen(apiName, spec, **kwargs):
                 typeCName = arg['type'].get('cname', typeName)
                 argTag = arg['type']['tag']
 
-                s += '\t'
+                body += '\t'
 
                 if argTag == 'i':
-                    s += typeCName + ' ' + argName + ' = ('+typeCName+')*(i32*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
+                    body += typeCName + ' ' + argName + ' = ('+typeCName+')*(i32*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
                 elif argTag == 'I':
-                    s += typeCName + ' ' + argName + ' = ('+typeCName+')*(i64*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
+                    body += typeCName + ' ' + argName + ' = ('+typeCName+')*(i64*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
                 elif argTag == 'f':
-                    s += typeCName + ' ' + argName + ' = ('+typeCName+')*(f32*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
+                    body += typeCName + ' ' + argName + ' = ('+typeCName+')*(f32*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
                 elif argTag == 'F':
-                    s += typeCName + ' ' + argName + ' = ('+typeCName+')*(f64*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
+                    body += typeCName + ' ' + argName + ' = ('+typeCName+')*(f64*)&_sp[' + str(firstArgIndex + argIndex) + '];\n'
                 elif argTag == 'p':
-                    s += typeCName + ' ' + argName + ' = ('+ typeCName +')((char*)_mem + *(u32*)&_sp[' + str(firstArgIndex + argIndex) + ']);\n'
+                    body += typeCName + ' ' + argName + ' = ('+ typeCName +')((char*)_mem + *(u32*)&_sp[' + str(firstArgIndex + argIndex) + ']);\n'
                 elif argTag == 'S':
-                    s += typeCName + ' ' + argName + ' = *('+ typeCName +'*)((char*)_mem + *(u32*)&_sp[' + str(firstArgIndex + argIndex) + ']);\n'
+                    body += typeCName + ' ' + argName + ' = *('+ typeCName +'*)((char*)_mem + *(u32*)&_sp[' + str(firstArgIndex + argIndex) + ']);\n'
                 else:
                     print('unrecognized type ' + c + ' in procedure signature\n')
                     break
 
             # check pointer arg length
-            for arg in decl['args']:
+            for argIndex, arg in enumerate(decl['args']):
 
                 argName = arg['name']
                 typeName = arg['type']['name']
@@ -177,35 +438,24 @@ def bindgen(apiName, spec, **kwargs):
                     if argLen == None:
                         printError("binding '" + name + "' missing pointer length decoration for param '" + argName + "'")
                     else:
-                        s += '\t{\n'
-                        s += '\t\tOC_ASSERT_DIALOG(((char*)'+ argName + ' >= (char*)_mem) && (((char*)'+ argName +' - (char*)_mem) < m3_GetMemorySize(runtime)), "parameter \''+argName+'\' is out of bounds");\n'
-                        s += '\t\tOC_ASSERT_DIALOG((char*)' + argName + ' + '
-
-                        proc = argLen.get('proc')
-                        if proc != None:
-                            s += proc + '(runtime, '
-                            lenProcArgs = argLen['args']
-                            for i, lenProcArg in enumerate(lenProcArgs):
-                                s += lenProcArg
-                                if i < len(lenProcArgs)-1:
-                                    s += ', '
-                            s += ')'
-                        else:
-                            components =  argLen.get('components')
-                            countArg = argLen.get('count')
-
-                            if components != None:
-                                s += str(components)
-                                if countArg != None:
-                                    s += '*'
-                            if countArg != None:
-                                s += countArg
-
-                        if typeCName.endswith('**') or (typeCName.startswith('void') == False and typeCName.startswith('const void') == False):
-                            s += '*sizeof('+typeCName[:-1]+')'
-
-                        s += ' <= ((char*)_mem + m3_GetMemorySize(runtime)), "parameter \''+argName+'\' is out of bounds");\n'
-                        s += '\t}\n'
+                        argLengths[argName] = pointer_length(arg)
+                        checks.append(('*(u32*)&_sp[' + str(firstArgIndex + argIndex) + ']',
+                                       argLengths[argName],
+                                       "parameter \\'" + argName + "\\'"))
+
+            if len(checks):
+                s += '\tu64 _memSize = m3_GetMemorySize(runtime);\n'
+            s += body
+
+            for offset, length, what in checks:
+                s += '\tif(oc_unlikely(!oc_bindgen_in_bounds(_memSize, (u64)' + offset + ', ' + length + ')))\n'
+                s += '\t{\n'
+                s += '\t\toc_bindgen_bounds_fail(__FILE__, __FUNCTION__, __LINE__, "' + what + '");\n'
+                s += '\t}\n'
+
+            if capture:
+                # record the call, with the bytes behind its pointer args, before making it
+                s += gen_capture(apiName, declIndex, decl, argLengths, '\t')
 
             s += '\t'
 
@@ -230,15 +480,19 @@ def bindgen(apiName, spec, **kwargs):
                 if i+1 < len(decl['args']):
                     s += ', '
 
-            s += ');\n\treturn(0);\n}\n\n'
+            s += ');\n'
 
-        print(s, file=host_bindings)
+            if profile:
+                s += '#if OC_BINDGEN_PROFILE\n'
+                s += '\toc_bindgen_profile_record(&bindgen_' + apiName + '_api_profile[' + str(declIndex) + '], _profileStart);\n'
+                s += '#endif\n'
+
+            s += '\treturn(0);\n}\n\n'
 
-    # link function
-    s = 'int bindgen_link_' + apiName + '_api(IM3Module module)\n{\n'
-    s += '  M3Result res;\n'
-    s += '  int ret = 0;\n'
+        print(s, file=host_bindings)
 
+    # import table, sorted by name so that oc_bindgen_link_imports() can binary search it
+    imports = []
     for decl in data:
         name = decl['name']
         cname = decl.get('cname', name)
@@ -262,15 +516,58 @@ def bindgen(apiName, spec, **kwargs):
             m3Sig += tag
         m3Sig += ')'
 
+        imports.append((name, m3Sig, cname + '_stub'))
+
+    if batch_stubs_path != None:
+        gen_batch_stubs(apiName, data, batch_stubs_path, batch_exclude)
+        print(gen_batch_execute(apiName, data, batch_exclude, profile, capture), file=host_bindings)
+        imports.append(('oc_' + apiName + '_batch_submit', 'v(ii)', 'oc_' + apiName + '_batch_submit_stub'))
+
+    s = 'static const oc_bindgen_import bindgen_' + apiName + '_api_imports[] = {\n'
+    for name, m3Sig, stub in sorted(imports):
+        s += '    { "' + name + '", "' + m3Sig + '", ' + stub + ' },\n'
+    s += '};\n'
+
+    print(s, file=host_bindings)
+
+    if capture:
+        gen_replay(apiName, data, host_bindings)
 
-        s += '  res = m3_LinkRawFunction(module, "*", "' + name + '", "' + m3Sig + '", ' + cname + '_stub);\n'
-        s += '  if(res != m3Err_none && res != m3Err_functionLookupFailed)\n'
-        s += '  {\n'
-        s += '      oc_log_error("Couldn\'t link function ' + name + ' (%s)\\n", res);\n'
-        s += '      ret = -1;\n'
-        s += '  }\n\n'
 
-    s += '\treturn(ret);\n}\n'
+def gen_replay(apiName, data, host_bindings):
+    # Replays a call recorded by a capturing stub, reading its args back in the same order. Pointer args
+    # point to their bytes in the trace.
+    s = '#if OC_BINDGEN_CAPTURE\n'
+    s += 'void bindgen_' + apiName + '_api_replay(u32 index, oc_bindgen_replay_reader* reader)\n{\n'
+    s += '\tswitch(index)\n'
+    s += '\t{\n'
+
+    for declIndex, decl in enumerate(data):
+        if decl.get('gen_stub', True) == False:
+            continue
+
+        cname = decl.get('cname', decl['name'])
+
+        s += '\t\tcase ' + str(declIndex) + ':\n'
+        s += '\t\t{\n'
+        for arg in decl['args']:
+            argName = arg['name']
+            typeCName = arg['type'].get('cname', arg['type']['name'])
+            if arg['type']['tag'] == 'p':
+                s += '\t\t\t' + typeCName + ' ' + argName + ' = (' + typeCName + ')oc_bindgen_replay_buffer(reader, 0);\n'
+            else:
+                s += '\t\t\t' + typeCName + ' ' + argName + ';\n'
+                s += '\t\t\toc_bindgen_replay_read(reader, &' + argName + ', sizeof(' + argName + '));\n'
+        s += '\t\t\t' + cname + '(' + ', '.join(arg['name'] for arg in decl['args']) + ');\n'
+        s += '\t\t}\n'
+        s += '\t\tbreak;\n\n'
+
+    s += '\t\tdefault:\n'
+    s += '\t\t\toc_bindgen_replay_fail(reader, "unknown ' + apiName + ' function");\n'
+    s += '\t\t\tbreak;\n'
+    s += '\t}\n'
+    s += '}\n'
+    s += '#endif\n'
 
     print(s, file=host_bindings)
 
@@ -282,6 +579,11 @@ if __name__ == "__main__":
     parser.add_argument('-g', '--guest-stubs')
     parser.add_argument('--guest-include')
     parser.add_argument('--wasm3-bindings')
+    parser.add_argument('--guest-flush', nargs=2, metavar=('MACRO', 'FUNCTION'), help='a function the guest stubs call before each import when MACRO is set, e.g. to flush batched calls')
+    parser.add_argument('--batch-stubs', help='also generate guest stubs that batch the calls into a command buffer, and the host code that executes it')
+    parser.add_argument('--batch-exclude', nargs='*', default=[], help='functions that always flush the command buffer and make their call directly')
+    parser.add_argument('--profile', action='store_true', help='instrument the host stubs with call counts and host time (compiled in with OC_BINDGEN_PROFILE)')
+    parser.add_argument('--capture', action='store_true', help='generate host call capture in the stubs, and a replay function (compiled in with OC_BINDGEN_CAPTURE)')
 
     args = parser.parse_args()
 
@@ -298,5 +600,10 @@ if __name__ == "__main__":
     bindgen(apiName, spec,
         guest_stubs=guest_stubs_path,
         guest_include=args.guest_include,
+        guest_flush=args.guest_flush,
         wasm3_bindings=wasm3_bindings_path,
+        profile=args.profile,
+        capture=args.capture,
+        batch_stubs=args.batch_stubs,
+        batch_exclude=args.batch_exclude,
     )
@@ -1,12 +1,38 @@
 #!/usr/bin/env python3
 
+import hashlib
+import json
 import os
 import platform
 import shutil
-import subprocess
-from argparse import ArgumentParser
-
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+
+from .fonts import parse_charset, subset_font_file
+from .icons import make_icon
+from .images import IMAGE_MANIFEST_NAME, image_manifest_json, predecode_images
 from .log import *
+from .pack import PACK_NAME, pack_key, read_pack_key, write_pack
+from .sync import Sync, SyncStats
+from .wasm import WASM_DEBUG_SECTIONS, print_section_sizes, read_sections, strip_sections, write_module
+
+
+# Records what was copied into a bundle, so --incremental can skip unchanged files.
+BUNDLE_MANIFEST = '.orcabundle'
+
+# Where --manifest stages the runtime files shared by all the apps it bundles, under the output directory.
+BUNDLE_STAGE_DIR = '.orcastage'
+
+# Options of an app listed in a --manifest file that are paths, relative to the manifest.
+APP_MANIFEST_PATHS = ['module', 'icon', 'out_dir', 'orca_dir', 'resource_files', 'resource_dirs']
+
+
+class BundleError(Exception):
+	# An app that can't be bundled. Raised instead of exiting, so that --manifest can carry
+	# on with the other apps.
+	pass
 
 
 def attach_bundle_commands(subparsers):
@@ -23,22 +49,54 @@ def init_parser(parser):
 	parser.add_argument("-O", "--orca-dir", default=".")
 	parser.add_argument("--version", default="0.0.0", help="a version number to embed in the application bundle")
 	parser.add_argument("--mtl-enable-capture", action='store_true', help="Enable Metal frame capture for the application bundle (macOS only)")
-	parser.add_argument("module", help="a .wasm file containing the application's wasm module")
-	parser.set_defaults(func=shellish(make_app))
+	parser.add_argument("--link-resources", action='store_true', help="hardlink resources into the bundle instead of copying them where possible; edits to the resources will then show up in the bundle (for development)")
+	parser.add_argument("--pack-resources", action='store_true', help="store the app's resources in a single memory-mapped archive instead of as loose files")
+	parser.add_argument("--compress-resources", action='store_true', help="zlib-compress packed resources where it saves enough space (implies --pack-resources)")
+	parser.add_argument("--predecode-images", action='store_true', help="decode PNG resources to raw RGBA pixels at bundle time, so the app doesn't decode them at startup; makes the bundle larger, which --compress-resources partly makes up for")
+	parser.add_argument("--font-subset", metavar="CHARSET", help="only keep the glyphs of some characters in the bundled fonts: a file containing them, or a comma-separated list of ascii, latin-1, latin-ext and U+XXXX[-YYYY] ranges")
+	parser.add_argument("--strip", action='store_true', help="strip debug info and other custom sections from the wasm module, keeping the original next to the bundle")
+	parser.add_argument("--strip-section", action='append', dest="strip_sections", metavar="NAME", help="a custom section to strip instead of the default debug sections (wildcards allowed, implies --strip)")
+	parser.add_argument("--incremental", action='store_true', help="update an existing bundle in place, only copying files that changed since it was last bundled")
+	parser.add_argument("--report", metavar="PATH", help="write a JSON report of the time taken by each bundling phase and the size of every file in the bundle, and print a summary")
+	parser.add_argument("--manifest", help="bundle all the apps listed in a JSON file, in parallel, instead of a single one; each app's entry can override any of the command-line options")
+	parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="how many apps to bundle at once with --manifest (defaults to the number of CPUs)")
+	parser.add_argument("module", nargs='?', help="a .wasm file containing the application's wasm module")
+	parser.set_defaults(func=shellish(make_app), runtime_stage=None)
 
 
 def make_app(args):
+	if args.manifest != None:
+		make_apps(args)
+	elif args.module == None:
+		log_error("no wasm module given (pass one, or a list of apps with --manifest)")
+		exit(1)
+	else:
+		try:
+			report = bundle_app(args)
+		except BundleError as err:
+			log_error(err)
+			exit(1)
+		if args.report != None:
+			print_report(report)
+			write_report(args.report, report)
+
+
+def bundle_app(args):
+	if args.compress_resources:
+		args.pack_resources = True
+	if args.strip_sections:
+		args.strip = True
+
 	#-----------------------------------------------------------
 	# Dispatch to platform-specific function
 	#-----------------------------------------------------------
 	platformName = platform.system()
 	if platformName == 'Darwin':
-		macos_make_app(args)
+		return macos_make_app(args)
 	elif platformName == 'Windows':
-		windows_make_app(args)
+		return windows_make_app(args)
 	else:
-		log_error("Platform '" +  platformName + "' is not supported for now...")
-		exit(1)
+		raise BundleError("Platform '" +  platformName + "' is not supported for now...")
 
 
 def macos_make_app(args):
@@ -55,94 +113,89 @@ def macos_make_app(args):
 	wasm_dir = os.path.join(guest_dir, 'wasm')
 	data_dir = os.path.join(guest_dir, 'data')
 
-	if os.path.exists(bundle_path):
+	report = BundleReport(bundle_path)
+	report.phase('setup')
+
+	if os.path.exists(bundle_path) and not args.incremental:
 		shutil.rmtree(bundle_path)
-	os.mkdir(bundle_path)
-	os.mkdir(contents_dir)
-	os.mkdir(exe_dir)
-	os.mkdir(res_dir)
-	os.mkdir(guest_dir)
-	os.mkdir(wasm_dir)
-	os.mkdir(data_dir)
+
+	sync = Sync(manifest=os.path.join(contents_dir, BUNDLE_MANIFEST))
+	for dir in [bundle_path, contents_dir, exe_dir, res_dir, guest_dir, wasm_dir, data_dir]:
+		sync.add_dir(dir)
 
 	#-----------------------------------------------------------
 	#NOTE: copy orca runtime executable and libraries
 	#-----------------------------------------------------------
+	report.phase('runtime')
 	orca_exe = os.path.join(args.orca_dir, 'build/bin/orca_runtime')
 	orca_lib = os.path.join(args.orca_dir, 'build/bin/liborca.dylib')
 	gles_lib = os.path.join(args.orca_dir, 'src/ext/angle/bin/libGLESv2.dylib')
 	egl_lib = os.path.join(args.orca_dir, 'src/ext/angle/bin/libEGL.dylib')
 	renderer_lib = os.path.join(args.orca_dir, 'build/bin/mtl_renderer.metallib')
 
-	shutil.copy(orca_exe, exe_dir)
-	shutil.copy(orca_lib, exe_dir)
-	shutil.copy(gles_lib, exe_dir)
-	shutil.copy(egl_lib, exe_dir)
-	shutil.copy(renderer_lib, exe_dir)
+	for file in [orca_exe, orca_lib, gles_lib, egl_lib, renderer_lib]:
+		add_runtime_file(sync, args, file, os.path.join(exe_dir, os.path.basename(file)))
 
 	#-----------------------------------------------------------
 	#NOTE: copy wasm module and data
 	#-----------------------------------------------------------
-	shutil.copy(args.module, os.path.join(wasm_dir, 'module.wasm'))
+	report.phase('module')
+	module_path = os.path.join(wasm_dir, 'module.wasm')
+	if args.strip:
+		sync.keep(module_path)
+	else:
+		sync.add_file(args.module, module_path)
 
-	if args.resource_files != None:
-		for resource in args.resource_files:
-			shutil.copytree(resource, os.path.join(data_dir, os.path.basename(resource)), dirs_exist_ok=True)
+	report.phase('resources')
+	images, image_manifest = predecode_resources(args)
+	image_manifest_path = os.path.join(guest_dir, IMAGE_MANIFEST_NAME)
+	if args.predecode_images:
+		sync.keep(image_manifest_path)
 
-	if args.resource_dirs != None:
-		for resource_dir in args.resource_dirs:
-			for resource in os.listdir(resource_dir):
-				src = os.path.join(resource_dir, resource)
-				if os.path.isdir(src):
-					shutil.copytree(src, os.path.join(data_dir, os.path.basename(resource)), dirs_exist_ok=True)
-				else:
-					shutil.copy(src, data_dir)
+	pack_path = os.path.join(guest_dir, PACK_NAME)
+	if args.pack_resources:
+		sync.keep(pack_path)
+	else:
+		add_resources(sync, args, data_dir, images)
 
 	#-----------------------------------------------------------
 	#NOTE: copy runtime resources
 	#-----------------------------------------------------------
 	# default fonts
-	shutil.copy(os.path.join(args.orca_dir, 'resources/Menlo.ttf'), res_dir)
-	shutil.copy(os.path.join(args.orca_dir, 'resources/Menlo Bold.ttf'), res_dir)
+	report.phase('fonts')
+	add_fonts(sync, args, res_dir)
 
 	#-----------------------------------------------------------
 	#NOTE make icon
 	#-----------------------------------------------------------
+	report.phase('icon')
 	src_image = args.icon
 
 	#if src_image == None:
 	#	src_image = orca_dir + '/resources/default_app_icon.png'
 
 	if src_image != None:
-		iconset = os.path.splitext(src_image)[0] + '.iconset'
-
-		if os.path.exists(iconset):
-			shutil.rmtree(iconset)
-
-		os.mkdir(iconset)
-
-		size = 16
-		for i in range(0, 7):
-			size_str = str(size)
-			icon = 'icon_' + size_str + 'x' + size_str + '.png'
-			subprocess.run(['sips', '-z', size_str, size_str, src_image, '--out', iconset + '/' + icon],
-		               	stdout = subprocess.DEVNULL,
-		               	stderr = subprocess.DEVNULL)
-
-			size_str_retina = str(size*2)
-			icon = 'icon_' + size_str + 'x' + size_str + '@2x.png'
-			subprocess.run(['sips', '-z', size_str_retina, size_str_retina, src_image, '--out', iconset + '/' + icon],
-		               	stdout = subprocess.DEVNULL,
-		               	stderr = subprocess.DEVNULL)
-
-			size = size*2
-
-		subprocess.run(['iconutil', '-c', 'icns', '-o', os.path.join(res_dir, 'icon.icns'), iconset])
-		shutil.rmtree(iconset)
+		sync.add_file(make_icon(src_image, 'icns'), os.path.join(res_dir, 'icon.icns'))
+
+	sync.keep(os.path.join(contents_dir, 'Info.plist'))
+	report.phase(None)
+	stats = sync.run(prune=[contents_dir])
+	if args.strip:
+		report.phase('strip')
+		if strip_module(args, module_path):
+			report.wrote(module_path)
+	if args.predecode_images:
+		if write_if_changed(image_manifest_path, image_manifest_json(image_manifest).encode('utf-8')):
+			report.wrote(image_manifest_path)
+	if args.pack_resources:
+		report.phase('pack')
+		if pack_resources(args, pack_path, images):
+			report.wrote(pack_path)
 
 	#-----------------------------------------------------------
 	#NOTE: write plist file
 	#-----------------------------------------------------------
+	report.phase('plist')
 	version = args.version
 	bundle_sig = "????"
 	icon_file = ''
@@ -183,6 +236,18 @@ def macos_make_app(args):
 
 	plist_file = open(contents_dir + '/Info.plist', 'w')
 	print(plist_contents, file=plist_file)
+	plist_file.close()
+	report.wrote(contents_dir + '/Info.plist')
+
+	print(f"Bundled {bundle_name}: {stats.summary()}.")
+	return report.finish(sync, [
+		(os.path.join(res_dir, 'icon.icns'), 'icon'),
+		(os.path.join(contents_dir, 'Info.plist'), 'plist'),
+		(exe_dir, 'runtime'),
+		(res_dir, 'fonts'),
+		(wasm_dir, 'module'),
+		(guest_dir, 'resources'),
+	])
 
 def windows_make_app(args):
 	#-----------------------------------------------------------
@@ -197,58 +262,443 @@ def windows_make_app(args):
 	wasm_dir = os.path.join(guest_dir, 'wasm')
 	data_dir = os.path.join(guest_dir, 'data')
 
-	if os.path.exists(bundle_dir):
+	report = BundleReport(bundle_dir)
+	report.phase('setup')
+
+	if os.path.exists(bundle_dir) and not args.incremental:
 		shutil.rmtree(bundle_dir)
-	os.mkdir(bundle_dir)
-	os.mkdir(exe_dir)
-	os.mkdir(res_dir)
-	os.mkdir(guest_dir)
-	os.mkdir(wasm_dir)
-	os.mkdir(data_dir)
+
+	sync = Sync(manifest=os.path.join(bundle_dir, BUNDLE_MANIFEST))
+	for dir in [bundle_dir, exe_dir, res_dir, guest_dir, wasm_dir, data_dir]:
+		sync.add_dir(dir)
 
 	#-----------------------------------------------------------
 	#NOTE: copy orca runtime executable and libraries
 	#-----------------------------------------------------------
+	report.phase('runtime')
 	orca_exe = os.path.join(args.orca_dir, 'build/bin/orca_runtime.exe')
 	orca_lib = os.path.join(args.orca_dir, 'build/bin/orca.dll')
 	gles_lib = os.path.join(args.orca_dir, 'src/ext/angle/bin/libGLESv2.dll')
 	egl_lib = os.path.join(args.orca_dir, 'src/ext/angle/bin/libEGL.dll')
 
-	shutil.copy(orca_exe, os.path.join(exe_dir, app_name + '.exe'))
-	shutil.copy(orca_lib, exe_dir)
-	shutil.copy(gles_lib, exe_dir)
-	shutil.copy(egl_lib, exe_dir)
+	add_runtime_file(sync, args, orca_exe, os.path.join(exe_dir, app_name + '.exe'))
+	for file in [orca_lib, gles_lib, egl_lib]:
+		add_runtime_file(sync, args, file, os.path.join(exe_dir, os.path.basename(file)))
 
 	#-----------------------------------------------------------
 	#NOTE: copy wasm module and data
 	#-----------------------------------------------------------
+	report.phase('module')
 
-	shutil.copy(args.module, wasm_dir + '/module.wasm')
+	module_path = os.path.join(wasm_dir, 'module.wasm')
+	if args.strip:
+		sync.keep(module_path)
+	else:
+		sync.add_file(args.module, module_path)
 
-	if args.resource_files != None:
-		for resource in args.resource_files:
-			shutil.copytree(resource, data_dir + '/' + os.path.basename(resource), dirs_exist_ok=True)
+	report.phase('resources')
+	images, image_manifest = predecode_resources(args)
+	image_manifest_path = os.path.join(guest_dir, IMAGE_MANIFEST_NAME)
+	if args.predecode_images:
+		sync.keep(image_manifest_path)
 
-	if args.resource_dirs != None:
-		for resource_dir in args.resource_dirs:
-			for resource in os.listdir(resource_dir):
-				src = resource_dir + '/' + resource
-				if os.path.isdir(src):
-					shutil.copytree(src, data_dir + '/' + os.path.basename(resource), dirs_exist_ok=True)
-				else:
-					shutil.copy(src, data_dir)
+	pack_path = os.path.join(guest_dir, PACK_NAME)
+	if args.pack_resources:
+		sync.keep(pack_path)
+	else:
+		add_resources(sync, args, data_dir, images)
 
 	#-----------------------------------------------------------
 	#NOTE: copy runtime resources
 	#-----------------------------------------------------------
 	# default fonts
-	shutil.copy(os.path.join(args.orca_dir, 'resources/Menlo.ttf'), res_dir)
-	shutil.copy(os.path.join(args.orca_dir, 'resources/Menlo Bold.ttf'), res_dir)
+	report.phase('fonts')
+	add_fonts(sync, args, res_dir)
 
 	#-----------------------------------------------------------
 	#NOTE make icon
 	#-----------------------------------------------------------
-	#TODO
+	report.phase('icon')
+	if args.icon != None:
+		sync.add_file(make_icon(args.icon, 'ico'), os.path.join(res_dir, 'icon.ico'))
+
+	report.phase(None)
+	stats = sync.run(prune=[bundle_dir])
+	if args.strip:
+		report.phase('strip')
+		if strip_module(args, module_path):
+			report.wrote(module_path)
+	if args.predecode_images:
+		if write_if_changed(image_manifest_path, image_manifest_json(image_manifest).encode('utf-8')):
+			report.wrote(image_manifest_path)
+	if args.pack_resources:
+		report.phase('pack')
+		if pack_resources(args, pack_path, images):
+			report.wrote(pack_path)
+
+	print(f"Bundled {bundle_name}: {stats.summary()}.")
+	return report.finish(sync, [
+		(os.path.join(res_dir, 'icon.ico'), 'icon'),
+		(exe_dir, 'runtime'),
+		(res_dir, 'fonts'),
+		(wasm_dir, 'module'),
+		(guest_dir, 'resources'),
+	])
+
+
+def add_resources(sync, args, data_dir, images):
+	link = args.link_resources
+	if args.resource_files != None:
+		for resource in args.resource_files:
+			dst = os.path.join(data_dir, os.path.basename(resource))
+			if os.path.isdir(resource):
+				sync.add_tree(resource, dst, link=link)
+			else:
+				sync.add_file(resource, dst, link=link)
+
+	if args.resource_dirs != None:
+		for resource_dir in args.resource_dirs:
+			sync.add_tree(resource_dir, data_dir, link=link)
+
+	# pre-decoded images replace their source files, under the same names
+	for name, blob in images.items():
+		sync.add_file(blob, os.path.join(data_dir, *name.split('/')))
+
+
+def resource_files(args):
+	# (path inside app/data, source path) for every resource, as laid out by add_resources
+	files = {}
+	if args.resource_files != None:
+		for resource in args.resource_files:
+			if os.path.isdir(resource):
+				collect_dir(files, resource, os.path.basename(resource))
+			else:
+				files[os.path.basename(resource)] = resource
+
+	if args.resource_dirs != None:
+		for resource_dir in args.resource_dirs:
+			collect_dir(files, resource_dir, '')
+	return sorted(files.items())
+
+
+def collect_dir(files, src_dir, prefix):
+	for root, dirs, names in os.walk(src_dir, followlinks=True):
+		rel = os.path.relpath(root, src_dir)
+		for name in names:
+			path = name if rel == '.' else os.path.join(rel, name)
+			if prefix:
+				path = os.path.join(prefix, path)
+			files[path.replace(os.sep, '/')] = os.path.join(root, name)
+
+
+def predecode_resources(args):
+	# ({resource name: pre-decoded image}, manifest) for the resources that were pre-decoded
+	if not args.predecode_images:
+		return {}, {}
+	images, manifest = predecode_images(resource_files(args))
+	source_bytes = sum(image['source_bytes'] for image in manifest.values())
+	decoded_bytes = sum(image['bytes'] for image in manifest.values())
+	print(f"Pre-decoded {len(images)} images ({format_size(source_bytes)} -> {format_size(decoded_bytes)}).")
+	return images, manifest
+
+
+def pack_resources(args, pack_path, images):
+	files = [(name, images.get(name, src)) for name, src in resource_files(args)]
+	key = pack_key(files, args.compress_resources)
+	if read_pack_key(pack_path) == key:
+		print(f"{PACK_NAME}: up to date ({len(files)} resources)")
+		return False
+	stats = write_pack(pack_path, files, args.compress_resources, key)
+	print(f"Packed {stats.files} resources ({format_size(stats.input_bytes)}) into {PACK_NAME} ({format_size(stats.pack_bytes)}): {stats.summary()}.")
+	return True
+
+
+def strip_module(args, module_path):
+	with open(args.module, 'rb') as f:
+		module = f.read()
+
+	sections = read_sections(module)
+	kept, stripped = strip_sections(sections, args.strip_sections or WASM_DEBUG_SECTIONS)
+	written = write_if_changed(module_path, write_module(kept))
+
+	# keep the original for symbolicating crashes
+	unstripped_path = os.path.join(args.out_dir, args.name + '.debug.wasm')
+	write_if_changed(unstripped_path, module)
+
+	print(f"Stripped {len(stripped)} sections from module.wasm (original saved as {unstripped_path}):")
+	print_section_sizes(sections, stripped)
+	return written
+
+
+def write_if_changed(path, data):
+	# Returns whether the file was written.
+	try:
+		with open(path, 'rb') as f:
+			if f.read() == data:
+				return False
+	except FileNotFoundError:
+		pass
+	with open(path, 'wb') as f:
+		f.write(data)
+	return True
+
+
+def add_fonts(sync, args, res_dir):
+	codepoints = parse_charset(args.font_subset) if args.font_subset != None else None
+	for font in ['Menlo.ttf', 'Menlo Bold.ttf']:
+		src = os.path.join(args.orca_dir, 'resources', font)
+		if codepoints != None:
+			subset = subset_font_file(src, codepoints)
+			print(f"Subset {font} to {len(codepoints)} characters ({format_size(os.path.getsize(src))} -> {format_size(os.path.getsize(subset))}).")
+			src = subset
+		add_runtime_file(sync, args, src, os.path.join(res_dir, font))
+
+
+def add_runtime_file(sync, args, src, dst):
+	# Runtime files are the same in every bundle. When bundling a batch of apps, they're
+	# hardlinked from a single staged copy instead of being copied into each bundle.
+	if args.runtime_stage != None:
+		sync.add_file(args.runtime_stage.stage(src), dst, link=True)
+	else:
+		sync.add_file(src, dst)
+
+
+#-----------------------------------------------------------
+# Reports
+#-----------------------------------------------------------
+
+BUNDLE_REPORT_VERSION = 2
+
+class BundleReport:
+	# Records how long each phase of bundling takes and, once done, what's in the bundle:
+	# the size of every file, its category and whether it was written this time.
+	#
+	# The phases that add files to the sync only collect them; the files are all synced at
+	# once, in parallel, so each of those phases is charged the time taken to sync the files
+	# of its category.
+
+	def __init__(self, bundle_path):
+		self.bundle_path = bundle_path
+		self.start = time.perf_counter()
+		self.phases = []
+		self.current = None
+		self.written = set()  # files written outside of the sync
+
+	def phase(self, name):
+		# Ends the current phase, if any, and starts the next one.
+		now = time.perf_counter()
+		if self.current != None:
+			self.phases.append({'name': self.current[0], 'seconds': now - self.current[1]})
+		self.current = (name, now) if name != None else None
+
+	def wrote(self, path):
+		self.written.add(os.path.normpath(path))
+
+	def finish(self, sync, categories):
+		# categories is a list of (file or directory, category); a file gets the category
+		# of the first entry that is or contains it.
+		self.phase(None)
+		categories = [(os.path.normpath(path), category) for path, category in categories]
+		files = []
+		totals = {}
+		for root, dirs, names in os.walk(self.bundle_path):
+			for name in names:
+				path = os.path.normpath(os.path.join(root, name))
+				category = 'other'
+				for prefix, prefix_category in categories:
+					if path == prefix or path.startswith(prefix + os.sep):
+						category = prefix_category
+						break
+				size = os.path.getsize(path)
+				action, seconds, bytes_written = sync.results.get(path, ('unchanged', 0, 0))
+				if path in self.written:
+					action, bytes_written = 'written', size
+				files.append({
+					'path': os.path.relpath(path, self.bundle_path).replace(os.sep, '/'),
+					'category': category,
+					'bytes': size,
+					'action': action,
+					'bytes_written': bytes_written,
+					'seconds': seconds,
+				})
+				total = totals.setdefault(category, {'files': 0, 'bytes': 0, 'bytes_written': 0, 'seconds': 0})
+				total['files'] += 1
+				total['bytes'] += size
+				total['bytes_written'] += bytes_written
+				total['seconds'] += seconds
+
+		for phase in self.phases:
+			if phase['name'] in totals:
+				phase['seconds'] += totals[phase['name']]['seconds']
+
+		return {
+			'version': BUNDLE_REPORT_VERSION,
+			'bundle': self.bundle_path,
+			'seconds': time.perf_counter() - self.start,
+			'bytes': sum(f['bytes'] for f in files),
+			'bytes_written': sum(f['bytes_written'] for f in files),
+			'phases': self.phases,
+			'categories': totals,
+			'files': sorted(files, key=lambda f: f['path']),
+		}
+
+
+def print_report(report, count=10):
+	print()
+	print(f"{os.path.basename(report['bundle'])}: {format_size(report['bytes'])} in {len(report['files'])} files, {format_size(report['bytes_written'])} written in {report['seconds']:.2f}s")
+	for category, total in sorted(report['categories'].items(), key=lambda c: c[1]['bytes'], reverse=True):
+		print(f"  {category:<10} {format_size(total['bytes']):>10}  ({total['files']} files, {format_size(total['bytes_written'])} written)")
+	print("Slowest phases:")
+	for phase in sorted(report['phases'], key=lambda p: p['seconds'], reverse=True)[:count]:
+		print(f"  {phase['seconds']:9.3f}s  {phase['name']}")
+	print("Largest files:")
+	for file in sorted(report['files'], key=lambda f: f['bytes'], reverse=True)[:count]:
+		print(f"  {format_size(file['bytes']):>10}  {file['path']}")
+
+
+def write_report(path, report):
+	os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+	with open(path, 'w') as f:
+		json.dump(report, f, indent=2)
+	print(f"Bundle report written to {path}")
+
+
+#-----------------------------------------------------------
+# Batch bundling
+#-----------------------------------------------------------
+
+class RuntimeStage:
+	# A private copy of the runtime files shared by a batch of bundles, on the same volume
+	# as the bundles so they can be hardlinked to it. Bundles never link straight to the
+	# Orca installation, so that they don't change if it's updated in place.
+
+	def __init__(self, stage_dir):
+		self.dir = stage_dir
+		self.files = {}
+		self.stats = SyncStats()
+		self.lock = threading.Lock()
+
+	def stage(self, src):
+		# Returns the staged copy of src, staging it the first time it's asked for.
+		src = os.path.abspath(src)
+		with self.lock:
+			staged = self.files.get(src)
+			if staged == None:
+				# files with the same name can come from different directories
+				subdir = hashlib.sha1(os.path.dirname(src).encode('utf-8')).hexdigest()[:16]
+				staged = os.path.join(self.dir, subdir, os.path.basename(src))
+				sync = Sync()
+				sync.add_file(src, staged)
+				stats = sync.run()
+				for field in ['copied', 'cloned', 'unchanged', 'bytes_written']:
+					setattr(self.stats, field, getattr(self.stats, field) + getattr(stats, field))
+				self.files[src] = staged
+			return staged
+
+
+def make_apps(args):
+	apps = read_app_manifest(args)
+	platformName = platform.system()
+	if platformName not in ['Darwin', 'Windows']:
+		log_error("Platform '" +  platformName + "' is not supported for now...")
+		exit(1)
+
+	stage = RuntimeStage(os.path.join(args.out_dir, BUNDLE_STAGE_DIR))
+	for app in apps:
+		app.runtime_stage = stage
+
+	def bundle(app):
+		start = time.perf_counter()
+		report = None
+		error = None
+		try:
+			report = bundle_app(app)
+		except Exception as err:
+			error = err
+		except SystemExit as err:
+			# a helper that exits on error shouldn't take the other apps down with it
+			error = f"exited with code {err.code}"
+		return time.perf_counter() - start, error, report
+
+	start = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+		results = list(pool.map(bundle, apps))
+	elapsed = time.perf_counter() - start
+
+	failed = 0
+	for app, (_, error, _) in zip(apps, results):
+		if error != None:
+			log_error(f"failed to bundle {app.name}: {error}")
+			failed += 1
+
+	if args.report != None:
+		write_report(args.report, {
+			'version': BUNDLE_REPORT_VERSION,
+			'seconds': elapsed,
+			'apps': [dict(report, name=app.name) for app, (_, _, report) in zip(apps, results) if report != None],
+		})
+
+	def finish_report():
+		print()
+		print(f"Bundled {len(apps) - failed} of {len(apps)} apps in {elapsed:.2f}s (shared runtime files: {stage.stats.summary()}):")
+		for app, (seconds, error, _) in sorted(zip(apps, results), key=lambda r: r[1][0], reverse=True):
+			print(f"{seconds:9.2f}s  {app.name}" + ("" if error == None else " (failed)"))
+	add_finish_report(finish_report)
+
+	if failed > 0:
+		exit(1)
+
+
+def read_app_manifest(args):
+	# The manifest is a list of apps, or an object with an "apps" list. Each app is an object
+	# with the same options as the command line (e.g. "name", "module", "resource_dirs",
+	# "icon"), which take precedence over the ones given on the command line.
+	try:
+		with open(args.manifest, 'r') as f:
+			manifest = json.load(f)
+	except (OSError, ValueError) as err:
+		log_error(f"couldn't read app manifest {args.manifest}: {err}")
+		exit(1)
+
+	entries = manifest.get('apps') if isinstance(manifest, dict) else manifest
+	if not isinstance(entries, list) or len(entries) == 0:
+		log_error(f"app manifest {args.manifest} doesn't list any apps")
+		exit(1)
+
+	base_dir = os.path.dirname(os.path.abspath(args.manifest))
+	options = set(vars(args)) - {'manifest', 'jobs', 'report', 'func', 'runtime_stage'}
+	apps = []
+	bundle_paths = set()
+	for index, entry in enumerate(entries):
+		if not isinstance(entry, dict):
+			log_error(f"app #{index + 1} in {args.manifest} isn't an object")
+			exit(1)
+		app = Namespace(**vars(args))
+		app.manifest = None
+		for key, value in entry.items():
+			option = key.replace('-', '_')
+			if option not in options:
+				log_error(f"app #{index + 1} in {args.manifest} has an unknown option '{key}'")
+				exit(1)
+			if option in ['resource_files', 'resource_dirs', 'strip_sections'] and isinstance(value, str):
+				value = [value]
+			if option in APP_MANIFEST_PATHS:
+				if isinstance(value, list):
+					value = [os.path.join(base_dir, path) for path in value]
+				else:
+					value = os.path.join(base_dir, value)
+			setattr(app, option, value)
+
+		if app.module == None:
+			log_error(f"app #{index + 1} in {args.manifest} has no module")
+			exit(1)
+		bundle_path = os.path.normcase(os.path.abspath(os.path.join(app.out_dir, app.name)))
+		if bundle_path in bundle_paths:
+			log_error(f"app #{index + 1} in {args.manifest} would overwrite another app's bundle (give it a different name)")
+			exit(1)
+		bundle_paths.add(bundle_path)
+		apps.append(app)
+	return apps
 
 
 if __name__ == "__main__":
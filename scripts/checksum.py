@@ -1,10 +1,40 @@
+import atexit
 import hashlib
 import json
+import mmap
 import os
+import platform
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .log import *
 
 
+# Bump this to throw away every cached hash, e.g. if the way files are hashed changes.
+HASH_CACHE_VERSION = 1
+
+# Files modified this recently aren't cached, since a second write within the
+# filesystem's timestamp resolution wouldn't change their mtime.
+HASH_CACHE_RACY_SECONDS = 2
+
+HASH_BLOCK_SIZE = 64 * 1024
+
+# Files at least this big are hashed straight out of an mmap instead of being
+# read in blocks.
+HASH_MMAP_THRESHOLD = 1024 * 1024
+
+# Hash functions that can be selected by name. sha1 is the default for dirsum and
+# must stay that way, since existing .orcavendor files record sha1 digests.
+# blake2b is considerably faster on 64-bit machines.
+HASH_FUNCS = {
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+}
+
+
 def checkfile(filepath):
     newsum = filesum(filepath)
 
@@ -27,8 +57,11 @@ def checkfile(filepath):
 
 
 def filesum(filepath):
-    with open(filepath, "rb") as file:
-        return hashlib.sha256(file.read()).hexdigest()
+    return cached_filehash(filepath, hashlib.sha256)
+
+
+def stringsum(s):
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
 # -----------------------------------------------------------------------------
@@ -43,8 +76,16 @@ def dirsum(
     ignore_hidden=False,
     followlinks=False,
     excluded_extensions=None,
-    include_paths=False
+    include_paths=False,
+    jobs=None,
 ):
+    # Files are hashed concurrently on a pool of threads; hashlib releases the
+    # GIL while hashing large buffers, and on slow or network filesystems most
+    # of the time is spent waiting on I/O anyway. The result does not depend on
+    # the order in which files are hashed.
+    if isinstance(hash_func, str):
+        hash_func = HASH_FUNCS[hash_func]
+
     if not excluded_files:
         excluded_files = []
 
@@ -54,6 +95,7 @@ def dirsum(
     if not os.path.isdir(dirname):
         raise TypeError("{} is not a directory.".format(dirname))
 
+    filepaths = []
     hashvalues = []
     for root, dirs, files in os.walk(dirname, topdown=True, followlinks=followlinks):
         if ignore_hidden and re.search(r"/\.", root):
@@ -72,7 +114,7 @@ def dirsum(
             if fname in excluded_files:
                 continue
 
-            hashvalues.append(_filehash(os.path.join(root, fname), hash_func))
+            filepaths.append(os.path.join(root, fname))
 
             if include_paths:
                 hasher = hash_func()
@@ -82,22 +124,28 @@ def dirsum(
                 hasher.update(''.join(path_list).encode('utf-8'))
                 hashvalues.append(hasher.hexdigest())
 
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        hashvalues.extend(pool.map(lambda filepath: cached_filehash(filepath, hash_func), filepaths))
+
     return _reduce_hash(hashvalues, hash_func)
 
 
 def _filehash(filepath, hashfunc):
     hasher = hashfunc()
-    blocksize = 64 * 1024
 
     if not os.path.exists(filepath):
         return hasher.hexdigest()
 
     with open(filepath, "rb") as fp:
-        while True:
-            data = fp.read(blocksize)
-            if not data:
-                break
-            hasher.update(data)
+        if os.fstat(fp.fileno()).st_size >= HASH_MMAP_THRESHOLD:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hasher.update(data)
+        else:
+            while True:
+                data = fp.read(HASH_BLOCK_SIZE)
+                if not data:
+                    break
+                hasher.update(data)
     return hasher.hexdigest()
 
 
@@ -106,3 +154,247 @@ def _reduce_hash(hashlist, hashfunc):
     for hashvalue in sorted(hashlist):
         hasher.update(hashvalue.encode("utf-8"))
     return hasher.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+# Merkle trees
+#
+# A tree is a nested dict that can be stored as JSON. Every node has a "hash";
+# directory nodes also have "children", mapping entry names to nodes. A
+# directory's hash covers the names, kinds and hashes of its children, so two
+# trees with the same root hash have identical contents, and diff() only has to
+# descend into subtrees whose hashes differ.
+# -----------------------------------------------------------------------------
+
+class TreeDiff:
+    def __init__(self):
+        self.changed = []
+        self.added = []
+        self.removed = []
+
+    def __bool__(self):
+        return len(self.changed) + len(self.added) + len(self.removed) > 0
+
+    def paths(self):
+        return sorted(self.changed + self.added + self.removed)
+
+
+def merkle_tree(
+    dirname,
+    hash_func=hashlib.sha1,
+    excluded_files=None,
+    excluded_extensions=None,
+    followlinks=False,
+    jobs=None,
+):
+    if isinstance(hash_func, str):
+        hash_func = HASH_FUNCS[hash_func]
+
+    if not excluded_files:
+        excluded_files = []
+
+    if not excluded_extensions:
+        excluded_extensions = []
+
+    if not os.path.isdir(dirname):
+        raise TypeError("{} is not a directory.".format(dirname))
+
+    dirnodes = {}
+    files = []
+    for root, dirs, fnames in os.walk(dirname, topdown=True, followlinks=followlinks):
+        dirs.sort()
+        relroot = os.path.relpath(root, dirname)
+        dirnodes[relroot] = {"hash": None, "children": {}}
+
+        for fname in sorted(fnames):
+            if fname.split(".")[-1:][0] in excluded_extensions:
+                continue
+            if fname in excluded_files:
+                continue
+            files.append((relroot, fname))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        digests = pool.map(lambda f: cached_filehash(os.path.join(dirname, f[0], f[1]), hash_func), files)
+        for (relroot, fname), digest in zip(files, digests):
+            dirnodes[relroot]["children"][fname] = {"hash": digest}
+
+    # Hash directories deepest first, so children are done before their parents.
+    for relroot in sorted(dirnodes, key=lambda d: 0 if d == "." else d.count(os.sep) + 1, reverse=True):
+        node = dirnodes[relroot]
+        node["hash"] = _dirnode_hash(node["children"], hash_func)
+        if relroot != ".":
+            parent = os.path.dirname(relroot) or "."
+            dirnodes[parent]["children"][os.path.basename(relroot)] = node
+
+    return dirnodes["."]
+
+
+def diff(old_tree, new_tree):
+    # Lists the files that were changed, added or removed between two trees, as
+    # "/"-separated paths relative to the root.
+    result = TreeDiff()
+    _diff_nodes(old_tree, new_tree, "", result)
+    for paths in [result.changed, result.added, result.removed]:
+        paths.sort()
+    return result
+
+
+def tree_files(tree, prefix=""):
+    # All file paths in a tree, "/"-separated and relative to the root.
+    if not _is_dirnode(tree):
+        return [prefix]
+    files = []
+    for name, child in tree["children"].items():
+        files.extend(tree_files(child, _join_tree_path(prefix, name)))
+    return files
+
+
+def _diff_nodes(old, new, path, result):
+    if old["hash"] == new["hash"] and _is_dirnode(old) == _is_dirnode(new):
+        return
+
+    if _is_dirnode(old) and _is_dirnode(new):
+        old_children = old["children"]
+        new_children = new["children"]
+        for name in sorted(set(old_children) | set(new_children)):
+            childpath = _join_tree_path(path, name)
+            if name not in new_children:
+                result.removed.extend(tree_files(old_children[name], childpath))
+            elif name not in old_children:
+                result.added.extend(tree_files(new_children[name], childpath))
+            else:
+                _diff_nodes(old_children[name], new_children[name], childpath, result)
+    elif not _is_dirnode(old) and not _is_dirnode(new):
+        result.changed.append(path)
+    else:
+        # a file was replaced by a directory or vice versa
+        result.removed.extend(tree_files(old, path))
+        result.added.extend(tree_files(new, path))
+
+
+def _dirnode_hash(children, hash_func):
+    hasher = hash_func()
+    for name in sorted(children):
+        child = children[name]
+        kind = "d" if _is_dirnode(child) else "f"
+        hasher.update(f"{name}\0{kind}\0{child['hash']}\n".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _is_dirnode(node):
+    return "children" in node
+
+
+def _join_tree_path(prefix, name):
+    return f"{prefix}/{name}" if prefix else name
+
+
+# -----------------------------------------------------------------------------
+# Persistent hash cache
+# -----------------------------------------------------------------------------
+
+def cached_filehash(filepath, hashfunc):
+    # Hashes a file, reusing the previous result if the file's size, mtime and
+    # inode haven't changed since it was last hashed with the same algorithm.
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return hashfunc().hexdigest()
+
+    cache = hash_cache()
+    algorithm = hashfunc().name
+    digest = cache.get(filepath, st, algorithm)
+    if digest is None:
+        digest = _filehash(filepath, hashfunc)
+        cache.put(filepath, st, algorithm, digest)
+    return digest
+
+
+def cache_dir():
+    if platform.system() == "Windows":
+        orca_dir = os.path.join(os.getenv("LOCALAPPDATA"), "orca")
+    else:
+        orca_dir = os.path.expanduser(os.path.join("~", ".orca"))
+    return os.path.join(orca_dir, "cache")
+
+
+def hash_cache_path():
+    return os.path.join(cache_dir(), "hashes.json")
+
+
+_hash_cache = None
+_hash_cache_lock = threading.Lock()
+
+
+def hash_cache():
+    global _hash_cache
+    with _hash_cache_lock:
+        if _hash_cache is None:
+            _hash_cache = HashCache(hash_cache_path())
+            atexit.register(_hash_cache.save)
+        return _hash_cache
+
+
+class HashCache:
+    # Maps (path, size, mtime_ns, inode) to a file's digest, separately for each
+    # hash algorithm. Entries are invalidated by any change to the stat key, and
+    # the whole cache is dropped if HASH_CACHE_VERSION changes.
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.entries = {}
+
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == HASH_CACHE_VERSION:
+                self.entries = data["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def get(self, filepath, st, algorithm):
+        with self.lock:
+            entry = self.entries.get(algorithm, {}).get(os.path.abspath(filepath))
+        if entry is None or entry[:3] != self._stat_key(st):
+            return None
+        return entry[3]
+
+    def put(self, filepath, st, algorithm, digest):
+        if time.time() - st.st_mtime < HASH_CACHE_RACY_SECONDS:
+            return
+        with self.lock:
+            self.entries.setdefault(algorithm, {})[os.path.abspath(filepath)] = [*self._stat_key(st), digest]
+            self.dirty = True
+
+    def invalidate(self, algorithm=None):
+        with self.lock:
+            if algorithm is None:
+                self.entries = {}
+            else:
+                self.entries.pop(algorithm, None)
+            self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            # Forget files that no longer exist so the cache doesn't grow forever.
+            for paths in self.entries.values():
+                for path in [path for path in paths if not os.path.exists(path)]:
+                    del paths[path]
+            data = {"version": HASH_CACHE_VERSION, "entries": self.entries}
+            self.dirty = False
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            log_warning(f"failed to save file hash cache: {err}")
+
+    def _stat_key(self, st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
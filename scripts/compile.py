@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from functools import lru_cache
+
+from .checksum import cached_filehash
+from .log import *
+from .taskgraph import UP_TO_DATE
+from .trace import trace_run
+
+
+MANIFEST_VERSION = 1
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+class CompileUnit:
+    def __init__(self, source, output, cmd):
+        self.source = source
+        self.output = output
+        self.cmd = cmd
+
+
+class ObjectCache:
+    # Records, for every object file we've built, a key derived from everything
+    # that went into it: the exact command line, the compiler version, and the
+    # hashes of the source and every header it included (as reported by the
+    # compiler's dependency output). An object whose key is unchanged, and which
+    # still exists on disk, doesn't need to be rebuilt.
+    #
+    # Debug and release builds use separate manifests and object directories so
+    # switching between them doesn't throw away either one.
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.objects = {}
+        self.lock = threading.Lock()
+
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.objects = manifest["objects"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    def is_up_to_date(self, unit):
+        with self.lock:
+            entry = self.objects.get(unit.output)
+        if entry is None or not os.path.exists(unit.output):
+            return False
+        return entry["key"] == self.key(unit, entry["deps"])
+
+    def record(self, unit, deps):
+        deps = sorted(set(deps) | {os.path.normpath(unit.source)})
+        key = self.key(unit, deps)
+        with self.lock:
+            self.objects[unit.output] = {"key": key, "deps": deps}
+
+    def forget(self, unit):
+        with self.lock:
+            self.objects.pop(unit.output, None)
+
+    def key(self, unit, deps):
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps({
+            "cmd": unit.cmd,
+            "compiler": compiler_version(unit.cmd[0]),
+            "deps": {dep: self.file_hash(dep) for dep in deps},
+        }, sort_keys=True).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def file_hash(self, path):
+        if not os.path.exists(path):
+            return None
+        return cached_filehash(path, hashlib.sha256)
+
+    def save(self):
+        with self.lock:
+            manifest = {"version": MANIFEST_VERSION, "objects": self.objects}
+            os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+            tmp_path = self.manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+
+
+@lru_cache(maxsize=None)
+def compiler_version(compiler):
+    try:
+        if _is_msvc(compiler):
+            # cl has no version flag; it prints its banner when run with no arguments.
+            res = subprocess.run([compiler], capture_output=True, text=True)
+        else:
+            res = subprocess.run([compiler, "--version"], capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    return (res.stdout + res.stderr).strip()
+
+
+def add_compile_tasks(graph, units, cache=None, deps=None):
+    # Adds one task per unit to a TaskGraph. Units whose objects are up to date
+    # in the cache are skipped.
+    #
+    # Each unit's output is captured and reported from the scheduling thread once
+    # the unit finishes, so diagnostics for different files never interleave. A
+    # failing unit raises CalledProcessError, which stops the graph from starting
+    # anything else.
+    tasks = []
+    for unit in units:
+        tasks.append(graph.add(
+            f"compile {unit.source}",
+            _compile_func(unit, cache),
+            deps=deps,
+            inputs=[unit.source],
+            outputs=[unit.output],
+            report=_report_func(unit, cache),
+        ))
+    return tasks
+
+
+def _compile_func(unit, cache):
+    def compile():
+        if cache is not None and cache.is_up_to_date(unit):
+            return UP_TO_DATE
+        return _run_unit(unit, cache is not None)
+    return compile
+
+
+def _report_func(unit, cache):
+    def report(value):
+        if value is UP_TO_DATE:
+            return
+
+        result, deps = value
+        diagnostics = _diagnostics(unit, result)
+
+        if result.returncode != 0:
+            msg = log_error(f"failed to compile {unit.source}:")
+            for line in diagnostics:
+                msg.more(line)
+            if cache is not None:
+                cache.forget(unit)
+            raise subprocess.CalledProcessError(result.returncode, unit.cmd)
+
+        if len(diagnostics) > 0:
+            msg = log_warning(f"compiler output for {unit.source}:")
+            for line in diagnostics:
+                msg.more(line)
+        if cache is not None:
+            cache.record(unit, deps)
+    return report
+
+
+def _is_msvc(compiler):
+    return os.path.splitext(os.path.basename(compiler))[0].lower() == "cl"
+
+
+MSVC_INCLUDE_NOTE = "Note: including file:"
+
+
+def _run_unit(unit, track_deps):
+    if not track_deps:
+        return (trace_run(unit.cmd, capture_output=True, text=True, name=f"{unit.cmd[0]} {unit.source}"), [])
+
+    if _is_msvc(unit.cmd[0]):
+        result = trace_run([*unit.cmd, "/showIncludes"], capture_output=True, text=True, name=f"{unit.cmd[0]} {unit.source}")
+        deps = []
+        stdout = []
+        for line in result.stdout.splitlines():
+            if line.startswith(MSVC_INCLUDE_NOTE):
+                deps.append(line[len(MSVC_INCLUDE_NOTE):].strip())
+            else:
+                stdout.append(line)
+        result.stdout = "\n".join(stdout)
+    else:
+        depfile = unit.output + ".d"
+        result = trace_run([*unit.cmd, "-MMD", "-MF", depfile], capture_output=True, text=True, name=f"{unit.cmd[0]} {unit.source}")
+        deps = _parse_depfile(depfile) if result.returncode == 0 else []
+
+    return (result, _source_deps(deps))
+
+
+def _parse_depfile(path):
+    # Make-style rule as written by -MMD: "target: dep dep \<newline> dep ..."
+    with open(path, "r") as f:
+        text = f.read().replace("\\\n", " ")
+    _, _, deps = text.partition(": ")
+    return [dep.replace("\\ ", " ") for dep in re.split(r"(?<!\\)\s+", deps.strip()) if dep]
+
+
+def _source_deps(deps):
+    # Only track files inside the source tree. System and SDK headers are covered
+    # by the compiler version, and hashing them on every build would be slow.
+    cwd = os.getcwd()
+    result = []
+    for dep in deps:
+        abs_dep = os.path.abspath(dep)
+        try:
+            if os.path.commonpath([cwd, abs_dep]) != cwd:
+                continue
+        except ValueError:
+            # different drives on Windows
+            continue
+        result.append(os.path.normpath(os.path.relpath(abs_dep, cwd)))
+    return result
+
+
+def _diagnostics(unit, result):
+    # MSVC echoes the name of each source file it compiles; that's not a diagnostic.
+    echo = os.path.basename(unit.source)
+    lines = (result.stdout + result.stderr).splitlines()
+    return [line for line in lines if line.strip() and line.strip() != echo]
@@ -1,4 +1,5 @@
 import glob
+import json
 import os
 import platform
 import re
@@ -10,9 +11,13 @@ from zipfile import ZipFile
 from . import checksum
 from .bindgen import bindgen
 from .checksum import dirsum
+from .compile import CompileUnit, ObjectCache, add_compile_tasks, default_jobs
 from .gles_gen import gles_gen
 from .log import *
-from .utils import pushd, removeall, yeetdir, yeetfile
+from .sync import Sync
+from .taskgraph import TaskGraph
+from .trace import trace_enable, trace_run, trace_step
+from .utils import yeetdir, yeetfile
 from .embed_text_files import *
 from .version import check_if_source, is_orca_source, orca_version
 
@@ -27,6 +32,10 @@ def attach_dev_commands(subparsers):
 
     build_cmd = dev_sub.add_parser("build-runtime", help="Build the Orca runtime from source.")
     build_cmd.add_argument("--release", action="store_true", help="compile Orca in release mode (default is debug)")
+    build_cmd.add_argument("--trace", metavar="FILE", help="write a trace of every build step to FILE (e.g. build/trace.json), viewable in chrome://tracing or Perfetto")
+    build_cmd.add_argument("-j", "--jobs", type=int, default=default_jobs(), help="number of files to compile in parallel (defaults to the number of CPUs)")
+    build_cmd.add_argument("--profile-bindings", action="store_true", help="count the calls to each host function and their host time, and log them when the app terminates")
+    build_cmd.add_argument("--capture-bindings", action="store_true", help="support capturing the GLES and surface calls of an app to a trace (ORCA_CAPTURE=<file>), and replaying a trace instead of running the app (ORCA_REPLAY=<file>)")
     build_cmd.set_defaults(func=dev_shellish(build_runtime))
 
     clean_cmd = dev_sub.add_parser("clean", help="Delete all build artifacts and start fresh.")
@@ -34,6 +43,7 @@ def attach_dev_commands(subparsers):
 
     install_cmd = dev_sub.add_parser("install", help="Install the Orca tools into a system folder.")
     install_cmd.add_argument("--no-confirm", action="store_true", help="don't ask the user for confirmation before installing")
+    install_cmd.add_argument("--link", action="store_true", help="hardlink installed files to this checkout where possible instead of copying them; edits to the checkout may then show up in the installation")
     install_cmd.set_defaults(func=dev_shellish(install))
 
     uninstall_cmd = dev_sub.add_parser("uninstall", help="Uninstall the system installation of Orca.")
@@ -60,17 +70,50 @@ def dev_shellish(func):
 
 
 def build_runtime(args):
+    if args.trace:
+        trace_enable(args.trace)
+
     ensure_programs()
     ensure_angle()
 
-    build_platform_layer("lib", args.release)
-    build_wasm3(args.release)
-    build_orca(args.release)
+    print("Building Orca runtime...")
+
+    # The platform layer, wasm3 and the runtime are independent until link time,
+    # so they go into a single task graph and build concurrently.
+    cache = ObjectCache(object_manifest_path(args.release))
+    graph = TaskGraph()
+    platform_layer_tasks(graph, args.release, cache)
+    wasm3_tasks(graph, args.release, cache)
+    orca_tasks(graph, args.release, cache, args.profile_bindings, args.capture_bindings)
+    run_build_graph(graph, args.jobs, cache)
 
     with open("build/orcaruntime.sum", "w") as f:
         f.write(runtime_checksum())
 
 
+def run_build_graph(graph, jobs, cache):
+    try:
+        graph.run(jobs)
+    finally:
+        if cache is not None:
+            cache.save()
+
+
+def run_commands(*cmds):
+    def run():
+        for cmd in cmds:
+            trace_run(cmd, check=True)
+    return run
+
+
+def object_dir(release):
+    return os.path.join("build", "obj", "release" if release else "debug")
+
+
+def object_manifest_path(release):
+    return os.path.join("build", "objects_release.json" if release else "objects_debug.json")
+
+
 def runtime_checksum_last():
     try:
         with open("build/orcaruntime.sum", "r") as f:
@@ -80,7 +123,8 @@ def runtime_checksum_last():
 
 
 def runtime_checksum():
-    return dirsum("src")
+    with trace_step("runtime checksum"):
+        return dirsum("src")
 
 
 def clean(args):
@@ -90,33 +134,22 @@ def clean(args):
     yeetdir("scripts/__pycache__")
 
 
-def build_platform_layer(target, release):
-    print("Building Orca platform layer...")
-
+def platform_layer_tasks(graph, release, cache):
     os.makedirs("build/bin", exist_ok=True)
     os.makedirs("build/lib", exist_ok=True)
+    os.makedirs(object_dir(release), exist_ok=True)
 
-    if target == "lib":
-        if platform.system() == "Windows":
-            build_platform_layer_lib_win(release)
-        elif platform.system() == "Darwin":
-            build_platform_layer_lib_mac(release)
-        else:
-            log_error(f"can't build platform layer for unknown platform '{platform.system()}'")
-            exit(1)
-    elif target == "test":
-        with pushd("examples/test_app"):
-            # TODO?
-            subprocess.run(["./build.sh"])
-    elif target == "clean":
-        removeall("bin")
+    if platform.system() == "Windows":
+        platform_layer_tasks_win(graph, release, cache)
+    elif platform.system() == "Darwin":
+        platform_layer_tasks_mac(graph, release, cache)
     else:
-        log_error(f"unrecognized platform layer target '{target}'")
+        log_error(f"can't build platform layer for unknown platform '{platform.system()}'")
         exit(1)
 
 
-def build_platform_layer_lib_win(release):
-    embed_text_files("src\\graphics\\glsl_shaders.h", "glsl_", [
+def platform_layer_tasks_win(graph, release, cache):
+    shaders = [
         "src\\graphics\\glsl_shaders\\common.glsl",
         "src\\graphics\\glsl_shaders\\blit_vertex.glsl",
         "src\\graphics\\glsl_shaders\\blit_fragment.glsl",
@@ -126,7 +159,12 @@ def build_platform_layer_lib_win(release):
         "src\\graphics\\glsl_shaders\\merge.glsl",
         "src\\graphics\\glsl_shaders\\raster.glsl",
         "src\\graphics\\glsl_shaders\\balance_workgroups.glsl",
-    ])
+    ]
+    embed_task = graph.add("embed glsl shaders",
+        lambda: embed_text_files("src\\graphics\\glsl_shaders.h", "glsl_", shaders),
+        inputs=shaders,
+        outputs=["src\\graphics\\glsl_shaders.h"],
+    )
 
     includes = [
         "/I", "src",
@@ -153,21 +191,34 @@ def build_platform_layer_lib_win(release):
         "/DELAYLOAD:libGLESv2.dll",
     ]
 
-    subprocess.run([
-        "cl", "/nologo",
-        "/we4013", "/Zi", "/Zc:preprocessor",
-        "/DOC_BUILD_DLL",
-        "/std:c11", "/experimental:c11atomics",
-        *includes,
-        "src/orca.c", "/Fo:build/bin/orca.o",
-        "/LD", "/link",
-        "/MANIFEST:EMBED", "/MANIFESTINPUT:src/app/win32_manifest.xml",
-        *libs,
-        "/OUT:build/bin/orca.dll",
-        "/IMPLIB:build/bin/orca.dll.lib",
-    ], check=True)
-
-def build_platform_layer_lib_mac(release):
+    orca_obj = os.path.join(object_dir(release), "orca.obj")
+
+    add_compile_tasks(graph, [
+        CompileUnit("src/orca.c", orca_obj, [
+            "cl", "/nologo",
+            "/we4013", "/Zi", "/FS", "/Zc:preprocessor",
+            "/DOC_BUILD_DLL",
+            "/std:c11", "/experimental:c11atomics",
+            *includes,
+            "/c", "src/orca.c", f"/Fo:{orca_obj}",
+        ]),
+    ], cache, deps=[embed_task])
+
+    graph.add("link orca.dll", run_commands([
+            "cl", "/nologo", "/Zi",
+            orca_obj,
+            "/LD", "/link",
+            "/MANIFEST:EMBED", "/MANIFESTINPUT:src/app/win32_manifest.xml",
+            *libs,
+            "/OUT:build/bin/orca.dll",
+            "/IMPLIB:build/bin/orca.dll.lib",
+        ]),
+        inputs=[orca_obj],
+        outputs=["build/bin/orca.dll", "build/bin/orca.dll.lib"],
+    )
+
+
+def platform_layer_tasks_mac(graph, release, cache):
     flags = ["-mmacos-version-min=10.15.4"]
     cflags = ["-std=c11"]
     debug_flags = ["-O3"] if release else ["-g", "-DOC_DEBUG", "-DOC_LOG_COMPILE_DEBUG"]
@@ -175,102 +226,124 @@ def build_platform_layer_lib_mac(release):
     includes = ["-Isrc", "-Isrc/util", "-Isrc/platform", "-Isrc/ext", "-Isrc/ext/angle/include"]
 
     # compile metal shader
-    subprocess.run([
-        "xcrun", "-sdk", "macosx", "metal",
-        # TODO: shaderFlagParam
-        "-fno-fast-math", "-c",
-        "-o", "build/mtl_renderer.air",
-        "src/graphics/mtl_renderer.metal",
-    ], check=True)
-    subprocess.run([
-        "xcrun", "-sdk", "macosx", "metallib",
-        "-o", "build/bin/mtl_renderer.metallib",
-        "build/mtl_renderer.air",
-    ], check=True)
+    graph.add("compile mtl_renderer.metal", run_commands([
+            "xcrun", "-sdk", "macosx", "metal",
+            # TODO: shaderFlagParam
+            "-fno-fast-math", "-c",
+            "-o", "build/mtl_renderer.air",
+            "src/graphics/mtl_renderer.metal",
+        ]),
+        inputs=["src/graphics/mtl_renderer.metal"],
+        outputs=["build/mtl_renderer.air"],
+    )
+    graph.add("link mtl_renderer.metallib", run_commands([
+            "xcrun", "-sdk", "macosx", "metallib",
+            "-o", "build/bin/mtl_renderer.metallib",
+            "build/mtl_renderer.air",
+        ]),
+        inputs=["build/mtl_renderer.air"],
+        outputs=["build/bin/mtl_renderer.metallib"],
+    )
 
     # compile platform layer. We use one compilation unit for all C code, and one
     # compilation unit for all Objective-C code
-    subprocess.run([
-        "clang",
-        *debug_flags, "-c",
-        "-o", "build/orca_c.o",
-        *cflags, *flags, *includes,
-        "src/orca.c"
-    ], check=True)
-    subprocess.run([
-        "clang",
-        *debug_flags, "-c",
-        "-o", "build/orca_objc.o",
-        *flags, *includes,
-        "src/orca.m"
-    ], check=True)
-
-    # build dynamic library
-    subprocess.run([
-        "ld",
-        *ldflags, "-dylib",
-        "-o", "build/bin/liborca.dylib",
-        "build/orca_c.o", "build/orca_objc.o",
-        "-Lsrc/ext/angle/bin", "-lc",
-        "-framework", "Carbon", "-framework", "Cocoa", "-framework", "Metal", "-framework", "QuartzCore",
-        "-weak-lEGL", "-weak-lGLESv2",
-    ], check=True)
-
-    # change dependent libs path to @rpath
-    subprocess.run([
-        "install_name_tool",
-        "-change", "./libEGL.dylib", "@rpath/libEGL.dylib",
-        "build/bin/liborca.dylib",
-    ], check=True)
-    subprocess.run([
-        "install_name_tool",
-        "-change", "./libGLESv2.dylib", "@rpath/libGLESv2.dylib",
-        "build/bin/liborca.dylib",
-    ], check=True)
-
-    # add executable path to rpath. Client executable can still add its own
-    # rpaths if needed, e.g. @executable_path/libs/ etc.
-    subprocess.run([
-        "install_name_tool",
-        "-id", "@rpath/liborca.dylib",
-        "build/bin/liborca.dylib",
-    ], check=True)
-
-
-def build_wasm3(release):
-    print("Building wasm3...")
+    orca_c_obj = os.path.join(object_dir(release), "orca_c.o")
+    orca_objc_obj = os.path.join(object_dir(release), "orca_objc.o")
+
+    add_compile_tasks(graph, [
+        CompileUnit("src/orca.c", orca_c_obj, [
+            "clang",
+            *debug_flags, "-c",
+            "-o", orca_c_obj,
+            *cflags, *flags, *includes,
+            "src/orca.c"
+        ]),
+        CompileUnit("src/orca.m", orca_objc_obj, [
+            "clang",
+            *debug_flags, "-c",
+            "-o", orca_objc_obj,
+            *flags, *includes,
+            "src/orca.m"
+        ]),
+    ], cache)
+
+    graph.add("link liborca.dylib", run_commands(
+        # build dynamic library
+        [
+            "ld",
+            *ldflags, "-dylib",
+            "-o", "build/bin/liborca.dylib",
+            orca_c_obj, orca_objc_obj,
+            "-Lsrc/ext/angle/bin", "-lc",
+            "-framework", "Carbon", "-framework", "Cocoa", "-framework", "Metal", "-framework", "QuartzCore",
+            "-weak-lEGL", "-weak-lGLESv2",
+        ],
+        # change dependent libs path to @rpath
+        [
+            "install_name_tool",
+            "-change", "./libEGL.dylib", "@rpath/libEGL.dylib",
+            "build/bin/liborca.dylib",
+        ],
+        [
+            "install_name_tool",
+            "-change", "./libGLESv2.dylib", "@rpath/libGLESv2.dylib",
+            "build/bin/liborca.dylib",
+        ],
+        # add executable path to rpath. Client executable can still add its own
+        # rpaths if needed, e.g. @executable_path/libs/ etc.
+        [
+            "install_name_tool",
+            "-id", "@rpath/liborca.dylib",
+            "build/bin/liborca.dylib",
+        ]),
+        inputs=[orca_c_obj, orca_objc_obj],
+        outputs=["build/bin/liborca.dylib"],
+    )
 
+
+def wasm3_tasks(graph, release, cache):
     os.makedirs("build/bin", exist_ok=True)
     os.makedirs("build/lib", exist_ok=True)
-    os.makedirs("build/obj", exist_ok=True)
+    os.makedirs(os.path.join(object_dir(release), "wasm3"), exist_ok=True)
 
     if platform.system() == "Windows":
-        build_wasm3_lib_win(release)
+        wasm3_tasks_win(graph, release, cache)
     elif platform.system() == "Darwin":
-        build_wasm3_lib_mac(release)
+        wasm3_tasks_mac(graph, release, cache)
     else:
         log_error(f"can't build wasm3 for unknown platform '{platform.system()}'")
         exit(1)
 
 
-def build_wasm3_lib_win(release):
-    for f in glob.iglob("./src/ext/wasm3/source/*.c"):
+def wasm3_tasks_win(graph, release, cache):
+    obj_dir = os.path.join(object_dir(release), "wasm3")
+
+    units = []
+    for f in glob.glob("./src/ext/wasm3/source/*.c"):
         name = os.path.splitext(os.path.basename(f))[0]
-        subprocess.run([
+        obj = os.path.join(obj_dir, f"{name}.obj")
+        # /FS serializes writes to the shared PDB so parallel cl processes don't clash.
+        units.append(CompileUnit(f, obj, [
             "cl", "/nologo",
-            "/Zi", "/Zc:preprocessor", "/c",
+            "/Zi", "/FS", "/Zc:preprocessor", "/c",
             "/O2",
-            f"/Fo:build/obj/{name}.obj",
+            f"/Fo:{obj}",
             "/I", "./src/ext/wasm3/source",
             f,
-        ], check=True)
-    subprocess.run([
-        "lib", "/nologo", "/out:build/bin/wasm3.lib",
-        "build/obj/*.obj",
-    ], check=True)
+        ]))
+    add_compile_tasks(graph, units, cache)
+
+    objs = [unit.output for unit in units]
+    graph.add("archive wasm3.lib", run_commands([
+            "lib", "/nologo", "/out:build/bin/wasm3.lib",
+            *objs,
+        ]),
+        inputs=objs,
+        outputs=["build/bin/wasm3.lib"],
+    )
 
 
-def build_wasm3_lib_mac(release):
+def wasm3_tasks_mac(graph, release, cache):
     includes = ["-Isrc/ext/wasm3/source"]
     debug_flags = ["-g", "-O2"]
     flags = [
@@ -281,35 +354,44 @@ def build_wasm3_lib_mac(release):
         "-mmacos-version-min=10.15.4"
     ]
 
-    for f in glob.iglob("src/ext/wasm3/source/*.c"):
+    obj_dir = os.path.join(object_dir(release), "wasm3")
+
+    units = []
+    for f in glob.glob("src/ext/wasm3/source/*.c"):
         name = os.path.splitext(os.path.basename(f))[0] + ".o"
-        subprocess.run([
+        obj = os.path.join(obj_dir, name)
+        units.append(CompileUnit(f, obj, [
             "clang", "-c", *flags, *includes,
-            "-o", f"build/obj/{name}",
+            "-o", obj,
             f,
-        ], check=True)
-    subprocess.run(["libtool", "-static", "-o", "build/lib/libwasm3.a", "-no_warning_for_no_symbols", *glob.glob("build/obj/*.o")], check=True)
-    subprocess.run(["rm", "-rf", "build/obj"], check=True)
-
+        ]))
+    add_compile_tasks(graph, units, cache)
+
+    objs = [unit.output for unit in units]
+    graph.add("archive libwasm3.a", run_commands(
+            ["libtool", "-static", "-o", "build/lib/libwasm3.a", "-no_warning_for_no_symbols", *objs],
+        ),
+        inputs=objs,
+        outputs=["build/lib/libwasm3.a"],
+    )
 
-def build_orca(release):
-    print("Building Orca runtime...")
 
+def orca_tasks(graph, release, cache, profile_bindings=False, capture_bindings=False):
     os.makedirs("build/bin", exist_ok=True)
     os.makedirs("build/lib", exist_ok=True)
+    os.makedirs(object_dir(release), exist_ok=True)
 
     if platform.system() == "Windows":
-        build_orca_win(release)
+        orca_tasks_win(graph, release, cache, profile_bindings, capture_bindings)
     elif platform.system() == "Darwin":
-        build_orca_mac(release)
+        orca_tasks_mac(graph, release, cache, profile_bindings, capture_bindings)
     else:
         log_error(f"can't build Orca for unknown platform '{platform.system()}'")
         exit(1)
 
 
-def build_orca_win(release):
-
-    gen_all_bindings()
+def orca_tasks_win(graph, release, cache, profile_bindings=False, capture_bindings=False):
+    bindings_task = graph.add("generate bindings", lambda: gen_all_bindings(profile_bindings, capture_bindings))
 
     # compile orca
     includes = [
@@ -324,18 +406,32 @@ def build_orca_win(release):
         "wasm3.lib",
     ]
 
-    subprocess.run([
-        "cl",
-        "/Zi", "/Zc:preprocessor",
-        "/std:c11", "/experimental:c11atomics",
-        *includes,
-        "src/runtime.c",
-        "/link", *libs,
-        "/out:build/bin/orca_runtime.exe",
-    ], check=True)
+    runtime_obj = os.path.join(object_dir(release), "runtime.obj")
+
+    add_compile_tasks(graph, [
+        CompileUnit("src/runtime.c", runtime_obj, [
+            "cl", "/nologo",
+            "/Zi", "/FS", "/Zc:preprocessor",
+            "/std:c11", "/experimental:c11atomics",
+            *(["/DOC_BINDGEN_PROFILE=1"] if profile_bindings else []),
+            *(["/DOC_BINDGEN_CAPTURE=1"] if capture_bindings else []),
+            *includes,
+            "/c", "src/runtime.c", f"/Fo:{runtime_obj}",
+        ]),
+    ], cache, deps=[bindings_task])
+
+    graph.add("link orca_runtime.exe", run_commands([
+            "cl", "/nologo", "/Zi",
+            runtime_obj,
+            "/link", *libs,
+            "/out:build/bin/orca_runtime.exe",
+        ]),
+        inputs=[runtime_obj, "build/bin/orca.dll.lib", "build/bin/wasm3.lib"],
+        outputs=["build/bin/orca_runtime.exe"],
+    )
 
 
-def build_orca_mac(release):
+def orca_tasks_mac(graph, release, cache, profile_bindings=False, capture_bindings=False):
 
     includes = [
         "-Isrc",
@@ -349,58 +445,144 @@ def build_orca_mac(release):
         *debug_flags,
         "-mmacos-version-min=10.15.4"]
 
-    gen_all_bindings()
+    bindings_task = graph.add("generate bindings", lambda: gen_all_bindings(profile_bindings, capture_bindings))
 
     # compile orca
-    subprocess.run([
-        "clang", *flags, *includes, *libs,
-        "-o", "build/bin/orca_runtime",
-        "src/runtime.c",
-    ], check=True)
-
-    # fix libs imports
-    subprocess.run([
-        "install_name_tool",
-        "-change", "build/bin/liborca.dylib", "@rpath/liborca.dylib",
-        "build/bin/orca_runtime",
-    ], check=True)
-    subprocess.run([
-        "install_name_tool",
-        "-add_rpath", "@executable_path/",
-        "build/bin/orca_runtime",
-    ], check=True)
-
-
-def gen_all_bindings():
-    gles_gen("src/ext/gl.xml",
-        "src/wasmbind/gles_api.json",
-        "src/graphics/orca_gl31.h",
-        log_file='./build/gles_gen.log'
+    runtime_obj = os.path.join(object_dir(release), "runtime.o")
+
+    add_compile_tasks(graph, [
+        CompileUnit("src/runtime.c", runtime_obj, [
+            "clang", *flags, *includes, "-c",
+            *(["-DOC_BINDGEN_PROFILE=1"] if profile_bindings else []),
+            *(["-DOC_BINDGEN_CAPTURE=1"] if capture_bindings else []),
+            "-o", runtime_obj,
+            "src/runtime.c",
+        ]),
+    ], cache, deps=[bindings_task])
+
+    graph.add("link orca_runtime", run_commands(
+        [
+            "clang", *flags, *libs,
+            "-o", "build/bin/orca_runtime",
+            runtime_obj,
+        ],
+        # fix libs imports
+        [
+            "install_name_tool",
+            "-change", "build/bin/liborca.dylib", "@rpath/liborca.dylib",
+            "build/bin/orca_runtime",
+        ],
+        [
+            "install_name_tool",
+            "-add_rpath", "@executable_path/",
+            "build/bin/orca_runtime",
+        ]),
+        inputs=[runtime_obj, "build/bin/liborca.dylib", "build/lib/libwasm3.a"],
+        outputs=["build/bin/orca_runtime"],
     )
 
-    bindgen("gles", "src/wasmbind/gles_api.json",
-        wasm3_bindings="src/wasmbind/gles_api_bind_gen.c",
-    )
-
-    bindgen("core", "src/wasmbind/core_api.json",
-        guest_stubs="src/wasmbind/core_api_stubs.c",
-        wasm3_bindings="src/wasmbind/core_api_bind_gen.c",
-    )
 
-    bindgen("surface", "src/wasmbind/surface_api.json",
-        guest_stubs="src/graphics/orca_surface_stubs.c",
-        guest_include="graphics/graphics.h",
-        wasm3_bindings="src/wasmbind/surface_api_bind_gen.c",
+BINDINGS = [
+    ("gles", "src/wasmbind/gles_api.json", {
+        "wasm3_bindings": "src/wasmbind/gles_api_bind_gen.c",
+        "batch_stubs": "src/graphics/orca_gles_batch_stubs.c",
+        "batch_exclude": ["glFinish", "glFlush"],
+    }),
+    ("core", "src/wasmbind/core_api.json", {
+        "guest_stubs": "src/wasmbind/core_api_stubs.c",
+        "wasm3_bindings": "src/wasmbind/core_api_bind_gen.c",
+    }),
+    ("surface", "src/wasmbind/surface_api.json", {
+        "guest_stubs": "src/graphics/orca_surface_stubs.c",
+        "guest_include": "graphics/graphics.h",
+        "guest_flush": ("OC_GLES_BATCH", "oc_gles_batch_flush"),
+        "wasm3_bindings": "src/wasmbind/surface_api_bind_gen.c",
+    }),
+    ("clock", "src/wasmbind/clock_api.json", {
+        "guest_include": "platform/platform_clock.h",
+        "wasm3_bindings": "src/wasmbind/clock_api_bind_gen.c",
+    }),
+    ("io", "src/wasmbind/io_api.json", {
+        "guest_stubs": "src/platform/orca_io_stubs.c",
+        "wasm3_bindings": "src/wasmbind/io_api_bind_gen.c",
+    }),
+]
+
+# APIs whose calls can be captured and replayed. The others read and write the
+# app's memory and state, so their calls can't be replayed without the app.
+CAPTURE_BINDINGS = ["gles", "surface"]
+
+
+def gen_all_bindings(profile=False, capture=False):
+    # Regenerating the bindings rewrites their outputs, which would invalidate
+    # every object that includes them, so each generator only runs when its
+    # inputs or the generator scripts themselves have changed.
+    stamps = GeneratorStamps("build/bindings.stamp")
+    scripts_dir = os.path.dirname(os.path.abspath(__file__))
+
+    stamps.run("gles_gen",
+        lambda: gles_gen("src/ext/gl.xml",
+            "src/wasmbind/gles_api.json",
+            "src/graphics/orca_gl31.h",
+            log_file='./build/gles_gen.log'
+        ),
+        inputs=[
+            "src/ext/gl.xml",
+            os.path.join(scripts_dir, "gles_gen.py"),
+            os.path.join(scripts_dir, "reg_modified.py"),
+        ],
+        outputs=["src/wasmbind/gles_api.json", "src/graphics/orca_gl31.h"],
     )
 
-    bindgen("clock", "src/wasmbind/clock_api.json",
-        guest_include="platform/platform_clock.h",
-        wasm3_bindings="src/wasmbind/clock_api_bind_gen.c",
-    )
-    bindgen("io", "src/wasmbind/io_api.json",
-        guest_stubs="src/platform/orca_io_stubs.c",
-        wasm3_bindings="src/wasmbind/io_api_bind_gen.c",
-    )
+    for api, spec, kwargs in BINDINGS:
+        if profile:
+            kwargs = {**kwargs, "profile": True}
+        if capture and api in CAPTURE_BINDINGS:
+            kwargs = {**kwargs, "capture": True}
+        outputs = [kwargs[key] for key in ["guest_stubs", "wasm3_bindings", "batch_stubs"] if key in kwargs]
+        stamps.run(f"bindgen {api}",
+            lambda: bindgen(api, spec, **kwargs),
+            inputs=[spec, os.path.join(scripts_dir, "bindgen.py")],
+            outputs=outputs,
+            params=kwargs,
+        )
+
+
+class GeneratorStamps:
+    # Remembers a hash of each generator's inputs from the last time it ran, so
+    # it can be skipped when nothing has changed and its outputs still exist.
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "r") as f:
+                self.stamps = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.stamps = {}
+
+    def run(self, name, func, inputs, outputs, params=None):
+        with trace_step(name, cat="generator") as trace_args:
+            key = self.key(inputs, params)
+            if self.stamps.get(name) == key and all(os.path.exists(output) for output in outputs):
+                trace_args["status"] = "up to date"
+                print(f"{name}: up to date")
+                return
+
+            func()
+            self.stamps[name] = key
+            self.save()
+            print(f"{name}: regenerated")
+
+    def key(self, inputs, params):
+        return checksum.stringsum(json.dumps({
+            "inputs": {os.path.relpath(input): checksum.filesum(input) for input in inputs},
+            "params": params,
+        }, sort_keys=True))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.stamps, f, indent=2, sort_keys=True)
 
 
 def ensure_programs():
@@ -472,6 +654,11 @@ def ensure_angle():
 
 
 def verify_angle():
+    with trace_step("verify ANGLE"):
+        return verify_angle_files()
+
+
+def verify_angle_files():
     checkfiles = None
     if platform.system() == "Windows":
         checkfiles = [
@@ -588,10 +775,6 @@ def install(args):
         if not prompt("Proceed with the installation?"):
             return
 
-    yeetdir(bin_dir)
-    yeetdir(src_dir)
-    yeetdir(build_dir)
-    yeetdir(res_dir)
     yeetfile(version_file)
 
     # The MS Store version of Python does some really stupid stuff with AppData:
@@ -605,35 +788,42 @@ def install(args):
     # Also apparently you can't just do mkdir in a subprocess call here, hence the
     # trivial batch scripts.
     if platform.system() == "Windows":
-        subprocess.run(["scripts\\mkdir.bat", bin_dir], check=True)
-        subprocess.run(["scripts\\mkdir.bat", src_dir], check=True)
-        subprocess.run(["scripts\\mkdir.bat", build_dir], check=True)
-        subprocess.run(["scripts\\mkdir.bat", res_dir], check=True)
+        for dir in [bin_dir, src_dir, build_dir, res_dir]:
+            if not os.path.isdir(dir):
+                subprocess.run(["scripts\\mkdir.bat", dir], check=True)
         subprocess.run(["scripts\\touch.bat", version_file], check=True)
-    else:
-        # unfortunately need to do this since build_dir is nested
-        os.makedirs(build_dir, exist_ok=True)
 
-    shutil.copytree("scripts", os.path.join(bin_dir, "sys_scripts"))
-    shutil.copy("orca", bin_dir)
-    shutil.copytree("src", src_dir, dirs_exist_ok=True)
-    shutil.copytree("resources", res_dir, dirs_exist_ok=True)
+    # Only files that actually changed since the last install are rewritten, and
+    # anything left over from an older install is deleted.
+    sync = Sync(link=args.link)
+    sync.add_tree("scripts", os.path.join(bin_dir, "sys_scripts"), exclude=["__pycache__"])
+    sync.add_file("orca", os.path.join(bin_dir, "orca"))
+    sync.add_tree("src", src_dir)
+    sync.add_tree("resources", res_dir)
     if platform.system() == "Windows":
-        shutil.copy("orca.bat", bin_dir)
-        shutil.copy("build\\bin\\orca.dll", build_dir)
-        shutil.copy("build\\bin\\orca_runtime.exe", build_dir)
-        shutil.copy("src\\ext\\angle\\bin\\libEGL.dll", build_dir)
-        shutil.copy("src\\ext\\angle\\bin\\libGLESv2.dll", build_dir)
+        sync.add_file("orca.bat", os.path.join(bin_dir, "orca.bat"))
+        runtime_files = [
+            "build\\bin\\orca.dll",
+            "build\\bin\\orca_runtime.exe",
+            "src\\ext\\angle\\bin\\libEGL.dll",
+            "src\\ext\\angle\\bin\\libGLESv2.dll",
+        ]
     else:
-        shutil.copy("build/bin/liborca.dylib", build_dir)
-        shutil.copy("build/bin/mtl_renderer.metallib", build_dir)
-        shutil.copy("build/bin/orca_runtime", build_dir)
-        shutil.copy("src/ext/angle/bin/libEGL.dylib", build_dir)
-        shutil.copy("src/ext/angle/bin/libGLESv2.dylib", build_dir)
+        runtime_files = [
+            "build/bin/liborca.dylib",
+            "build/bin/mtl_renderer.metallib",
+            "build/bin/orca_runtime",
+            "src/ext/angle/bin/libEGL.dylib",
+            "src/ext/angle/bin/libGLESv2.dylib",
+        ]
+    for file in runtime_files:
+        sync.add_file(file, os.path.join(build_dir, os.path.basename(file)))
+    stats = sync.run(prune=[bin_dir, src_dir, build_dir, res_dir])
 
     with open(version_file, "w") as f:
         f.write(version)
 
+    print(f"Installed files: {stats.summary()}.")
     print()
     if platform.system() == "Windows":
         print("The Orca tools have been installed to the following directory:")
@@ -0,0 +1,394 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+
+from .checksum import cache_dir, cached_filehash
+
+
+# A TrueType subsetter: keeps the glyphs of a set of characters (and the glyphs
+# their composite glyphs are made of), renumbers them, and rewrites the tables
+# that index glyphs. Tables the runtime doesn't use and that would need glyph
+# renumbering (AAT/OpenType layout, hdmx, kern, ...) are dropped. head and hhea
+# are copied as they are, so font-wide metrics don't change.
+
+FONT_SUBSET_VERSION = 1
+
+# Named character sets for --font-subset.
+FONT_CHARSETS = {
+    "ascii": [(0x20, 0x7e)],
+    "latin-1": [(0x20, 0x7e), (0xa0, 0xff)],
+    "latin-ext": [(0x20, 0x7e), (0xa0, 0x24f)],
+}
+
+# Always kept: the runtime measures the font's x-height and cap height on 'x' and 'M'.
+FONT_REQUIRED_CHARS = " xM"
+
+FONT_KEEP_TABLES = [b"OS/2", b"cmap", b"cvt ", b"fpgm", b"gasp", b"glyf", b"head", b"hhea", b"hmtx", b"loca", b"maxp", b"name", b"post", b"prep"]
+
+# Composite glyph flags
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+class FontError(Exception):
+    pass
+
+
+def parse_charset(spec):
+    # Returns the set of code points described by spec, which is either a file
+    # (every character in it, read as UTF-8) or a comma-separated list of named
+    # sets and U+XXXX or U+XXXX-YYYY ranges.
+    if os.path.isfile(spec):
+        with open(spec, "r", encoding="utf-8") as f:
+            return {ord(c) for c in f.read() if ord(c) >= 0x20}
+
+    codepoints = set()
+    for item in spec.split(","):
+        item = item.strip().lower()
+        if item in FONT_CHARSETS:
+            for first, last in FONT_CHARSETS[item]:
+                codepoints.update(range(first, last + 1))
+            continue
+        match = re.fullmatch(r"u\+([0-9a-f]{1,6})(?:-(?:u\+)?([0-9a-f]{1,6}))?", item)
+        if match is None:
+            names = ", ".join(FONT_CHARSETS)
+            raise FontError(f"invalid character set '{item}' (expected a file, {names}, or U+XXXX[-YYYY])")
+        first = int(match.group(1), 16)
+        last = int(match.group(2), 16) if match.group(2) else first
+        codepoints.update(range(first, last + 1))
+    return codepoints
+
+
+def subset_font_file(src, codepoints):
+    # Returns the path of a subset of the font at src, keeping the given code
+    # points. Subsets are cached by the font's hash and the set of code points.
+    codepoints = sorted(set(codepoints) | {ord(c) for c in FONT_REQUIRED_CHARS})
+    key = hashlib.sha256(json.dumps([FONT_SUBSET_VERSION, cached_filehash(src, hashlib.sha256), codepoints]).encode("utf-8")).hexdigest()
+    font_dir = os.path.join(cache_dir(), "fonts", key)
+    font_path = os.path.join(font_dir, os.path.basename(src))
+    if os.path.exists(font_path):
+        return font_path
+
+    with open(src, "rb") as f:
+        try:
+            data = subset_font(f.read(), codepoints)
+        except (FontError, struct.error, IndexError) as err:
+            raise FontError(f"couldn't subset font {src}: {err}")
+
+    os.makedirs(font_dir, exist_ok=True)
+    tmp_path = f"{font_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, font_path)
+    return font_path
+
+
+def subset_font(data, codepoints):
+    tables = read_tables(data)
+    for tag in [b"head", b"hhea", b"maxp", b"cmap", b"hmtx", b"loca", b"glyf"]:
+        if tag not in tables:
+            raise FontError("only TrueType fonts can be subset" if tag == b"glyf" else f"missing {tag.decode()} table")
+
+    head = tables[b"head"]
+    num_glyphs = struct.unpack_from(">H", tables[b"maxp"], 4)[0]
+    long_loca = struct.unpack_from(">h", head, 50)[0] == 1
+    loca = _read_loca(tables[b"loca"], num_glyphs, long_loca)
+    glyf = tables[b"glyf"]
+
+    cmap = {cp: gid for cp, gid in read_cmap(tables[b"cmap"]).items() if cp in codepoints and 0 < gid < num_glyphs}
+
+    # new glyph order: .notdef, then glyphs in code point order, then the components of composites
+    order = [0]
+    new_ids = {0: 0}
+    for cp in sorted(cmap):
+        if cmap[cp] not in new_ids:
+            new_ids[cmap[cp]] = len(order)
+            order.append(cmap[cp])
+    i = 0
+    while i < len(order):
+        for component in _components(glyf[loca[order[i]]:loca[order[i] + 1]]):
+            if component >= num_glyphs:
+                raise FontError(f"composite glyph {order[i]} references missing glyph {component}")
+            if component not in new_ids:
+                new_ids[component] = len(order)
+                order.append(component)
+        i += 1
+
+    # glyf and loca
+    new_glyf = bytearray()
+    offsets = []
+    for gid in order:
+        offsets.append(len(new_glyf))
+        glyph = _remap_components(glyf[loca[gid]:loca[gid + 1]], new_ids)
+        new_glyf += glyph + b"\0" * (-len(glyph) % 4)
+    offsets.append(len(new_glyf))
+    long_loca = len(new_glyf) // 2 > 0xffff
+    if long_loca:
+        new_loca = struct.pack(f">{len(offsets)}I", *offsets)
+    else:
+        new_loca = struct.pack(f">{len(offsets)}H", *[offset // 2 for offset in offsets])
+
+    # hmtx, without the trailing run of equal advances (all of them in a monospaced font)
+    metrics = _read_hmtx(tables[b"hmtx"], struct.unpack_from(">H", tables[b"hhea"], 34)[0], num_glyphs)
+    new_metrics = [metrics[gid] for gid in order]
+    num_hmetrics = len(new_metrics)
+    while num_hmetrics > 1 and new_metrics[num_hmetrics - 2][0] == new_metrics[-1][0]:
+        num_hmetrics -= 1
+    new_hmtx = b"".join(struct.pack(">Hh", *m) for m in new_metrics[:num_hmetrics])
+    new_hmtx += b"".join(struct.pack(">h", m[1]) for m in new_metrics[num_hmetrics:])
+
+    out = {tag: tables[tag] for tag in FONT_KEEP_TABLES if tag in tables}
+    out[b"glyf"] = bytes(new_glyf)
+    out[b"loca"] = new_loca
+    out[b"hmtx"] = new_hmtx
+    out[b"cmap"] = write_cmap({cp: new_ids[gid] for cp, gid in cmap.items()})
+    out[b"head"] = head[:8] + b"\0\0\0\0" + head[12:50] + struct.pack(">h", 1 if long_loca else 0) + head[52:]
+    out[b"hhea"] = tables[b"hhea"][:34] + struct.pack(">H", num_hmetrics) + tables[b"hhea"][36:]
+    out[b"maxp"] = tables[b"maxp"][:4] + struct.pack(">H", len(order)) + tables[b"maxp"][6:]
+    if b"post" in out:
+        # format 3 has no glyph names
+        out[b"post"] = struct.pack(">I", 0x00030000) + out[b"post"][4:32]
+    if b"OS/2" in out and len(out[b"OS/2"]) >= 68 and len(cmap) > 0:
+        os2 = out[b"OS/2"]
+        out[b"OS/2"] = os2[:64] + struct.pack(">HH", min(min(cmap), 0xffff), min(max(cmap), 0xffff)) + os2[68:]
+
+    font = write_tables(out)
+    adjustment = (0xb1b0afba - _checksum(font)) & 0xffffffff
+    head_offset = _table_offset(font, b"head")
+    return font[:head_offset + 8] + struct.pack(">I", adjustment) + font[head_offset + 12:]
+
+
+#-------------------------------------------------------------------------------
+# sfnt container
+#-------------------------------------------------------------------------------
+
+def read_tables(data):
+    version, count = struct.unpack_from(">IH", data, 0)
+    if version not in (0x00010000, 0x74727565):  # 'true'
+        raise FontError("not a TrueType font" + (" (font collections aren't supported)" if version == 0x74746366 else ""))
+    tables = {}
+    for i in range(count):
+        tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        if offset + length > len(data):
+            raise FontError(f"truncated {tag.decode(errors='replace')} table")
+        tables[tag] = data[offset:offset + length]
+    return tables
+
+
+def write_tables(tables):
+    tags = sorted(tables)
+    entry_selector = max(len(tags).bit_length() - 1, 0)
+    search_range = 16 << entry_selector
+    header = struct.pack(">IHHHH", 0x00010000, len(tags), search_range, entry_selector, 16 * len(tags) - search_range)
+
+    directory = b""
+    body = b""
+    offset = len(header) + 16 * len(tags)
+    for tag in tags:
+        data = tables[tag]
+        directory += struct.pack(">4sIII", tag, _checksum(data), offset + len(body), len(data))
+        body += data + b"\0" * (-len(data) % 4)
+    return header + directory + body
+
+
+def _table_offset(font, tag):
+    count = struct.unpack_from(">H", font, 4)[0]
+    for i in range(count):
+        entry_tag, _, offset, _ = struct.unpack_from(">4sIII", font, 12 + 16 * i)
+        if entry_tag == tag:
+            return offset
+    raise FontError(f"missing {tag.decode()} table")
+
+
+def _checksum(data):
+    data += b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(data) // 4}I", data)) & 0xffffffff
+
+
+#-------------------------------------------------------------------------------
+# cmap
+#-------------------------------------------------------------------------------
+
+def read_cmap(cmap):
+    # Returns a dict mapping code points to glyph ids, from the best Unicode subtable.
+    _, count = struct.unpack_from(">HH", cmap, 0)
+    subtables = {}
+    for i in range(count):
+        platform_id, encoding_id, offset = struct.unpack_from(">HHI", cmap, 4 + 8 * i)
+        subtables[(platform_id, encoding_id)] = offset
+
+    for key in [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)]:
+        if key in subtables:
+            offset = subtables[key]
+            format = struct.unpack_from(">H", cmap, offset)[0]
+            if format == 4:
+                return _read_cmap_format4(cmap, offset)
+            if format == 12:
+                return _read_cmap_format12(cmap, offset)
+    raise FontError("no supported Unicode cmap subtable")
+
+
+def _read_cmap_format4(cmap, offset):
+    seg_count = struct.unpack_from(">H", cmap, offset + 6)[0] // 2
+    ends = struct.unpack_from(f">{seg_count}H", cmap, offset + 14)
+    starts = struct.unpack_from(f">{seg_count}H", cmap, offset + 16 + 2 * seg_count)
+    deltas = struct.unpack_from(f">{seg_count}h", cmap, offset + 16 + 4 * seg_count)
+    range_offsets_pos = offset + 16 + 6 * seg_count
+    range_offsets = struct.unpack_from(f">{seg_count}H", cmap, range_offsets_pos)
+
+    mapping = {}
+    for i in range(seg_count):
+        for cp in range(starts[i], ends[i] + 1):
+            if cp == 0xffff:
+                continue
+            if range_offsets[i] == 0:
+                gid = (cp + deltas[i]) & 0xffff
+            else:
+                pos = range_offsets_pos + 2 * i + range_offsets[i] + 2 * (cp - starts[i])
+                gid = struct.unpack_from(">H", cmap, pos)[0]
+                if gid != 0:
+                    gid = (gid + deltas[i]) & 0xffff
+            if gid != 0:
+                mapping[cp] = gid
+    return mapping
+
+
+def _read_cmap_format12(cmap, offset):
+    count = struct.unpack_from(">I", cmap, offset + 12)[0]
+    mapping = {}
+    for i in range(count):
+        first, last, gid = struct.unpack_from(">III", cmap, offset + 16 + 12 * i)
+        for cp in range(first, last + 1):
+            mapping[cp] = gid + cp - first
+    return mapping
+
+
+def write_cmap(mapping):
+    # A format 4 subtable for the BMP, plus a format 12 one if there are code
+    # points beyond it. Each is listed for both the Unicode and Windows platforms.
+    bmp = {cp: gid for cp, gid in mapping.items() if cp < 0xffff}
+    format4 = _write_cmap_format4(bmp)
+    records = [(0, 3, format4), (3, 1, format4)]
+    if len(bmp) < len(mapping):
+        format12 = _write_cmap_format12(mapping)
+        records = [(0, 3, format4), (0, 4, format12), (3, 1, format4), (3, 10, format12)]
+
+    data = struct.pack(">HH", 0, len(records))
+    subtables = [format4] if len(records) == 2 else [format4, format12]
+    offsets = []
+    offset = len(data) + 8 * len(records)
+    for subtable in subtables:
+        offsets.append(offset)
+        offset += len(subtable)
+    for platform_id, encoding_id, subtable in records:
+        data += struct.pack(">HHI", platform_id, encoding_id, offsets[subtables.index(subtable)])
+    return data + b"".join(subtables)
+
+
+def _write_cmap_format4(mapping):
+    # one segment per run of consecutive code points, using idDelta when the
+    # glyph ids are consecutive too, and the glyph id array otherwise
+    segments = []
+    for cp in sorted(mapping):
+        if segments and segments[-1][1] == cp - 1:
+            segments[-1][1] = cp
+        else:
+            segments.append([cp, cp])
+    segments.append([0xffff, 0xffff])
+
+    seg_count = len(segments)
+    ends = []
+    starts = []
+    deltas = []
+    range_offsets = []
+    glyph_ids = []
+    for i, (start, end) in enumerate(segments):
+        starts.append(start)
+        ends.append(end)
+        if start == 0xffff:
+            deltas.append(1)
+            range_offsets.append(0)
+            continue
+        gids = [mapping[cp] for cp in range(start, end + 1)]
+        if all(gids[k] == gids[0] + k for k in range(len(gids))):
+            deltas.append((gids[0] - start) & 0xffff)
+            range_offsets.append(0)
+        else:
+            deltas.append(0)
+            range_offsets.append(2 * (seg_count - i) + 2 * len(glyph_ids))
+            glyph_ids += gids
+
+    entry_selector = max(seg_count.bit_length() - 1, 0)
+    search_range = 2 << entry_selector
+    data = struct.pack(">HHHH", seg_count * 2, search_range, entry_selector, 2 * seg_count - search_range)
+    data += struct.pack(f">{seg_count}H", *ends) + b"\0\0"
+    data += struct.pack(f">{seg_count}H", *starts)
+    data += struct.pack(f">{seg_count}H", *deltas)
+    data += struct.pack(f">{seg_count}H", *range_offsets)
+    data += struct.pack(f">{len(glyph_ids)}H", *glyph_ids)
+    return struct.pack(">HHH", 4, 6 + len(data), 0) + data
+
+
+def _write_cmap_format12(mapping):
+    groups = []
+    for cp in sorted(mapping):
+        gid = mapping[cp]
+        if groups and groups[-1][1] == cp - 1 and groups[-1][2] + cp - groups[-1][0] == gid:
+            groups[-1][1] = cp
+        else:
+            groups.append([cp, cp, gid])
+    data = b"".join(struct.pack(">III", *group) for group in groups)
+    return struct.pack(">HHIII", 12, 0, 16 + len(data), 0, len(groups)) + data
+
+
+#-------------------------------------------------------------------------------
+# Glyphs and metrics
+#-------------------------------------------------------------------------------
+
+def _read_loca(loca, num_glyphs, long_loca):
+    if long_loca:
+        return struct.unpack_from(f">{num_glyphs + 1}I", loca, 0)
+    return [offset * 2 for offset in struct.unpack_from(f">{num_glyphs + 1}H", loca, 0)]
+
+
+def _read_hmtx(hmtx, num_hmetrics, num_glyphs):
+    # Returns (advance, left side bearing) for every glyph.
+    metrics = [struct.unpack_from(">Hh", hmtx, 4 * i) for i in range(num_hmetrics)]
+    bearings = struct.unpack_from(f">{num_glyphs - num_hmetrics}h", hmtx, 4 * num_hmetrics)
+    return metrics + [(metrics[-1][0], bearing) for bearing in bearings]
+
+
+def _component_offsets(glyph):
+    # Yields the offset of each component's glyph index in a composite glyph.
+    if len(glyph) < 10 or struct.unpack_from(">h", glyph, 0)[0] >= 0:
+        return
+    pos = 10
+    while True:
+        flags = struct.unpack_from(">H", glyph, pos)[0]
+        yield pos + 2
+        pos += 4 + (4 if flags & ARG_1_AND_2_ARE_WORDS else 2)
+        if flags & WE_HAVE_A_SCALE:
+            pos += 2
+        elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+            pos += 4
+        elif flags & WE_HAVE_A_TWO_BY_TWO:
+            pos += 8
+        if not flags & MORE_COMPONENTS:
+            return
+
+
+def _components(glyph):
+    return [struct.unpack_from(">H", glyph, pos)[0] for pos in _component_offsets(glyph)]
+
+
+def _remap_components(glyph, new_ids):
+    glyph = bytearray(glyph)
+    for pos in _component_offsets(glyph):
+        struct.pack_into(">H", glyph, pos, new_ids[struct.unpack_from(">H", glyph, pos)[0]])
+    return bytes(glyph)
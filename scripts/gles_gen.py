@@ -17,7 +17,7 @@ removeProc = [
 
 def gen_gles_header(spec, filename, log_file):
 	# Generates the GLES header, wrapping gl functions
-	# prototypes in ORCA_IMPORT() macro
+	# prototypes in ORCA_GL_IMPORT() macro
 
 	gles2through31Pat = '2\.[0-9]|3\.[01]'
 	allVersions = '.*'
@@ -29,7 +29,7 @@ def gen_gles_header(spec, filename, log_file):
 		versions=gles2through31Pat,
 		emitversions=allVersions,
 		protectProto=False,
-		procMacro='ORCA_IMPORT',
+		procMacro='ORCA_GL_IMPORT',
 		removeProc = removeProc)
 
 	reg = Registry()
@@ -0,0 +1,166 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+
+from .checksum import cache_dir, cached_filehash
+from .images import ImageError, decode_png, encode_png
+
+
+# App icons are generated from a single PNG, entirely in Python: the source is
+# decoded once, scaled down to every size the platform wants, and written as a
+# .icns (macOS) or .ico (Windows) file. The result is cached by the source's
+# hash, so bundling again with the same icon doesn't redo any of it.
+
+ICON_CACHE_VERSION = 1
+
+# (type, size) of each image in a .icns, all stored as PNGs (supported since
+# macOS 10.7). These are the entries iconutil writes for a complete iconset.
+ICNS_ENTRIES = [
+    (b"icp4", 16),
+    (b"ic11", 32),  # 16x16@2x
+    (b"icp5", 32),
+    (b"ic12", 64),  # 32x32@2x
+    (b"ic07", 128),
+    (b"ic13", 256),  # 128x128@2x
+    (b"ic08", 256),
+    (b"ic14", 512),  # 256x256@2x
+    (b"ic09", 512),
+    (b"ic10", 1024),  # 512x512@2x
+]
+
+# Sizes of the images in a .ico, stored as PNGs (supported since Windows Vista).
+ICO_SIZES = [16, 24, 32, 48, 64, 128, 256]
+
+
+def make_icon(src, kind):
+    # Returns the path of an icon of the given kind ("icns" or "ico") made from
+    # the PNG at src, generating it if it isn't cached yet.
+    if kind not in ("icns", "ico"):
+        raise ValueError(f"unknown icon kind '{kind}'")
+
+    digest = cached_filehash(src, hashlib.sha256)
+    icon_dir = os.path.join(cache_dir(), "icons")
+    icon_path = os.path.join(icon_dir, f"{digest}.v{ICON_CACHE_VERSION}.{kind}")
+    if os.path.exists(icon_path):
+        return icon_path
+
+    with open(src, "rb") as f:
+        try:
+            width, height, pixels = decode_png(f.read())
+        except ImageError as err:
+            raise ImageError(f"couldn't read icon {src} (icons must be PNG files): {err}")
+
+    sizes = [size for _, size in ICNS_ENTRIES] if kind == "icns" else ICO_SIZES
+    images = {size: encode_png(size, size, image) for size, image in scale_icon(width, height, pixels, sizes).items()}
+    data = write_icns(images) if kind == "icns" else write_ico(images)
+
+    os.makedirs(icon_dir, exist_ok=True)
+    tmp_path = f"{icon_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, icon_path)
+    return icon_path
+
+
+def write_icns(images):
+    # images maps sizes to PNG data.
+    entries = b"".join(kind + struct.pack(">I", 8 + len(images[size])) + images[size] for kind, size in ICNS_ENTRIES)
+    return b"icns" + struct.pack(">I", 8 + len(entries)) + entries
+
+
+def write_ico(images):
+    # images maps sizes to PNG data.
+    sizes = sorted(images)
+    header = struct.pack("<HHH", 0, 1, len(sizes))
+    directory = b""
+    offset = len(header) + 16 * len(sizes)
+    for size in sizes:
+        # a width and height of 0 mean 256
+        directory += struct.pack("<BBBBHHII", size % 256, size % 256, 0, 0, 1, 32, len(images[size]), offset)
+        offset += len(images[size])
+    return header + directory + b"".join(images[size] for size in sizes)
+
+
+#-------------------------------------------------------------------------------
+# Scaling
+#-------------------------------------------------------------------------------
+# Images are scaled with a triangle filter on premultiplied alpha, so that
+# transparent pixels don't bleed their color into the edges. Each size is made
+# from the next larger one rather than from the source, which gives the same
+# quality for a fraction of the work. Rows are processed whole with list
+# operations, and the image is transposed to scale it horizontally, so that
+# Python never loops over single pixels.
+
+def scale_icon(width, height, pixels, sizes):
+    # Returns a dict mapping each size to the source RGBA8 pixels, stretched to
+    # a square of that size.
+    alpha = pixels[3::4]
+    data = [0.0] * (width * height * 4)
+    for c in range(3):
+        data[c::4] = [v * a / 255.0 for v, a in zip(pixels[c::4], alpha)]
+    data[3::4] = [float(a) for a in alpha]
+
+    images = {}
+    for size in sorted(set(sizes), reverse=True):
+        if size == width == height:
+            images[size] = bytes(pixels)
+            continue
+        data = _transpose(_scale_rows(_transpose(_scale_rows(data, width, height, size), width, size), size, width, size), size, size)
+        width = height = size
+        images[size] = _unpremultiply(data)
+    return images
+
+
+def _scale_rows(data, width, height, new_height):
+    # Scales an image of RGBA floats vertically.
+    stride = width * 4
+    rows = [data[y * stride:(y + 1) * stride] for y in range(height)]
+    out = []
+    for taps in _filter_taps(height, new_height):
+        (src, weight), rest = taps[0], taps[1:]
+        acc = [v * weight for v in rows[src]]
+        for src, weight in rest:
+            acc = [a + v * weight for a, v in zip(acc, rows[src])]
+        out += acc
+    return out
+
+
+def _transpose(data, width, height):
+    # Transposes an image of RGBA floats, so that columns become rows.
+    stride = width * 4
+    out = [0.0] * len(data)
+    for x in range(width):
+        column = [0.0] * (height * 4)
+        for c in range(4):
+            column[c::4] = data[x * 4 + c::stride]
+        out[x * height * 4:(x + 1) * height * 4] = column
+    return out
+
+
+def _filter_taps(size, new_size):
+    # For each output row, a list of (source row, weight).
+    scale = size / new_size
+    radius = max(scale, 1.0)
+    taps = []
+    for i in range(new_size):
+        center = (i + 0.5) * scale - 0.5
+        weights = {}
+        for j in range(math.floor(center - radius) + 1, math.ceil(center + radius)):
+            weight = 1.0 - abs(j - center) / radius
+            if weight > 0:
+                src = min(max(j, 0), size - 1)
+                weights[src] = weights.get(src, 0.0) + weight
+        total = sum(weights.values())
+        taps.append([(src, weight / total) for src, weight in sorted(weights.items())])
+    return taps
+
+
+def _unpremultiply(data):
+    out = bytearray(len(data))
+    alpha = data[3::4]
+    for c in range(3):
+        out[c::4] = bytes(min(255, int(v * 255.0 / a + 0.5)) if a > 0 else 0 for v, a in zip(data[c::4], alpha))
+    out[3::4] = bytes(min(255, int(a + 0.5)) for a in alpha)
+    return bytes(out)
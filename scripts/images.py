@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import zlib
+
+from .checksum import cache_dir, cached_filehash
+
+
+# Images pre-decoded at bundle time are stored as raw, straight-alpha RGBA8
+# pixels, top row first, behind a small header (see oc_image_blob_header in
+# src/graphics/graphics_common.c). They keep their original file names, so the
+# guest loads them exactly as before and the image loader skips decoding.
+#
+# Only PNGs are pre-decoded, with the pure-Python decoder below; other formats
+# are bundled as they are and decoded at runtime as usual.
+
+IMAGE_BLOB_MAGIC = b"OCRGBA8\0"
+IMAGE_BLOB_VERSION = 1
+IMAGE_BLOB_HEADER = struct.Struct("<8sIIII")  # magic, version, width, height, flags (reserved)
+IMAGE_MANIFEST_NAME = "predecoded_images.json"
+IMAGE_MANIFEST_VERSION = 1
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class ImageError(Exception):
+    pass
+
+
+def predecode_images(files):
+    # Pre-decodes the PNGs among a list of (name, source path) pairs. Returns a
+    # dict mapping the name of each decoded image to its blob, and a manifest of
+    # what was converted. Blobs are cached by the source's hash, so each image
+    # is only ever decoded once.
+    blobs = {}
+    manifest = {}
+    blob_dir = os.path.join(cache_dir(), "images")
+    for name, src in files:
+        if os.path.splitext(name)[1].lower() != ".png":
+            continue
+
+        digest = cached_filehash(src, hashlib.sha256)
+        blob_path = os.path.join(blob_dir, f"{digest}.v{IMAGE_BLOB_VERSION}.rgba")
+        if not os.path.exists(blob_path):
+            with open(src, "rb") as f:
+                try:
+                    width, height, pixels = decode_png(f.read())
+                except ImageError as err:
+                    raise ImageError(f"couldn't pre-decode {src}: {err}")
+            os.makedirs(blob_dir, exist_ok=True)
+            tmp_path = f"{blob_path}.{os.getpid()}-{threading.get_ident()}.tmp"  # the cache is shared by concurrent bundles
+            with open(tmp_path, "wb") as f:
+                f.write(IMAGE_BLOB_HEADER.pack(IMAGE_BLOB_MAGIC, IMAGE_BLOB_VERSION, width, height, 0))
+                f.write(pixels)
+            os.replace(tmp_path, blob_path)
+
+        with open(blob_path, "rb") as f:
+            _, _, width, height, _ = IMAGE_BLOB_HEADER.unpack(f.read(IMAGE_BLOB_HEADER.size))
+
+        blobs[name] = blob_path
+        manifest[name] = {
+            "source_hash": digest,
+            "width": width,
+            "height": height,
+            "source_bytes": os.path.getsize(src),
+            "bytes": os.path.getsize(blob_path),
+        }
+    return blobs, manifest
+
+
+def image_manifest_json(manifest):
+    return json.dumps({"version": IMAGE_MANIFEST_VERSION, "images": manifest}, indent=2, sort_keys=True) + "\n"
+
+
+#-------------------------------------------------------------------------------
+# PNG decoding and encoding
+#-------------------------------------------------------------------------------
+# decode_png produces the same pixels as stb_image's 8-bit RGBA output: 16-bit
+# samples are truncated to their high byte, low bit depths are scaled up to
+# 0-255, and tRNS transparency is applied. Ancillary chunks other than tRNS are
+# ignored.
+
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+PNG_ADAM7 = [(0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2)]
+
+
+def decode_png(data):
+    # Returns (width, height, RGBA8 pixels).
+    if data[:8] != PNG_SIGNATURE:
+        raise ImageError("not a PNG file")
+
+    header = None
+    palette = None
+    trns = None
+    idat = []
+    pos = 8
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif kind == b"PLTE":
+            palette = chunk
+        elif kind == b"tRNS":
+            trns = chunk
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+
+    if header is None:
+        raise ImageError("missing IHDR chunk")
+    width, height, depth, color_type, compression, filter_method, interlace = header
+    if color_type not in PNG_CHANNELS or compression != 0 or filter_method != 0 or interlace > 1:
+        raise ImageError("unsupported PNG format")
+    if depth not in (1, 2, 4, 8, 16) or (depth == 16 and color_type == 3) or (depth < 8 and color_type not in (0, 3)):
+        raise ImageError(f"invalid bit depth {depth}")
+    if color_type == 3 and palette is None:
+        raise ImageError("missing palette")
+
+    try:
+        raw = zlib.decompress(b"".join(idat))
+    except zlib.error as err:
+        raise ImageError(f"corrupt image data ({err})")
+
+    channels = PNG_CHANNELS[color_type]
+    bits_per_pixel = channels * depth
+    pixel_bytes = max(1, bits_per_pixel // 8)
+    convert = _row_converter(color_type, depth, palette, trns)
+
+    out = bytearray(width * height * 4)
+    passes = PNG_ADAM7 if interlace else [(0, 0, 1, 1)]
+    offset = 0
+    for x0, y0, dx, dy in passes:
+        pass_width = (width - x0 + dx - 1) // dx
+        pass_height = (height - y0 + dy - 1) // dy
+        if pass_width == 0 or pass_height == 0:
+            continue
+        stride = (pass_width * bits_per_pixel + 7) // 8
+        prev = bytearray(stride)
+        for row in range(pass_height):
+            if offset + 1 + stride > len(raw):
+                raise ImageError("truncated image data")
+            line = _unfilter(raw[offset], bytearray(raw[offset + 1:offset + 1 + stride]), prev, pixel_bytes)
+            offset += 1 + stride
+            prev = line
+
+            rgba = convert(line, pass_width)
+            y = y0 + row * dy
+            if dx == 1:
+                out[y * width * 4:(y + 1) * width * 4] = rgba
+            else:
+                start = (y * width + x0) * 4
+                end = (y * width + x0 + (pass_width - 1) * dx) * 4 + 4
+                for k in range(4):
+                    out[start + k:end:dx * 4] = rgba[k::4]
+    return width, height, bytes(out)
+
+
+def encode_png(width, height, rgba):
+    # Encodes RGBA8 pixels as a PNG, with no filtering and maximum compression.
+    stride = width * 4
+    raw = bytearray()
+    for y in range(height):
+        raw.append(0)
+        raw += rgba[y * stride:(y + 1) * stride]
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (PNG_SIGNATURE
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(bytes(raw), 9))
+            + chunk(b"IEND", b""))
+
+
+def _unfilter(kind, line, prev, bpp):
+    n = len(line)
+    if kind == 0:
+        pass
+    elif kind == 1:
+        for i in range(bpp, n):
+            line[i] = (line[i] + line[i - bpp]) & 0xff
+    elif kind == 2:
+        for i in range(n):
+            line[i] = (line[i] + prev[i]) & 0xff
+    elif kind == 3:
+        for i in range(n):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xff
+    elif kind == 4:
+        for i in range(n):
+            a = line[i - bpp] if i >= bpp else 0
+            b = prev[i]
+            c = prev[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa = abs(p - a)
+            pb = abs(p - b)
+            pc = abs(p - c)
+            if pa <= pb and pa <= pc:
+                line[i] = (line[i] + a) & 0xff
+            elif pb <= pc:
+                line[i] = (line[i] + b) & 0xff
+            else:
+                line[i] = (line[i] + c) & 0xff
+    else:
+        raise ImageError(f"invalid filter type {kind}")
+    return line
+
+
+def _row_converter(color_type, depth, palette, trns):
+    # Returns a function turning one unfiltered row of `width` pixels into RGBA8.
+
+    def samples(line, count):
+        # one int per sample, at the image's bit depth
+        if depth == 8:
+            return line[:count]
+        if depth == 16:
+            return [(line[2 * i] << 8) | line[2 * i + 1] for i in range(count)]
+        per_byte = 8 // depth
+        mask = (1 << depth) - 1
+        return [(line[i // per_byte] >> (8 - depth * (i % per_byte + 1))) & mask for i in range(count)]
+
+    def to8(values):
+        if depth == 16:
+            return bytes(v >> 8 for v in values)
+        if depth < 8:
+            scale = 0xff // ((1 << depth) - 1)
+            return bytes(v * scale for v in values)
+        return bytes(values)
+
+    if color_type == 3:
+        table = []
+        for i in range(256):
+            if 3 * i + 3 <= len(palette):
+                alpha = trns[i] if trns is not None and i < len(trns) else 255
+                table.append(bytes(palette[3 * i:3 * i + 3]) + bytes([alpha]))
+            else:
+                table.append(b"\0\0\0\xff")
+
+        def convert(line, width):
+            return b"".join([table[i] for i in samples(line, width)])
+        return convert
+
+    channels = PNG_CHANNELS[color_type]
+    key = None
+    if trns is not None and color_type in (0, 2):
+        key = struct.unpack(">" + "H" * channels, trns[:2 * channels])
+
+    def convert(line, width):
+        values = samples(line, width * channels)
+        rgba = bytearray(width * 4)
+        data = to8(values)
+        if color_type == 0:
+            rgba[0::4] = data
+            rgba[1::4] = data
+            rgba[2::4] = data
+            rgba[3::4] = b"\xff" * width
+        elif color_type == 4:
+            rgba[0::4] = data[0::2]
+            rgba[1::4] = data[0::2]
+            rgba[2::4] = data[0::2]
+            rgba[3::4] = data[1::2]
+        elif color_type == 2:
+            rgba[0::4] = data[0::3]
+            rgba[1::4] = data[1::3]
+            rgba[2::4] = data[2::3]
+            rgba[3::4] = b"\xff" * width
+        else:
+            rgba[:] = data
+        if key is not None:
+            for i in range(width):
+                if tuple(values[i * channels:(i + 1) * channels]) == key:
+                    rgba[4 * i + 3] = 0
+        return rgba
+    return convert
@@ -4,6 +4,7 @@ import subprocess
 
 errors = []
 warnings = []
+finish_reports = []
 
 
 class Entry:
@@ -34,7 +35,19 @@ def log_warning(msg):
     return entry
 
 
+def add_finish_report(func):
+    # Registers a function that prints a report when the task finishes,
+    # before the summary of errors and warnings.
+    finish_reports.append(func)
+
+
 def log_finish(success):
+    for report in finish_reports:
+        try:
+            report()
+        except Exception as err:
+            print(f"failed to write report: {err}")
+
     if success and len(errors) + len(warnings) == 0:
         print("Task completed successfully.")
         return
@@ -61,6 +74,13 @@ def log_finish(success):
             print("\n".join(entry.msgs))
 
 
+def format_size(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
 def shellish(func):
     def shellfunc(*args, **kwargs):
         exitcode = 0
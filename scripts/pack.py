@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .checksum import cached_filehash
+from .log import format_size
+
+
+# A resource pack stores an app's data files in a single file, app/data.pack,
+# which the runtime maps into memory instead of opening each file separately.
+# See the matching reader in src/runtime_io.c. All values are little-endian:
+#
+#     header      PACK_HEADER
+#     toc         one PACK_ENTRY per file, sorted by path hash
+#     names       the '/'-separated path of each file, relative to app/data
+#     payloads    each aligned to its entry's alignment
+#
+# Entries whose files have the same contents point at the same payload, and
+# payloads may be zlib-compressed (PACK_ENTRY_ZLIB), in which case the runtime
+# expands them when the file is opened.
+#
+# Large payloads are page-aligned (using the largest page size we run on), so
+# reading one only touches its own pages of the mapping. Smaller ones are only
+# 16-byte aligned so that padding never costs more than a quarter of a payload,
+# and thousands of tiny files don't take a page each.
+
+PACK_NAME = "data.pack"
+PACK_MAGIC = b"ORCAPACK"
+PACK_VERSION = 2
+PACK_HEADER = struct.Struct("<8sIIQQQ32s")  # magic, version, entry count, toc offset, names offset, names size, key
+PACK_ENTRY = struct.Struct("<QIIQQQII")  # path hash, name offset, name length, offset, stored length, size, alignment, flags
+PACK_ENTRY_ZLIB = 1 << 0
+PACK_PAGE_SIZE = 16384
+PACK_PAGE_ALIGN_THRESHOLD = 4 * PACK_PAGE_SIZE
+PACK_MIN_ALIGNMENT = 16
+
+# Only compress payloads of at least this size, and only keep the compressed
+# version if it's at most this fraction of the original. Anything else isn't
+# worth expanding at runtime (already-compressed images and audio usually fail
+# the ratio test).
+PACK_COMPRESS_MIN_SIZE = 4096
+PACK_COMPRESS_MAX_RATIO = 0.9
+
+
+def pack_path_hash(name):
+    # 64-bit FNV-1a of the UTF-8 path.
+    h = 0xcbf29ce484222325
+    for byte in name.encode("utf-8"):
+        h = ((h ^ byte) * 0x100000001b3) & 0xffffffffffffffff
+    return h
+
+
+def pack_key(files, compress=False):
+    # Identifies the pack's contents, so an unchanged pack isn't rewritten.
+    # files is a list of (name, source path) pairs.
+    inputs = [[name, os.path.getsize(src), cached_filehash(src, hashlib.sha256)] for name, src in sorted(files)]
+    return hashlib.sha256(json.dumps([PACK_VERSION, compress, inputs]).encode("utf-8")).digest()
+
+
+def read_pack_key(path):
+    try:
+        with open(path, "rb") as f:
+            header = f.read(PACK_HEADER.size)
+    except OSError:
+        return None
+    if len(header) < PACK_HEADER.size:
+        return None
+    magic, version, _, _, _, _, key = PACK_HEADER.unpack(header)
+    if magic != PACK_MAGIC or version != PACK_VERSION:
+        return None
+    return key
+
+
+class PackStats:
+    def __init__(self):
+        self.files = 0
+        self.input_bytes = 0
+        self.pack_bytes = 0
+        self.duplicate_files = 0
+        self.duplicate_bytes = 0
+        self.compressed_files = 0
+        self.compressed_bytes = 0  # saved by compression
+
+    def summary(self):
+        parts = []
+        if self.duplicate_files > 0:
+            parts.append(f"{format_size(self.duplicate_bytes)} saved by storing {self.duplicate_files} duplicate files once")
+        if self.compressed_files > 0:
+            parts.append(f"{format_size(self.compressed_bytes)} saved by compressing {self.compressed_files} files")
+        if len(parts) == 0:
+            return "nothing deduplicated or compressed"
+        return ", ".join(parts)
+
+
+def write_pack(path, files, compress=False, key=None, jobs=None):
+    # Writes a pack of the given (name, source path) pairs and returns PackStats.
+    #
+    # Files with identical contents share a single payload. With compress=True,
+    # payloads are zlib-compressed if that makes them small enough to be worth
+    # expanding at runtime (see PACK_COMPRESS_MIN_SIZE and PACK_COMPRESS_MAX_RATIO).
+    files = sorted(files)
+    if key is None:
+        key = pack_key(files, compress)
+    stats = PackStats()
+
+    names = bytearray()
+    entries = []
+    payloads = {}
+    for name, src in files:
+        encoded = name.encode("utf-8")
+        size = os.path.getsize(src)
+        digest = cached_filehash(src, hashlib.sha256)
+
+        payload = payloads.get(digest)
+        if payload is None:
+            payload = payloads[digest] = {"src": src, "size": size, "data": None, "flags": 0}
+        else:
+            stats.duplicate_files += 1
+            stats.duplicate_bytes += size
+
+        entries.append({
+            "name": name,
+            "hash": pack_path_hash(name),
+            "name_offset": len(names),
+            "name_length": len(encoded),
+            "payload": payload,
+        })
+        names += encoded
+        stats.files += 1
+        stats.input_bytes += size
+
+    if compress:
+        candidates = [p for p in payloads.values() if p["size"] >= PACK_COMPRESS_MIN_SIZE]
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            # zlib releases the GIL, so this scales with the number of cores
+            list(pool.map(_compress_payload, candidates))
+        for payload in candidates:
+            if payload["data"] is not None:
+                stats.compressed_files += 1
+                stats.compressed_bytes += payload["size"] - len(payload["data"])
+
+    toc_offset = PACK_HEADER.size
+    names_offset = toc_offset + PACK_ENTRY.size * len(entries)
+    offset = names_offset + len(names)
+
+    # payloads are laid out in path order, so files from the same directory stay together
+    layout = list(payloads.values())
+    for payload in layout:
+        payload["length"] = payload["size"] if payload["data"] is None else len(payload["data"])
+        if payload["data"] is None and payload["length"] >= PACK_PAGE_ALIGN_THRESHOLD:
+            payload["alignment"] = PACK_PAGE_SIZE
+        else:
+            # compressed payloads are expanded into their own buffer, so their alignment doesn't matter
+            payload["alignment"] = PACK_MIN_ALIGNMENT
+        offset = _align(offset, payload["alignment"])
+        payload["offset"] = offset
+        offset += payload["length"]
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(entries), toc_offset, names_offset, len(names), key))
+        for entry in sorted(entries, key=lambda e: (e["hash"], e["name"])):
+            payload = entry["payload"]
+            f.write(PACK_ENTRY.pack(
+                entry["hash"],
+                entry["name_offset"],
+                entry["name_length"],
+                payload["offset"],
+                payload["length"],
+                payload["size"],
+                payload["alignment"],
+                payload["flags"],
+            ))
+        f.write(names)
+        for payload in layout:
+            f.write(b"\0" * (payload["offset"] - f.tell()))
+            if payload["data"] is not None:
+                f.write(payload["data"])
+            else:
+                with open(payload["src"], "rb") as src:
+                    shutil.copyfileobj(src, f)
+        stats.pack_bytes = f.tell()
+    os.replace(tmp_path, path)
+    return stats
+
+
+def _compress_payload(payload):
+    with open(payload["src"], "rb") as f:
+        data = zlib.compress(f.read(), 9)
+    if len(data) <= payload["size"] * PACK_COMPRESS_MAX_RATIO:
+        payload["data"] = data
+        payload["flags"] |= PACK_ENTRY_ZLIB
+
+
+def _align(offset, alignment):
+    return (offset + alignment - 1) // alignment * alignment
@@ -4,6 +4,7 @@ import os
 import re
 import shutil
 
+from . import checksum
 from .checksum import dirsum
 from .log import *
 from .utils import yeetdir
@@ -20,11 +21,13 @@ def attach_source_commands(subparsers):
 
     vendor_cmd = source_sub.add_parser("vendor", help="Copy the Orca source code into your project.")
     vendor_cmd.add_argument("dir", type=str, help="the directory into which the Orca source code will be copied")
+    vendor_cmd.add_argument("--full", action="store_true", help="delete and recopy the whole directory instead of only updating the files that changed")
     vendor_cmd.set_defaults(func=shellish(vendor))
 
 
 def vendor(args):
     # Verify that we are ok to vendor into the requested dir.
+    vendor_info = None
     if os.path.exists(args.dir):
         try:
             with open(vendor_file_path(args.dir), "r") as f:
@@ -32,24 +35,65 @@ def vendor(args):
                 version = vendor_info["version"]
             print(f"Orca version {version} is currently installed in that directory.")
 
-            if vendor_checksum(args.dir) != vendor_info["checksum"]:
-                log_error(f"The contents of your vendor directory have been modified. This command will exit to avoid overwriting any local changes. To proceed, manually delete {args.dir} and try again.")
+            if "tree" in vendor_info:
+                changes = checksum.diff(vendor_info["tree"], vendor_tree(args.dir))
+                modified = bool(changes)
+            else:
+                changes = None
+                modified = vendor_checksum(args.dir) != vendor_info["checksum"]
+
+            if modified:
+                msg = log_error(f"The contents of your vendor directory have been modified. This command will exit to avoid overwriting any local changes. To proceed, manually delete {args.dir} and try again.")
+                if changes:
+                    print_vendor_changes(msg, changes)
                 exit(1)
         except FileNotFoundError:
             if len(os.listdir(args.dir)) > 0:
                 log_error(f"The requested directory already exists and does not appear to contain Orca source code. To avoid deleting anything important, please either provide the correct path or manually empty {args.dir} first.")
                 exit(1)
 
-    yeetdir(args.dir)
-    shutil.copytree(src_dir(), args.dir)
+    src_tree = vendor_tree(src_dir())
+
+    if vendor_info is not None and "tree" in vendor_info and not getattr(args, "full", False):
+        # The vendor directory is known to match its recorded tree, so only the
+        # files that differ from the new source need to be touched. Everything
+        # else keeps its mtime, so incremental builds that depend on it stay valid.
+        changes = checksum.diff(vendor_info["tree"], src_tree)
+        vendor_update(src_dir(), args.dir, changes)
+        unchanged = len(checksum.tree_files(src_tree)) - len(changes.changed) - len(changes.added)
+        print(f"Updated {len(changes.changed)} files, added {len(changes.added)}, removed {len(changes.removed)}, and left {unchanged} unchanged.")
+    else:
+        yeetdir(args.dir)
+        shutil.copytree(src_dir(), args.dir)
+
     with open(vendor_file_path(args.dir), "w") as f:
         json.dump({
             "version": orca_version(),
             "checksum": vendor_checksum(args.dir),
+            "tree": src_tree,
         }, f, indent=2)
     print(f"Version {orca_version()} of the Orca source code has been copied to {args.dir}.")
 
 
+def vendor_update(src, dst, changes):
+    def native(root, path):
+        return os.path.join(root, *path.split("/"))
+
+    for path in changes.removed:
+        os.remove(native(dst, path))
+        # clean up directories that are now empty
+        parent = os.path.dirname(native(dst, path))
+        while os.path.normpath(parent) != os.path.normpath(dst) and len(os.listdir(parent)) == 0:
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+
+    for path in changes.changed + changes.added:
+        os.makedirs(os.path.dirname(native(dst, path)), exist_ok=True)
+        # Deliberately not copy2: updated files get a fresh mtime so that
+        # mtime-based builds notice they changed.
+        shutil.copy(native(src, path), native(dst, path))
+
+
 def vendor_file_path(vendor_dir):
     return os.path.join(vendor_dir, ".orcavendor")
 
@@ -58,6 +102,22 @@ def vendor_checksum(dir):
     return dirsum(dir, excluded_extensions=["orcavendor"])
 
 
+def vendor_tree(dir):
+    # copytree copies the contents of symlinked directories, so follow them here too.
+    return checksum.merkle_tree(dir, excluded_extensions=["orcavendor"], followlinks=True)
+
+
+def print_vendor_changes(msg, changes, limit=20):
+    msg.more("The following files differ from the vendored version:")
+    lines = [f"  modified: {path}" for path in changes.changed]
+    lines += [f"  added:    {path}" for path in changes.added]
+    lines += [f"  removed:  {path}" for path in changes.removed]
+    for line in lines[:limit]:
+        msg.more(line)
+    if len(lines) > limit:
+        msg.more(f"  ...and {len(lines) - limit} more")
+
+
 def cflags(args):
     if not os.path.exists(os.path.join(args.srcdir, "orca.h")):
         log_error(f"The provided path does not seem to contain the Orca source code: {args.srcdir}")
@@ -0,0 +1,341 @@
+import ctypes
+import hashlib
+import json
+import os
+import platform
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .checksum import HASH_CACHE_RACY_SECONDS, cached_filehash
+from .log import format_size
+
+
+# Linux ioctl for reflinking a whole file (btrfs, XFS, bcachefs, ...).
+FICLONE = 0x40049409
+
+SYNC_MANIFEST_VERSION = 1
+
+
+class SyncStats:
+    def __init__(self):
+        self.copied = 0
+        self.cloned = 0
+        self.linked = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.bytes_written = 0
+
+    def summary(self):
+        parts = [f"{self.copied} copied ({format_size(self.bytes_written)} written)"]
+        if self.cloned > 0:
+            parts.append(f"{self.cloned} cloned")
+        if self.linked > 0:
+            parts.append(f"{self.linked} hardlinked")
+        parts.append(f"{self.unchanged} unchanged")
+        if self.deleted > 0:
+            parts.append(f"{self.deleted} deleted")
+        return ", ".join(parts)
+
+
+class Sync:
+    # Makes a set of destination files match their sources, touching only the
+    # ones that differ. A destination is left alone if it already has the same
+    # size and content hash as its source (hashes come from the shared hash
+    # cache, so unchanged files aren't re-read). Everything else is written to a
+    # temporary file and renamed into place, so a destination that happens to be
+    # a hardlink to its source is never modified in place.
+    #
+    # Files are cloned (copy-on-write) when the filesystem supports it. Files
+    # added with link=True, or all files if the Sync itself has link=True, are
+    # hardlinked to their sources where possible instead. A destination that is
+    # hardlinked to its source but shouldn't be is replaced with a copy.
+    #
+    # With a manifest, the stat info of every source and destination is recorded
+    # after the sync, and files whose stat info hasn't changed since are skipped
+    # without hashing either side.
+    #
+    # Files are synced concurrently on up to `jobs` threads (the default thread
+    # pool size if None); most of the time goes to waiting on the filesystem.
+
+    def __init__(self, link=False, manifest=None, jobs=None):
+        self.link = link
+        self.manifest = SyncManifest(manifest) if manifest is not None else None
+        self.jobs = jobs
+        self.files = {}
+        self.linked_files = set()
+        self.dirs = set()
+        self.kept = set()
+        self.stats = SyncStats()
+        self.results = {}  # destination -> (what was done, seconds, bytes written), once run
+        self.lock = threading.Lock()
+        if manifest is not None:
+            self.keep(manifest)
+
+    def add_file(self, src, dst, link=False):
+        dst = os.path.normpath(dst)
+        self.files[dst] = src
+        if link:
+            self.linked_files.add(dst)
+        else:
+            self.linked_files.discard(dst)
+        self.dirs.add(os.path.dirname(dst))
+
+    def add_dir(self, dst):
+        self.dirs.add(os.path.normpath(dst))
+
+    def add_tree(self, src, dst, exclude=None, link=False):
+        # Like copytree, this follows symlinks and copies what they point to.
+        exclude = exclude or []
+        self.dirs.add(os.path.normpath(dst))
+        for root, dirs, files in os.walk(src, followlinks=True):
+            dirs[:] = [d for d in dirs if d not in exclude]
+            rel = os.path.relpath(root, src)
+            for d in dirs:
+                self.dirs.add(os.path.normpath(os.path.join(dst, rel, d)))
+            for f in files:
+                if f in exclude:
+                    continue
+                self.add_file(os.path.join(root, f), os.path.join(dst, rel, f), link)
+
+    def keep(self, path):
+        # Protects a file that isn't synced from anywhere (e.g. a generated one)
+        # from being pruned.
+        self.kept.add(os.path.normpath(path))
+
+    def run(self, prune=None):
+        # Anything under the directories in prune that wasn't added is deleted.
+        for dir in sorted(self.dirs):
+            if os.path.isfile(dir):
+                os.remove(dir)
+            os.makedirs(dir, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            # list() so the first error is raised here
+            list(pool.map(lambda item: self._sync(item[1], item[0]), sorted(self.files.items())))
+
+        for root in prune or []:
+            self.prune(root)
+
+        if self.manifest is not None:
+            self.manifest.save(self.files)
+
+        return self.stats
+
+    def sync_file(self, src, dst):
+        # Returns the SyncStats field counting what was done, and the number of bytes written.
+        if os.path.isdir(dst) and not os.path.islink(dst):
+            shutil.rmtree(dst)
+
+        link = self.link or dst in self.linked_files
+        if is_same_file(src, dst):
+            if link:
+                return "unchanged", 0
+        elif self.manifest is not None and self.manifest.is_unchanged(src, dst):
+            return "unchanged", 0
+        elif os.path.exists(dst) and is_same_content(src, dst):
+            return "unchanged", 0
+
+        method = copy_file(src, dst, link)
+        if method == "link":
+            return "linked", 0
+        elif method == "clone":
+            return "cloned", 0
+        return "copied", os.path.getsize(dst)
+
+    def prune(self, root):
+        for dirpath, dirs, files in os.walk(root, topdown=False):
+            for f in files:
+                path = os.path.normpath(os.path.join(dirpath, f))
+                if path not in self.files and path not in self.kept:
+                    os.remove(path)
+                    self.stats.deleted += 1
+            for d in dirs:
+                path = os.path.normpath(os.path.join(dirpath, d))
+                if os.path.islink(path):
+                    if path not in self.files:
+                        os.remove(path)
+                        self.stats.deleted += 1
+                elif path not in self.dirs and len(os.listdir(path)) == 0:
+                    os.rmdir(path)
+
+    def _sync(self, src, dst):
+        start = time.perf_counter()
+        field, bytes_written = self.sync_file(src, dst)
+        with self.lock:
+            setattr(self.stats, field, getattr(self.stats, field) + 1)
+            self.stats.bytes_written += bytes_written
+            self.results[dst] = (field, time.perf_counter() - start, bytes_written)
+
+
+class SyncManifest:
+    # Stat info of each synced file's source and destination, keyed by the
+    # destination path relative to the manifest. Destinations that are modified
+    # after the sync, like sources, no longer match their entry.
+
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.dirname(path)
+        self.entries = {}
+
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == SYNC_MANIFEST_VERSION:
+                self.entries = data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def is_unchanged(self, src, dst):
+        entry = self.entries.get(self._key(dst))
+        if entry is None or entry["src"] != os.path.abspath(src):
+            return False
+        try:
+            return entry["src_stat"] == _stat_key(src) and entry["dst_stat"] == _stat_key(dst)
+        except OSError:
+            return False
+
+    def save(self, files):
+        entries = {}
+        now = time.time()
+        for dst, src in files.items():
+            try:
+                src_st = os.stat(src)
+                dst_st = os.stat(dst)
+            except OSError:
+                continue
+            # Too recent to trust: the source could change again within the same
+            # mtime tick. It'll be compared by hash next time instead.
+            if now - src_st.st_mtime < HASH_CACHE_RACY_SECONDS:
+                continue
+            entries[self._key(dst)] = {
+                "src": os.path.abspath(src),
+                "src_stat": [src_st.st_size, src_st.st_mtime_ns],
+                "dst_stat": [dst_st.st_size, dst_st.st_mtime_ns],
+            }
+
+        os.makedirs(self.root or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": SYNC_MANIFEST_VERSION, "files": entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _key(self, dst):
+        return os.path.relpath(dst, self.root).replace(os.sep, "/")
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def is_same_file(src, dst):
+    try:
+        return os.path.samefile(src, dst)
+    except OSError:
+        return False
+
+
+def is_same_content(src, dst):
+    try:
+        if os.path.getsize(src) != os.path.getsize(dst):
+            return False
+    except OSError:
+        return False
+    return cached_filehash(src, hashlib.sha256) == cached_filehash(dst, hashlib.sha256)
+
+
+def copy_file(src, dst, link=False):
+    # Returns how the file was written: "link", "clone" or "copy".
+    tmp = dst + ".orcatmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+
+    if link:
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return "link"
+        except OSError:
+            pass
+
+    try:
+        if clone_file(src, tmp):
+            method = "clone"
+        else:
+            if not _copy_file_range(src, tmp):
+                shutil.copyfile(src, tmp)
+            method = "copy"
+        shutil.copymode(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        raise
+    return method
+
+
+def clone_file(src, dst):
+    # Tries to make dst a copy-on-write clone of src. Returns False if the
+    # platform or filesystem can't do it, in which case dst doesn't exist.
+    system = platform.system()
+    if system == "Darwin":
+        return _clonefile_macos(src, dst)
+    elif system == "Linux":
+        return _ficlone_linux(src, dst)
+    return False
+
+
+_clonefile = None
+
+
+def _clonefile_macos(src, dst):
+    global _clonefile
+    if _clonefile is None:
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            _clonefile = libc.clonefile
+            _clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+            _clonefile.restype = ctypes.c_int
+        except (OSError, AttributeError):
+            _clonefile = False
+    if not _clonefile:
+        return False
+    # fails with EXDEV across volumes and ENOTSUP on non-APFS volumes
+    return _clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+
+
+def _ficlone_linux(src, dst):
+    import fcntl
+
+    with open(src, "rb") as fsrc:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            fcntl.ioctl(fd, FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    os.remove(dst)
+    return False
+
+
+def _copy_file_range(src, dst):
+    # An in-kernel copy, which some filesystems (btrfs, XFS, NFS) turn into a
+    # reflink or server-side copy. There's no way to tell whether that happened,
+    # so the bytes still count as written.
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            while remaining > 0:
+                n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if n == 0:
+                    break
+                remaining -= n
+        return remaining == 0
+    except OSError:
+        return False
@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .trace import trace_step
+
+
+# Returned by a task's function to signal that its outputs were already up to date.
+UP_TO_DATE = object()
+
+
+class Task:
+    def __init__(self, name, func, deps=None, inputs=None, outputs=None, report=None):
+        self.name = name
+        self.func = func
+        self.deps = list(deps or [])
+        self.inputs = [os.path.normpath(path) for path in inputs or []]
+        self.outputs = [os.path.normpath(path) for path in outputs or []]
+        # Called on the scheduling thread with the function's return value. This
+        # is the place to print, so output from concurrent tasks never interleaves.
+        self.report = report
+        self.dependents = []
+
+
+class TaskGraph:
+    # A small dependency graph of build steps. A task depends on the tasks listed
+    # in its deps, and on any task that declares one of its inputs as an output.
+    # run() starts every task whose dependencies are done, up to the job limit,
+    # so the wall-clock time is set by the critical path rather than the sum of
+    # all steps.
+
+    def __init__(self):
+        self.tasks = []
+
+    def add(self, name, func, deps=None, inputs=None, outputs=None, report=None):
+        task = Task(name, func, deps, inputs, outputs, report)
+        self.tasks.append(task)
+        return task
+
+    def run(self, jobs=None):
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        jobs = max(1, jobs)
+
+        deps = self._resolve_deps()
+        priority = self._critical_path_lengths(deps)
+
+        remaining = {task: set(deps[task]) for task in self.tasks}
+        ready = [task for task in self.tasks if len(remaining[task]) == 0]
+        error = None
+        skipped = 0
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            running = {}
+            while len(ready) > 0 or len(running) > 0:
+                # Start the tasks with the longest chain of work behind them first.
+                ready.sort(key=lambda task: priority[task], reverse=True)
+                while len(ready) > 0 and len(running) < jobs:
+                    task = ready.pop(0)
+                    running[pool.submit(_run_task, task)] = task
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        value = future.result()
+                        if value is UP_TO_DATE:
+                            skipped += 1
+                        if task.report is not None:
+                            task.report(value)
+                    except BaseException as err:
+                        if error is None:
+                            error = err
+                        continue
+
+                    for dependent in task.dependents:
+                        remaining[dependent].discard(task)
+                        if len(remaining[dependent]) == 0:
+                            ready.append(dependent)
+
+                if error is not None:
+                    # Fail fast: let running tasks finish, but don't start anything new.
+                    ready = []
+
+        if error is not None:
+            raise error
+
+        if skipped > 0:
+            print(f"{len(self.tasks) - skipped} build steps run, {skipped} up to date.")
+
+    def _resolve_deps(self):
+        producers = {}
+        for task in self.tasks:
+            for output in task.outputs:
+                if output in producers:
+                    raise Exception(f"build steps '{producers[output].name}' and '{task.name}' both produce {output}")
+                producers[output] = task
+
+        deps = {}
+        for task in self.tasks:
+            task_deps = set(task.deps)
+            for input in task.inputs:
+                producer = producers.get(input)
+                if producer is not None and producer is not task:
+                    task_deps.add(producer)
+            deps[task] = task_deps
+            task.dependents = []
+
+        for task in self.tasks:
+            for dep in deps[task]:
+                dep.dependents.append(task)
+
+        return deps
+
+    def _critical_path_lengths(self, deps):
+        # Number of tasks on the longest chain from each task to the end of the
+        # build. Also rejects cycles, which would otherwise hang the scheduler.
+        lengths = {}
+        visiting = set()
+
+        def visit(task):
+            if task in lengths:
+                return lengths[task]
+            if task in visiting:
+                raise Exception(f"dependency cycle involving build step '{task.name}'")
+            visiting.add(task)
+            length = 1 + max([visit(dependent) for dependent in task.dependents], default=0)
+            visiting.remove(task)
+            lengths[task] = length
+            return length
+
+        for task in self.tasks:
+            visit(task)
+        return lengths
+
+
+def _run_task(task):
+    with trace_step(task.name, cat="task") as args:
+        value = task.func()
+        if value is UP_TO_DATE:
+            args["status"] = "up to date"
+    return value
@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+from .log import *
+
+
+# Build steps are recorded as Chrome trace events ("X" complete events, with
+# timestamps in microseconds) so the file can be loaded in chrome://tracing or
+# https://ui.perfetto.dev. Tracing is off unless trace_enable() is called, in
+# which case the trace is written and summarized when the task finishes.
+
+_lock = threading.Lock()
+_events = []
+_trace_path = None
+_start = None
+
+
+def trace_enable(path):
+    global _trace_path, _start
+    _trace_path = path
+    _start = time.perf_counter()
+    add_finish_report(_finish)
+
+
+def trace_enabled():
+    return _trace_path is not None
+
+
+@contextmanager
+def trace_step(name, cat="step"):
+    # Yields a dict of args to attach to the event. The step's status is
+    # "failed" if it raises and "ok" unless the step sets it to something else.
+    args = {}
+    if not trace_enabled():
+        yield args
+        return
+
+    begin = time.perf_counter()
+    try:
+        yield args
+    except BaseException:
+        args["status"] = "failed"
+        raise
+    finally:
+        end = time.perf_counter()
+        args.setdefault("status", "ok")
+        with _lock:
+            _events.append({
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": int((begin - _start) * 1e6),
+                "dur": int((end - begin) * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            })
+
+
+def trace_run(cmd, check=False, capture_output=False, text=False, name=None):
+    # Like subprocess.run, but traced, with the child's pid and exit code.
+    pipes = {"stdout": subprocess.PIPE, "stderr": subprocess.PIPE} if capture_output else {}
+    with trace_step(name or " ".join(cmd), cat="process") as args:
+        with subprocess.Popen(cmd, text=text, **pipes) as proc:
+            args["pid"] = proc.pid
+            stdout, stderr = proc.communicate()
+        args["exit"] = proc.returncode
+        if proc.returncode != 0:
+            args["status"] = "failed"
+
+    result = subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+    if check:
+        result.check_returncode()
+    return result
+
+
+def _finish():
+    with _lock:
+        events = list(_events)
+
+    os.makedirs(os.path.dirname(_trace_path) or ".", exist_ok=True)
+    with open(_trace_path, "w") as f:
+        json.dump({
+            "traceEvents": [
+                {"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "orca"}},
+                *events,
+            ],
+            "displayTimeUnit": "ms",
+        }, f)
+
+    # Processes are already covered by the step or task that ran them.
+    steps = sorted([e for e in events if e["cat"] != "process"], key=lambda e: e["dur"], reverse=True)
+    if len(steps) > 0:
+        print()
+        print("Slowest build steps:")
+        for event in steps[:10]:
+            status = event["args"]["status"]
+            print(f"{event['dur'] / 1e6:9.2f}s  {event['name']}" + ("" if status == "ok" else f" ({status})"))
+    print(f"Build trace written to {_trace_path}")
+    print()
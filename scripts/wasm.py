@@ -0,0 +1,127 @@
+import fnmatch
+
+from .log import format_size
+
+
+# A minimal reader and writer for the WebAssembly binary format, at the level of
+# sections: enough to inspect a module's layout and drop custom sections without
+# touching (or needing to understand) anything else.
+
+WASM_MAGIC = b"\0asm"
+WASM_VERSION = b"\1\0\0\0"
+
+WASM_SECTION_NAMES = {
+    0: "custom",
+    1: "type",
+    2: "import",
+    3: "function",
+    4: "table",
+    5: "memory",
+    6: "global",
+    7: "export",
+    8: "start",
+    9: "element",
+    10: "code",
+    11: "data",
+    12: "datacount",
+    13: "tag",
+}
+
+# Custom sections that only matter to debuggers and tools, not to the runtime.
+WASM_DEBUG_SECTIONS = [".debug_*", "name", "producers", "sourceMappingURL", "external_debug_info"]
+
+
+class WasmSection:
+    def __init__(self, id, data, name=None):
+        self.id = id
+        self.data = data  # the section's contents, including a custom section's name
+        self.name = name  # for custom sections
+
+    def label(self):
+        if self.id == 0:
+            return f"custom \"{self.name}\""
+        return WASM_SECTION_NAMES.get(self.id, f"unknown ({self.id})")
+
+    def size(self):
+        # as encoded, including the id and size fields
+        return 1 + len(encode_uleb128(len(self.data))) + len(self.data)
+
+
+def read_sections(module):
+    if module[:4] != WASM_MAGIC or module[4:8] != WASM_VERSION:
+        raise Exception("not a WebAssembly module (or an unsupported version)")
+
+    sections = []
+    pos = 8
+    while pos < len(module):
+        id = module[pos]
+        size, pos = decode_uleb128(module, pos + 1)
+        if pos + size > len(module):
+            raise Exception(f"truncated WebAssembly module (section {WASM_SECTION_NAMES.get(id, id)})")
+        data = module[pos:pos + size]
+        pos += size
+
+        name = None
+        if id == 0:
+            name_len, name_pos = decode_uleb128(data, 0)
+            name = bytes(data[name_pos:name_pos + name_len]).decode("utf-8", errors="replace")
+        sections.append(WasmSection(id, data, name))
+    return sections
+
+
+def write_module(sections):
+    out = bytearray(WASM_MAGIC + WASM_VERSION)
+    for section in sections:
+        out.append(section.id)
+        out += encode_uleb128(len(section.data))
+        out += section.data
+    return bytes(out)
+
+
+def strip_sections(sections, patterns):
+    # Splits sections into (kept, stripped). Custom sections whose name matches
+    # one of the glob patterns are stripped; everything else is kept.
+    kept = []
+    stripped = []
+    for section in sections:
+        if section.id == 0 and any(fnmatch.fnmatchcase(section.name, p) for p in patterns):
+            stripped.append(section)
+        else:
+            kept.append(section)
+    return kept, stripped
+
+
+def print_section_sizes(sections, stripped):
+    rows = [(section.label(), section.size(), section not in stripped) for section in sections]
+    width = max([len(label) for label, _, _ in rows] + [5])
+    for label, size, kept in rows:
+        print(f"  {label:<{width}}  {format_size(size):>10}" + ("" if kept else "  (stripped)"))
+    before = 8 + sum(size for _, size, _ in rows)
+    after = 8 + sum(size for _, size, kept in rows if kept)
+    print(f"  {'total':<{width}}  {format_size(before):>10}  -> {format_size(after)}")
+
+
+def decode_uleb128(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise Exception("truncated LEB128 value in WebAssembly module")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte & 0x80 == 0:
+            return result, pos
+
+
+def encode_uleb128(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value != 0:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
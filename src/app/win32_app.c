@@ -762,11 +762,23 @@ i32 oc_dispatch_on_main_thread_sync(oc_window main_window, oc_dispatch_proc proc
 
 oc_window oc_window_create(oc_rect rect, oc_str8 title, oc_window_style style)
 {
+    //NOTE: bundles made with `orca bundle --icon` ship the app's icon in their resources directory.
+    //      If there's none, LoadImage() fails and the window gets the default icon.
+    oc_arena_scope iconScratch = oc_scratch_begin();
+    oc_str8 iconPath = oc_path_executable_relative(iconScratch.arena, OC_STR8("../resources/icon.ico"));
+    HICON icon = LoadImage(0,
+                           oc_str8_to_cstring(iconScratch.arena, iconPath),
+                           IMAGE_ICON,
+                           0, 0,
+                           LR_LOADFROMFILE | LR_DEFAULTSIZE);
+    oc_scratch_end(iconScratch);
+
     WNDCLASS windowClass = { .style = CS_HREDRAW | CS_VREDRAW | CS_OWNDC,
                              .lpfnWndProc = oc_win32_win_proc,
                              .hInstance = GetModuleHandleW(NULL),
                              .lpszClassName = "ApplicationWindowClass",
-                             .hCursor = LoadCursor(0, IDC_ARROW) };
+                             .hCursor = LoadCursor(0, IDC_ARROW),
+                             .hIcon = icon };
 
     if(!RegisterClass(&windowClass))
     {
@@ -1730,23 +1730,84 @@ oc_image oc_image_create_from_rgba8(oc_surface surface, u32 width, u32 height, u
     return (image);
 }
 
-oc_image oc_image_create_from_memory(oc_surface surface, oc_str8 mem, bool flip)
+//NOTE: images pre-decoded by `orca bundle --predecode-images` are raw, straight-alpha RGBA8 pixels,
+//      top row first, following this header (see scripts/images.py).
+#define OC_IMAGE_BLOB_MAGIC "OCRGBA8"
+
+enum
 {
-    oc_image image = oc_image_nil();
-    int width, height, channels;
+    OC_IMAGE_BLOB_VERSION = 1,
+};
+
+typedef struct oc_image_blob_header
+{
+    char magic[8];
+    u32 version;
+    u32 width;
+    u32 height;
+    u32 flags;
+} oc_image_blob_header;
+
+static u8* oc_image_load_rgba8(oc_str8 mem, bool flip, int* width, int* height)
+{
+    //NOTE: returns pixels to release with free(), or null on failure
+    oc_image_blob_header* header = (oc_image_blob_header*)mem.ptr;
+    if(mem.len >= sizeof(oc_image_blob_header)
+       && !memcmp(header->magic, OC_IMAGE_BLOB_MAGIC, sizeof(header->magic)))
+    {
+        u64 stride = (u64)header->width * 4;
+        if(header->version != OC_IMAGE_BLOB_VERSION
+           || header->width > 0x7fffffff
+           || header->height > 0x7fffffff
+           || (header->height && stride > (mem.len - sizeof(oc_image_blob_header)) / header->height))
+        {
+            oc_log_error("invalid pre-decoded image\n");
+            return (0);
+        }
 
+        u8* src = (u8*)mem.ptr + sizeof(oc_image_blob_header);
+        u64 size = stride * header->height;
+        u8* pixels = malloc(size ? size : 1);
+        if(pixels)
+        {
+            if(flip)
+            {
+                for(u64 row = 0; row < header->height; row++)
+                {
+                    memcpy(pixels + row * stride, src + (header->height - 1 - row) * stride, stride);
+                }
+            }
+            else
+            {
+                memcpy(pixels, src, size);
+            }
+            *width = header->width;
+            *height = header->height;
+        }
+        return (pixels);
+    }
+
+    int channels;
     stbi_set_flip_vertically_on_load(flip ? 1 : 0);
-    u8* pixels = stbi_load_from_memory((u8*)mem.ptr, mem.len, &width, &height, &channels, 4);
+    u8* pixels = stbi_load_from_memory((u8*)mem.ptr, mem.len, width, height, &channels, 4);
+    if(!pixels)
+    {
+        oc_log_error("stbi_load_from_memory() failed: %s\n", stbi_failure_reason());
+    }
+    return (pixels);
+}
 
+oc_image oc_image_create_from_memory(oc_surface surface, oc_str8 mem, bool flip)
+{
+    oc_image image = oc_image_nil();
+    int width, height;
+
+    u8* pixels = oc_image_load_rgba8(mem, flip, &width, &height);
     if(pixels)
     {
         image = oc_image_create_from_rgba8(surface, width, height, pixels);
         free(pixels);
     }
-    else
-    {
-        oc_log_error("stbi_load_from_memory() failed: %s\n", stbi_failure_reason());
-    }
     return (image);
 }
 
@@ -1891,10 +1952,9 @@ oc_image_region oc_image_atlas_alloc_from_memory(oc_rect_atlas* atlas, oc_image
 {
     oc_image_region imageRgn = { 0 };
 
-    int width, height, channels;
+    int width, height;
 
-    stbi_set_flip_vertically_on_load(flip ? 1 : 0);
-    u8* pixels = stbi_load_from_memory((u8*)mem.ptr, mem.len, &width, &height, &channels, 4);
+    u8* pixels = oc_image_load_rgba8(mem, flip, &width, &height);
     if(pixels)
     {
         imageRgn = oc_image_atlas_alloc_from_rgba8(atlas, backingImage, width, height, pixels);
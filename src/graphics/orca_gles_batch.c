@@ -0,0 +1,166 @@
+/*************************************************************************
+*
+*  Orca
+*  Copyright 2023 Martin Fouilleul and the Orca project contributors
+*  See LICENSE.txt for licensing information
+*
+**************************************************************************/
+
+//NOTE: batched GLES calls. With OC_GLES_BATCH, the GLES functions are defined by the generated stubs in
+//      orca_gles_batch_stubs.c instead of being imported. Calls that don't return anything and only read
+//      buffers of a known length are encoded into a command buffer, which is submitted to the runtime with
+//      a single import call when it is full, and before any other GLES or surface call. The runtime decodes
+//      and checks the commands, then makes the calls (see oc_bindgen_batch_reader in runtime.h for the format).
+//
+//      Calls that return something or write to the app's memory, and glFlush/glFinish, flush the buffer and
+//      are then imported as usual. So do the calls whose buffers are larger than the command buffer.
+
+#include "graphics/orca_gl31.h"
+
+#ifndef OC_GLES_BATCH_CAPACITY
+    #define OC_GLES_BATCH_CAPACITY (64 << 10)
+#endif
+
+#if OC_GLES_BATCH
+
+typedef struct oc_gles_batch
+{
+    u32 size;
+    _Alignas(8) char data[OC_GLES_BATCH_CAPACITY];
+} oc_gles_batch;
+
+static oc_gles_batch __orcaGlesBatch = { 0 };
+
+void ORCA_IMPORT(oc_gles_batch_submit)(const void* data, u32 size);
+
+void oc_gles_batch_flush(void)
+{
+    if(__orcaGlesBatch.size)
+    {
+        oc_gles_batch_submit(__orcaGlesBatch.data, __orcaGlesBatch.size);
+        __orcaGlesBatch.size = 0;
+    }
+}
+
+//NOTE: the space a buffer of len bytes can take in a command. Lengths that can't fit in the command buffer
+//      are clamped, so that adding up the sizes of a command's buffers can't wrap around.
+static inline u64 oc_gles_batch_buffer_size(u64 len)
+{
+    if(len > OC_GLES_BATCH_CAPACITY)
+    {
+        len = OC_GLES_BATCH_CAPACITY + 1;
+    }
+    return (len + sizeof(u32) + 7);
+}
+
+//NOTE: starts a command of at most size bytes, flushing the command buffer if it doesn't have enough room.
+//      Returns 0 if the command can't fit in the buffer at all, in which case the call must be made directly.
+static inline char* oc_gles_batch_begin(u32 index, u64 size)
+{
+    if(size > OC_GLES_BATCH_CAPACITY - __orcaGlesBatch.size)
+    {
+        oc_gles_batch_flush();
+        if(size > OC_GLES_BATCH_CAPACITY)
+        {
+            return (0);
+        }
+    }
+    char* cmd = __orcaGlesBatch.data + __orcaGlesBatch.size;
+    memcpy(cmd, &index, sizeof(index));
+    return (cmd + sizeof(index));
+}
+
+static inline void oc_gles_batch_end(char* cmd)
+{
+    __orcaGlesBatch.size = cmd - __orcaGlesBatch.data;
+}
+
+static inline char* oc_gles_batch_write_i32(char* cmd, i32 value)
+{
+    memcpy(cmd, &value, sizeof(value));
+    return (cmd + sizeof(value));
+}
+
+static inline char* oc_gles_batch_write_i64(char* cmd, i64 value)
+{
+    memcpy(cmd, &value, sizeof(value));
+    return (cmd + sizeof(value));
+}
+
+static inline char* oc_gles_batch_write_f32(char* cmd, f32 value)
+{
+    memcpy(cmd, &value, sizeof(value));
+    return (cmd + sizeof(value));
+}
+
+static inline char* oc_gles_batch_write_f64(char* cmd, f64 value)
+{
+    memcpy(cmd, &value, sizeof(value));
+    return (cmd + sizeof(value));
+}
+
+static inline char* oc_gles_batch_write_buffer(char* cmd, const void* data, u64 len)
+{
+    u32 size = (u32)len;
+    memcpy(cmd, &size, sizeof(size));
+    cmd += sizeof(size);
+
+    //NOTE: pad the data to 8 bytes, so that the runtime can pass it to GL in place
+    cmd += (8 - ((cmd - __orcaGlesBatch.data) & 7)) & 7;
+    memcpy(cmd, data, len);
+    return (cmd + len);
+}
+
+//NOTE: the GLES functions that are bound by hand in the runtime (see wasmbind/gles_api_bind_manual.c)
+//      aren't in the generated stubs, so they're wrapped here.
+void ORCA_IMPORT_AS(glShaderSource, glShaderSource_import)(GLuint shader, GLsizei count, const GLchar* const* string, const GLint* length);
+void ORCA_IMPORT_AS(glGetVertexAttribPointerv, glGetVertexAttribPointerv_import)(GLuint index, GLenum pname, void** pointer);
+void ORCA_IMPORT_AS(glVertexAttribPointer, glVertexAttribPointer_import)(GLuint index, GLint size, GLenum type, GLboolean normalized, GLsizei stride, const void* pointer);
+void ORCA_IMPORT_AS(glVertexAttribIPointer, glVertexAttribIPointer_import)(GLuint index, GLint size, GLenum type, GLsizei stride, const void* pointer);
+const GLubyte* ORCA_IMPORT_AS(glGetString, glGetString_import)(GLenum name);
+const GLubyte* ORCA_IMPORT_AS(glGetStringi, glGetStringi_import)(GLenum name, GLuint index);
+void ORCA_IMPORT_AS(glGetUniformIndices, glGetUniformIndices_import)(GLuint program, GLsizei uniformCount, const GLchar* const* uniformNames, GLuint* uniformIndices);
+
+void glShaderSource(GLuint shader, GLsizei count, const GLchar* const* string, const GLint* length)
+{
+    oc_gles_batch_flush();
+    glShaderSource_import(shader, count, string, length);
+}
+
+void glGetVertexAttribPointerv(GLuint index, GLenum pname, void** pointer)
+{
+    oc_gles_batch_flush();
+    glGetVertexAttribPointerv_import(index, pname, pointer);
+}
+
+void glVertexAttribPointer(GLuint index, GLint size, GLenum type, GLboolean normalized, GLsizei stride, const void* pointer)
+{
+    oc_gles_batch_flush();
+    glVertexAttribPointer_import(index, size, type, normalized, stride, pointer);
+}
+
+void glVertexAttribIPointer(GLuint index, GLint size, GLenum type, GLsizei stride, const void* pointer)
+{
+    oc_gles_batch_flush();
+    glVertexAttribIPointer_import(index, size, type, stride, pointer);
+}
+
+const GLubyte* glGetString(GLenum name)
+{
+    oc_gles_batch_flush();
+    return (glGetString_import(name));
+}
+
+const GLubyte* glGetStringi(GLenum name, GLuint index)
+{
+    oc_gles_batch_flush();
+    return (glGetStringi_import(name, index));
+}
+
+void glGetUniformIndices(GLuint program, GLsizei uniformCount, const GLchar* const* uniformNames, GLuint* uniformIndices)
+{
+    oc_gles_batch_flush();
+    glGetUniformIndices_import(program, uniformCount, uniformNames, uniformIndices);
+}
+
+#endif // OC_GLES_BATCH
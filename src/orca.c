@@ -100,6 +100,8 @@
     #include "wasmbind/core_api_stubs.c"
     #include "graphics/graphics_common.c"
     #include "graphics/orca_surface_stubs.c"
+    #include "graphics/orca_gles_batch.c"
+    #include "graphics/orca_gles_batch_stubs.c"
 #else
     #error "Unsupported platform"
 #endif
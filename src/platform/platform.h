@@ -99,6 +99,19 @@
 
 #if OC_PLATFORM_ORCA
     #define ORCA_IMPORT(f) __attribute__((import_name(#f))) f
+    #define ORCA_IMPORT_AS(name, f) __attribute__((import_name(#name))) f
+
+    //NOTE: with OC_GLES_BATCH, GLES functions are defined by liborca, which batches their calls
+    //      (see graphics/orca_gles_batch.c), instead of being imported from the runtime one by one.
+    #ifndef OC_GLES_BATCH
+        #define OC_GLES_BATCH 0
+    #endif
+
+    #if OC_GLES_BATCH
+        #define ORCA_GL_IMPORT(f) f
+    #else
+        #define ORCA_GL_IMPORT(f) ORCA_IMPORT(f)
+    #endif
 
     #if OC_COMPILER_CLANG
         #ifdef __cplusplus
@@ -8,6 +8,7 @@
 #include <errno.h>
 #include <math.h>
 #include <stdio.h>
+#include <stdlib.h>
 
 #define OC_INCLUDE_GL_API
 #include "graphics/graphics_common.h"
@@ -179,6 +180,126 @@ void oc_abort_ext_dialog(const char* file, const char* function, int line, const
     oc_scratch_end(scratch);
 }
 
+OC_COLD void oc_bindgen_bounds_fail(const char* file, const char* function, int line, const char* what)
+{
+    oc_abort_ext_dialog(file, function, line, "%s is out of bounds", what);
+}
+
+OC_COLD void oc_bindgen_batch_fail(oc_bindgen_batch_reader* reader, const char* msg)
+{
+    OC_ABORT("Invalid command buffer: %s (at offset %llu)", msg, (unsigned long long)(reader->ptr - reader->start));
+}
+
+#if OC_BINDGEN_CAPTURE
+
+#define OC_BINDGEN_TRACE_MAGIC "OCTRACE"
+#define OC_BINDGEN_TRACE_VERSION 1
+
+typedef struct oc_bindgen_trace_header
+{
+    char magic[8];
+    u32 version;
+    u32 reserved;
+} oc_bindgen_trace_header;
+
+typedef struct oc_bindgen_capture_state
+{
+    FILE* file;
+    u64 offset;
+} oc_bindgen_capture_state;
+
+oc_bindgen_capture_state __orcaBindgenCapture = { 0 };
+
+void oc_bindgen_capture_start(const char* path)
+{
+    __orcaBindgenCapture.file = fopen(path, "wb");
+    if(!__orcaBindgenCapture.file)
+    {
+        oc_log_error("Couldn't open capture file %s\n", path);
+        return;
+    }
+    setvbuf(__orcaBindgenCapture.file, 0, _IOFBF, 1 << 20);
+
+    oc_bindgen_trace_header header = { .magic = OC_BINDGEN_TRACE_MAGIC, .version = OC_BINDGEN_TRACE_VERSION };
+    oc_bindgen_capture_write(&header, sizeof(header));
+
+    oc_log_info("capturing host calls to %s\n", path);
+}
+
+void oc_bindgen_capture_stop(void)
+{
+    if(__orcaBindgenCapture.file)
+    {
+        fclose(__orcaBindgenCapture.file);
+        __orcaBindgenCapture.file = 0;
+    }
+}
+
+bool oc_bindgen_capture_enabled(void)
+{
+    return (__orcaBindgenCapture.file != 0);
+}
+
+void oc_bindgen_capture_write(const void* data, u64 size)
+{
+    fwrite(data, 1, size, __orcaBindgenCapture.file);
+    __orcaBindgenCapture.offset += size;
+}
+
+void oc_bindgen_capture_call(oc_bindgen_api api, u32 index)
+{
+    u32 id = ((u32)api << 24) | index;
+    oc_bindgen_capture_write(&id, sizeof(id));
+}
+
+void oc_bindgen_capture_buffer(const void* data, u64 size)
+{
+    static const char zeros[8] = { 0 };
+
+    //NOTE: pad the data to 8 bytes, so that replays can use it in place
+    oc_bindgen_capture_write(&size, sizeof(size));
+    oc_bindgen_capture_write(zeros, (8 - (__orcaBindgenCapture.offset & 7)) & 7);
+    oc_bindgen_capture_write(data, size);
+}
+
+void oc_bindgen_replay_fail(oc_bindgen_replay_reader* reader, const char* msg)
+{
+    OC_ABORT("Couldn't replay trace: %s (at offset %llu)", msg, (unsigned long long)(reader->ptr - reader->start));
+}
+
+void oc_bindgen_replay_read(oc_bindgen_replay_reader* reader, void* data, u64 size)
+{
+    if(size > (u64)(reader->end - reader->ptr))
+    {
+        oc_bindgen_replay_fail(reader, "trace is truncated");
+    }
+    memcpy(data, reader->ptr, size);
+    reader->ptr += size;
+}
+
+void* oc_bindgen_replay_buffer(oc_bindgen_replay_reader* reader, u64* size)
+{
+    u64 bufferSize = 0;
+    oc_bindgen_replay_read(reader, &bufferSize, sizeof(bufferSize));
+
+    u64 padding = (8 - ((reader->ptr - reader->start) & 7)) & 7;
+    if(padding > (u64)(reader->end - reader->ptr)
+       || bufferSize > (u64)(reader->end - reader->ptr) - padding)
+    {
+        oc_bindgen_replay_fail(reader, "trace is truncated");
+    }
+    void* data = reader->ptr + padding;
+    reader->ptr += padding + bufferSize;
+
+    if(size)
+    {
+        *size = bufferSize;
+    }
+    return (data);
+}
+
+#endif // OC_BINDGEN_CAPTURE
+
 void oc_wasm3_trap(IM3Runtime runtime, M3Result res, const char* file, const char* function, int line, const char* msg)
 {
     M3ErrorInfo errInfo = { 0 };
@@ -464,12 +585,278 @@ void oc_wasm_env_init(oc_wasm_env* runtime)
 #include "wasmbind/surface_api_bind_manual.c"
 #include "wasmbind/surface_api_bind_gen.c"
 
+typedef struct oc_bindgen_import_table
+{
+    const oc_bindgen_import* imports;
+    u32 count;
+} oc_bindgen_import_table;
+
+static const oc_bindgen_import_table OC_BINDGEN_IMPORT_TABLES[] = {
+    { bindgen_core_api_imports, oc_array_size(bindgen_core_api_imports) },
+    { bindgen_surface_api_imports, oc_array_size(bindgen_surface_api_imports) },
+    { bindgen_clock_api_imports, oc_array_size(bindgen_clock_api_imports) },
+    { bindgen_io_api_imports, oc_array_size(bindgen_io_api_imports) },
+    { bindgen_gles_api_imports, oc_array_size(bindgen_gles_api_imports) },
+    { manual_gles_api_imports, oc_array_size(manual_gles_api_imports) },
+};
+
+const oc_bindgen_import* oc_bindgen_find_import(const char* name)
+{
+    for(int tableIndex = 0; tableIndex < oc_array_size(OC_BINDGEN_IMPORT_TABLES); tableIndex++)
+    {
+        const oc_bindgen_import_table* table = &OC_BINDGEN_IMPORT_TABLES[tableIndex];
+        u32 lo = 0;
+        u32 hi = table->count;
+        while(lo < hi)
+        {
+            u32 mid = lo + (hi - lo) / 2;
+            int cmp = strcmp(name, table->imports[mid].name);
+            if(cmp == 0)
+            {
+                return (&table->imports[mid]);
+            }
+            else if(cmp < 0)
+            {
+                hi = mid;
+            }
+            else
+            {
+                lo = mid + 1;
+            }
+        }
+    }
+    return (0);
+}
+
+int oc_bindgen_link_imports(IM3Module module)
+{
+    //NOTE: walk the module's imports once and link the ones we have a binding for, rather than
+    //      asking wasm3 to search the imports for each of the (several hundred) bindings.
+    //      Imports without a binding are left unlinked, and trap if they're called.
+#ifdef OC_DEBUG
+    f64 startTime = oc_clock_time(OC_CLOCK_MONOTONIC);
+    u32 linkedCount = 0;
+#endif
+    int ret = 0;
+
+    //NOTE: same precondition as wasm3's own linking functions
+    if(!module->runtime)
+    {
+        oc_log_error("Couldn't link imported functions (%s)\n", m3Err_moduleNotLinked);
+        return (-1);
+    }
+
+    for(u32 funcIndex = 0; funcIndex < module->numFuncImports; funcIndex++)
+    {
+        IM3Function function = &module->functions[funcIndex];
+        if(!function->import.moduleUtf8 || !function->import.fieldUtf8)
+        {
+            continue;
+        }
+
+        const oc_bindgen_import* import = oc_bindgen_find_import(function->import.fieldUtf8);
+        if(!import)
+        {
+            continue;
+        }
+
+        IM3FuncType type = 0;
+        M3Result res = SignatureToFuncType(&type, import->signature);
+        if(res == m3Err_none && !AreFuncTypesEqual(type, function->funcType))
+        {
+            res = "function signature mismatch";
+        }
+        m3_Free(type);
+
+        if(res == m3Err_none)
+        {
+            res = CompileRawFunction(module, function, (const void*)import->stub, 0);
+        }
+
+        if(res != m3Err_none)
+        {
+            oc_log_error("Couldn't link function %s (%s)\n", import->name, res);
+            ret = -1;
+        }
+#ifdef OC_DEBUG
+        else
+        {
+            linkedCount++;
+        }
+#endif
+    }
+
+#ifdef OC_DEBUG
+    oc_log_info("linked %u of %u imported functions in %.3f ms\n",
+                linkedCount,
+                module->numFuncImports,
+                (oc_clock_time(OC_CLOCK_MONOTONIC) - startTime) * 1000);
+#endif
+
+    return (ret);
+}
+
+#if OC_BINDGEN_CAPTURE
+void oc_bindgen_replay_trace(const char* path)
+{
+    FILE* file = fopen(path, "rb");
+    if(!file)
+    {
+        OC_ABORT("Couldn't open trace %s", path);
+    }
+    fseek(file, 0, SEEK_END);
+    u64 size = ftell(file);
+    rewind(file);
+
+    char* trace = oc_malloc_array(char, size);
+    u64 readSize = fread(trace, 1, size, file);
+    fclose(file);
+
+    oc_bindgen_replay_reader reader = {
+        .start = trace,
+        .ptr = trace,
+        .end = trace + readSize,
+    };
+
+    oc_bindgen_trace_header header = { 0 };
+    oc_bindgen_replay_read(&reader, &header, sizeof(header));
+    if(memcmp(header.magic, OC_BINDGEN_TRACE_MAGIC, sizeof(OC_BINDGEN_TRACE_MAGIC))
+       || header.version != OC_BINDGEN_TRACE_VERSION)
+    {
+        OC_ABORT("%s is not a trace, or was captured by another version of Orca", path);
+    }
+
+    oc_log_info("replaying host calls from %s\n", path);
+
+    f64 startTime = oc_clock_time(OC_CLOCK_MONOTONIC);
+    u64 callCount = 0;
+
+    while(reader.ptr < reader.end)
+    {
+        u32 id = 0;
+        oc_bindgen_replay_read(&reader, &id, sizeof(id));
+
+        u32 index = id & 0xffffff;
+        switch(id >> 24)
+        {
+            case OC_BINDGEN_API_SURFACE:
+                bindgen_surface_api_replay(index, &reader);
+                break;
+            case OC_BINDGEN_API_GLES:
+                bindgen_gles_api_replay(index, &reader);
+                break;
+            case OC_BINDGEN_API_GLES_MANUAL:
+                manual_gles_api_replay(index, &reader);
+                break;
+            default:
+                oc_bindgen_replay_fail(&reader, "unknown API");
+                break;
+        }
+        callCount++;
+    }
+
+    oc_log_info("replayed %llu calls in %.3f ms\n",
+                (unsigned long long)callCount,
+                (oc_clock_time(OC_CLOCK_MONOTONIC) - startTime) * 1000);
+
+    free(trace);
+}
+#endif
+
+#if OC_BINDGEN_PROFILE
+typedef struct oc_bindgen_profile_table
+{
+    oc_bindgen_profile_entry* entries;
+    u32 count;
+} oc_bindgen_profile_table;
+
+static const oc_bindgen_profile_table OC_BINDGEN_PROFILE_TABLES[] = {
+    { bindgen_core_api_profile, oc_array_size(bindgen_core_api_profile) },
+    { bindgen_surface_api_profile, oc_array_size(bindgen_surface_api_profile) },
+    { bindgen_clock_api_profile, oc_array_size(bindgen_clock_api_profile) },
+    { bindgen_io_api_profile, oc_array_size(bindgen_io_api_profile) },
+    { bindgen_gles_api_profile, oc_array_size(bindgen_gles_api_profile) },
+};
+
+int oc_bindgen_profile_compare(const void* a, const void* b)
+{
+    f64 timeA = (*(const oc_bindgen_profile_entry**)a)->time;
+    f64 timeB = (*(const oc_bindgen_profile_entry**)b)->time;
+    return ((timeA < timeB) - (timeA > timeB));
+}
+
+void oc_bindgen_profile_dump(void)
+{
+    oc_arena_scope scratch = oc_scratch_begin();
+
+    u32 maxCount = 0;
+    for(int tableIndex = 0; tableIndex < oc_array_size(OC_BINDGEN_PROFILE_TABLES); tableIndex++)
+    {
+        maxCount += OC_BINDGEN_PROFILE_TABLES[tableIndex].count;
+    }
+
+    //NOTE: collect the functions that were called, by decreasing host time
+    oc_bindgen_profile_entry** entries = oc_arena_push_array(scratch.arena, oc_bindgen_profile_entry*, maxCount);
+    u32 entryCount = 0;
+    u64 totalCount = 0;
+    f64 totalTime = 0;
+
+    for(int tableIndex = 0; tableIndex < oc_array_size(OC_BINDGEN_PROFILE_TABLES); tableIndex++)
+    {
+        const oc_bindgen_profile_table* table = &OC_BINDGEN_PROFILE_TABLES[tableIndex];
+        for(u32 i = 0; i < table->count; i++)
+        {
+            if(table->entries[i].count)
+            {
+                entries[entryCount] = &table->entries[i];
+                entryCount++;
+                totalCount += table->entries[i].count;
+                totalTime += table->entries[i].time;
+            }
+        }
+    }
+    qsort(entries, entryCount, sizeof(oc_bindgen_profile_entry*), oc_bindgen_profile_compare);
+
+    oc_log_info("host calls: %llu calls, %.3f ms in %u functions\n", (unsigned long long)totalCount, totalTime * 1000, entryCount);
+    oc_log_info("%12s %12s %10s %6s  %s\n", "calls", "total ms", "avg us", "%", "function");
+    for(u32 i = 0; i < entryCount; i++)
+    {
+        oc_bindgen_profile_entry* entry = entries[i];
+        oc_log_info("%12llu %12.3f %10.3f %6.2f  %s\n",
+                    (unsigned long long)entry->count,
+                    entry->time * 1000,
+                    entry->time * 1e6 / entry->count,
+                    totalTime > 0 ? entry->time * 100 / totalTime : 0,
+                    entry->name);
+    }
+
+    oc_scratch_end(scratch);
+}
+#endif
+
 i32 orca_runloop(void* user)
 {
     oc_runtime* app = &__orcaApp;
 
     oc_wasm_env_init(&app->env);
 
+#if OC_BINDGEN_CAPTURE
+    //NOTE: replay a trace instead of running the app, or capture the app's calls
+    const char* replayPath = getenv("ORCA_REPLAY");
+    if(replayPath)
+    {
+        oc_bindgen_replay_trace(replayPath);
+        oc_request_quit();
+        return (0);
+    }
+
+    const char* capturePath = getenv("ORCA_CAPTURE");
+    if(capturePath)
+    {
+        oc_bindgen_capture_start(capturePath);
+    }
+#endif
+
     //NOTE: loads wasm module
     oc_arena_scope scratch = oc_scratch_begin();
 
@@ -515,14 +902,7 @@ i32 orca_runloop(void* user)
 
     //NOTE: bind orca APIs
     {
-        int err = 0;
-        err |= bindgen_link_core_api(app->env.m3Module);
-        err |= bindgen_link_surface_api(app->env.m3Module);
-        err |= bindgen_link_clock_api(app->env.m3Module);
-        err |= bindgen_link_io_api(app->env.m3Module);
-        err |= bindgen_link_gles_api(app->env.m3Module);
-        err |= manual_link_gles_api(app->env.m3Module);
-
+        int err = oc_bindgen_link_imports(app->env.m3Module);
         if(err)
         {
             OC_ABORT("The application couldn't link one or more functions to its web assembly module (see console log for more information)");
@@ -607,6 +987,9 @@ i32 orca_runloop(void* user)
         oc_io_cmp cmp = oc_io_wait_single_req_for_table(&req, &app->fileTable);
         app->rootDir = cmp.handle;
 
+        oc_str8 packPath = oc_path_executable_relative(scratch.arena, OC_STR8("../app/data.pack"));
+        oc_pack_open(&app->pack, packPath);
+
         oc_scratch_end(scratch);
     }
 
@@ -987,6 +1370,13 @@ i32 orca_runloop(void* user)
         }
     }
 
+#if OC_BINDGEN_PROFILE
+    oc_bindgen_profile_dump();
+#endif
+#if OC_BINDGEN_CAPTURE
+    oc_bindgen_capture_stop();
+#endif
+
     oc_request_quit();
 
     return (0);
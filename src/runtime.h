@@ -11,7 +11,9 @@
 #include "platform/platform_io_internal.h"
 #include "runtime_memory.h"
 #include "runtime_clipboard.h"
+#include "runtime_io.h"
 
+#include "m3_bind.h"
 #include "m3_compile.h"
 #include "m3_env.h"
 #include "wasm3.h"
@@ -120,6 +122,7 @@ typedef struct oc_runtime
 
     oc_file_table fileTable;
     oc_file rootDir;
+    oc_pack pack;
 
     oc_wasm_env env;
 
@@ -138,6 +141,161 @@ void oc_assert_fail_dialog(const char* file, const char* function, int line, con
 #define OC_ASSERT_DIALOG(test, ...) \
     _OC_ASSERT_DIALOG_(test, OC_VA_NOPT("", ##__VA_ARGS__) OC_ARG1(__VA_ARGS__) OC_VA_COMMA_TAIL(__VA_ARGS__))
 
+//NOTE: bounds checks of the guest pointers passed to host functions, emitted by scripts/bindgen.py.
+//      Each check is a single range comparison against the memory size the stub read on entry,
+//      and the failure path is a cold, out of line call, so that the checks stay cheap in every stub.
+#if defined(OC_COMPILER_CL)
+    #define OC_COLD __declspec(noinline)
+    #define oc_unlikely(x) (x)
+#else
+    #define OC_COLD __attribute__((cold, noinline))
+    #define oc_unlikely(x) __builtin_expect(!!(x), 0)
+#endif
+
+OC_COLD void oc_bindgen_bounds_fail(const char* file, const char* function, int line, const char* what);
+
+//NOTE: offset is checked first, so that memSize - offset can't wrap around, and len is only evaluated
+//      for an offset that is in bounds (length procs like orca_check_cstring() rely on that).
+#define oc_bindgen_in_bounds(memSize, offset, len) \
+    ((offset) < (memSize) && (u64)(len) <= (memSize) - (offset))
+
+//NOTE: host functions importable by wasm modules. scripts/bindgen.py emits a table of these, sorted by name,
+//      for each API, and oc_bindgen_link_imports() links a module's imports by looking them up in the tables.
+typedef struct oc_bindgen_import
+{
+    const char* name;
+    const char* signature;
+    M3RawCall stub;
+} oc_bindgen_import;
+
+//NOTE: batched host calls. Guests built with OC_GLES_BATCH encode their GLES calls into a command buffer in
+//      their memory (see graphics/orca_gles_batch.c) and submit it with a single import, whose stub decodes
+//      the buffer and makes the calls. A command is the function's u32 index in the API, then its arguments
+//      in order: 4 byte scalars as i32 or f32, 8 byte scalars as i64 or f64, and the bytes behind pointers as
+//      their u32 length, followed by the bytes themselves, padded to 8 bytes from the start of the buffer.
+typedef struct oc_bindgen_batch_reader
+{
+    char* start;
+    char* ptr;
+    char* end;
+} oc_bindgen_batch_reader;
+
+OC_COLD void oc_bindgen_batch_fail(oc_bindgen_batch_reader* reader, const char* msg);
+
+static inline void oc_bindgen_batch_read(oc_bindgen_batch_reader* reader, void* data, u64 size)
+{
+    if(oc_unlikely(size > (u64)(reader->end - reader->ptr)))
+    {
+        oc_bindgen_batch_fail(reader, "command is truncated");
+    }
+    memcpy(data, reader->ptr, size);
+    reader->ptr += size;
+}
+
+static inline i32 oc_bindgen_batch_read_i32(oc_bindgen_batch_reader* reader)
+{
+    i32 value = 0;
+    oc_bindgen_batch_read(reader, &value, sizeof(value));
+    return (value);
+}
+
+static inline i64 oc_bindgen_batch_read_i64(oc_bindgen_batch_reader* reader)
+{
+    i64 value = 0;
+    oc_bindgen_batch_read(reader, &value, sizeof(value));
+    return (value);
+}
+
+static inline f32 oc_bindgen_batch_read_f32(oc_bindgen_batch_reader* reader)
+{
+    f32 value = 0;
+    oc_bindgen_batch_read(reader, &value, sizeof(value));
+    return (value);
+}
+
+static inline f64 oc_bindgen_batch_read_f64(oc_bindgen_batch_reader* reader)
+{
+    f64 value = 0;
+    oc_bindgen_batch_read(reader, &value, sizeof(value));
+    return (value);
+}
+
+static inline void* oc_bindgen_batch_read_buffer(oc_bindgen_batch_reader* reader, u32* size)
+{
+    u32 bufferSize = 0;
+    oc_bindgen_batch_read(reader, &bufferSize, sizeof(bufferSize));
+
+    u64 padding = (8 - ((reader->ptr - reader->start) & 7)) & 7;
+    if(oc_unlikely(padding > (u64)(reader->end - reader->ptr)
+                   || bufferSize > (u64)(reader->end - reader->ptr) - padding))
+    {
+        oc_bindgen_batch_fail(reader, "command is truncated");
+    }
+    void* data = reader->ptr + padding;
+    reader->ptr += padding + bufferSize;
+
+    *size = bufferSize;
+    return (data);
+}
+
+//NOTE: host call profiling. Bindings generated with bindgen.py --profile count the calls to each stub
+//      and their host time when compiled with OC_BINDGEN_PROFILE, and the totals are logged when the app
+//      terminates. Otherwise the instrumentation is compiled out entirely.
+#ifndef OC_BINDGEN_PROFILE
+    #define OC_BINDGEN_PROFILE 0
+#endif
+
+#if OC_BINDGEN_PROFILE
+typedef struct oc_bindgen_profile_entry
+{
+    const char* name;
+    u64 count;
+    f64 time;
+} oc_bindgen_profile_entry;
+
+static inline void oc_bindgen_profile_record(oc_bindgen_profile_entry* entry, f64 start)
+{
+    entry->count++;
+    entry->time += oc_clock_time(OC_CLOCK_MONOTONIC) - start;
+}
+#endif
+
+//NOTE: host call capture. Bindings generated with bindgen.py --capture record the calls to their stubs when
+//      compiled with OC_BINDGEN_CAPTURE and ORCA_CAPTURE is set to a trace path, and the runtime replays
+//      such a trace instead of running the app when ORCA_REPLAY is set to its path.
+//
+//      A trace is a header followed by one record per call: the function's id (its API in the top 8 bits,
+//      and its index in the API), then its arguments in order. Scalars and structs are written as they are,
+//      and the bytes behind pointers are written with their u64 length and padded to 8 bytes.
+#ifndef OC_BINDGEN_CAPTURE
+    #define OC_BINDGEN_CAPTURE 0
+#endif
+
+#if OC_BINDGEN_CAPTURE
+typedef enum oc_bindgen_api
+{
+    OC_BINDGEN_API_SURFACE,
+    OC_BINDGEN_API_GLES,
+    OC_BINDGEN_API_GLES_MANUAL,
+} oc_bindgen_api;
+
+typedef struct oc_bindgen_replay_reader
+{
+    char* start;
+    char* ptr;
+    char* end;
+} oc_bindgen_replay_reader;
+
+bool oc_bindgen_capture_enabled(void);
+void oc_bindgen_capture_call(oc_bindgen_api api, u32 index);
+void oc_bindgen_capture_write(const void* data, u64 size);
+void oc_bindgen_capture_buffer(const void* data, u64 size);
+
+void oc_bindgen_replay_read(oc_bindgen_replay_reader* reader, void* data, u64 size);
+void* oc_bindgen_replay_buffer(oc_bindgen_replay_reader* reader, u64* size);
+void oc_bindgen_replay_fail(oc_bindgen_replay_reader* reader, const char* msg);
+#endif
+
 void oc_wasm3_trap(IM3Runtime runtime, M3Result res, const char* file, const char* function, int line, const char* msg);
 #define OC_WASM3_TRAP(runtime, err, msg) oc_wasm3_trap(runtime, err, __FILE__, __FUNCTION__, __LINE__, msg)
 
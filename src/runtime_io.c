@@ -5,10 +5,395 @@
 *  See LICENSE.txt for licensing information
 *
 **************************************************************************/
+#include <limits.h>
+
+#if OC_PLATFORM_MACOS
+    #include <fcntl.h>
+    #include <sys/mman.h>
+    #include <sys/stat.h>
+    #include <unistd.h>
+#endif
+
 #include "platform/platform_io_internal.h"
 #include "runtime.h"
+#include "runtime_io.h"
 #include "runtime_memory.h"
 
+//NOTE: a private copy of stb_image, only for its zlib decoder (liborca's copy isn't exported)
+#define STB_IMAGE_STATIC
+#define STB_IMAGE_IMPLEMENTATION
+#define STBI_ONLY_PNG
+#define STBI_NO_STDIO
+#include "stb/stb_image.h"
+
+//------------------------------------------------------------------------
+// Packed resources
+//------------------------------------------------------------------------
+
+static bool oc_pack_map_file(oc_str8 path, char** base, u64* size)
+{
+    oc_arena_scope scratch = oc_scratch_begin();
+    bool result = false;
+
+#if OC_PLATFORM_WINDOWS
+    int wideLen = MultiByteToWideChar(CP_UTF8, 0, path.ptr, (int)path.len, 0, 0);
+    wchar_t* widePath = oc_arena_push_array(scratch.arena, wchar_t, wideLen + 1);
+    MultiByteToWideChar(CP_UTF8, 0, path.ptr, (int)path.len, widePath, wideLen);
+    widePath[wideLen] = 0;
+
+    HANDLE file = CreateFileW(widePath, GENERIC_READ, FILE_SHARE_READ, 0, OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, 0);
+    if(file != INVALID_HANDLE_VALUE)
+    {
+        LARGE_INTEGER fileSize;
+        if(GetFileSizeEx(file, &fileSize) && fileSize.QuadPart > 0)
+        {
+            HANDLE mapping = CreateFileMappingW(file, 0, PAGE_READONLY, 0, 0, 0);
+            if(mapping)
+            {
+                *base = MapViewOfFile(mapping, FILE_MAP_READ, 0, 0, 0);
+                *size = fileSize.QuadPart;
+                result = (*base != 0);
+                CloseHandle(mapping);
+            }
+        }
+        CloseHandle(file);
+    }
+#else
+    char* cpath = oc_str8_to_cstring(scratch.arena, path);
+    int fd = open(cpath, O_RDONLY);
+    if(fd >= 0)
+    {
+        struct stat st;
+        if(fstat(fd, &st) == 0 && st.st_size > 0)
+        {
+            void* ptr = mmap(0, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+            if(ptr != MAP_FAILED)
+            {
+                *base = ptr;
+                *size = st.st_size;
+                result = true;
+            }
+        }
+        close(fd);
+    }
+#endif
+
+    oc_scratch_end(scratch);
+    return (result);
+}
+
+static void oc_pack_unmap_file(char* base, u64 size)
+{
+#if OC_PLATFORM_WINDOWS
+    UnmapViewOfFile(base);
+#else
+    munmap(base, size);
+#endif
+}
+
+bool oc_pack_open(oc_pack* pack, oc_str8 path)
+{
+    char* base = 0;
+    u64 size = 0;
+    if(!oc_pack_map_file(path, &base, &size))
+    {
+        //NOTE: no pack, the app uses loose files
+        return (false);
+    }
+
+    oc_pack_header* header = (oc_pack_header*)base;
+    if(size < sizeof(oc_pack_header)
+       || memcmp(header->magic, OC_PACK_MAGIC, sizeof(header->magic))
+       || header->version != OC_PACK_VERSION
+       || header->tocOffset > size
+       || header->entryCount > (size - header->tocOffset) / sizeof(oc_pack_entry)
+       || header->namesOffset > size
+       || header->namesSize > size - header->namesOffset)
+    {
+        oc_log_error("ignoring invalid resource pack %.*s\n", oc_str8_ip(path));
+        oc_pack_unmap_file(base, size);
+        return (false);
+    }
+
+    pack->base = base;
+    pack->size = size;
+    pack->entryCount = header->entryCount;
+    pack->entries = (oc_pack_entry*)(base + header->tocOffset);
+    pack->names = oc_str8_from_buffer(header->namesSize, base + header->namesOffset);
+    return (true);
+}
+
+static u64 oc_pack_path_hash(oc_str8 path)
+{
+    u64 hash = 0xcbf29ce484222325ULL;
+    for(u64 i = 0; i < path.len; i++)
+    {
+        hash ^= (u8)path.ptr[i];
+        hash *= 0x100000001b3ULL;
+    }
+    return (hash);
+}
+
+static bool oc_pack_normalize_path(oc_arena* arena, oc_str8 path, oc_str8* result)
+{
+    //NOTE: resolve '.', '..' and repeated separators, the way a restricted open relative to the
+    //      root would. Walking out of the root fails.
+    char* buffer = oc_arena_push_array(arena, char, path.len + 1);
+    u64 len = 0;
+    u64 start = 0;
+    while(start <= path.len)
+    {
+        u64 end = start;
+        while(end < path.len && path.ptr[end] != '/')
+        {
+            end++;
+        }
+        oc_str8 name = oc_str8_slice(path, start, end);
+        start = end + 1;
+
+        if(name.len == 0 || !oc_str8_cmp(name, OC_STR8(".")))
+        {
+            continue;
+        }
+        else if(!oc_str8_cmp(name, OC_STR8("..")))
+        {
+            if(len == 0)
+            {
+                return (false);
+            }
+            while(len > 0 && buffer[len - 1] != '/')
+            {
+                len--;
+            }
+            if(len > 0)
+            {
+                len--;
+            }
+        }
+        else
+        {
+            if(len > 0)
+            {
+                buffer[len++] = '/';
+            }
+            memcpy(buffer + len, name.ptr, name.len);
+            len += name.len;
+        }
+    }
+    *result = oc_str8_from_buffer(len, buffer);
+    return (true);
+}
+
+static oc_pack_entry* oc_pack_find(oc_pack* pack, oc_str8 path)
+{
+    oc_arena_scope scratch = oc_scratch_begin();
+    oc_pack_entry* result = 0;
+
+    oc_str8 name = { 0 };
+    if(pack->base && oc_pack_normalize_path(scratch.arena, path, &name) && name.len)
+    {
+        u64 hash = oc_pack_path_hash(name);
+
+        //NOTE: find the first entry with this hash, then check names in case of collisions
+        u32 lo = 0;
+        u32 hi = pack->entryCount;
+        while(lo < hi)
+        {
+            u32 mid = lo + (hi - lo) / 2;
+            if(pack->entries[mid].pathHash < hash)
+            {
+                lo = mid + 1;
+            }
+            else
+            {
+                hi = mid;
+            }
+        }
+
+        for(u32 i = lo; i < pack->entryCount && pack->entries[i].pathHash == hash; i++)
+        {
+            oc_pack_entry* entry = &pack->entries[i];
+            if((u64)entry->nameOffset + entry->nameLen <= pack->names.len
+               && !oc_str8_cmp(name, oc_str8_slice(pack->names, entry->nameOffset, entry->nameOffset + entry->nameLen)))
+            {
+                if(entry->offset <= pack->size
+                   && entry->length <= pack->size - entry->offset
+                   && ((entry->flags & OC_PACK_ENTRY_ZLIB) || entry->length == entry->size))
+                {
+                    result = entry;
+                }
+                break;
+            }
+        }
+    }
+
+    oc_scratch_end(scratch);
+    return (result);
+}
+
+static oc_io_cmp oc_pack_open_entry(oc_pack* pack, oc_file_table* table, oc_pack_entry* entry, oc_io_req* req)
+{
+    oc_io_cmp cmp = { 0 };
+
+    oc_file_slot* slot = oc_file_slot_alloc(table);
+    if(!slot)
+    {
+        cmp.error = OC_IO_ERR_MAX_FILES;
+        return (cmp);
+    }
+    slot->fd = oc_file_desc_nil();
+    slot->type = OC_FILE_REGULAR;
+    slot->rights = req->open.rights;
+    cmp.handle = oc_file_from_slot(table, slot);
+
+    if(req->open.rights & OC_FILE_ACCESS_WRITE
+       || req->open.flags & (OC_FILE_OPEN_TRUNCATE | OC_FILE_OPEN_APPEND))
+    {
+        //NOTE: packed files are read-only
+        slot->error = OC_IO_ERR_PERM;
+        slot->fatal = true;
+        cmp.error = slot->error;
+    }
+    else if(entry->flags & OC_PACK_ENTRY_ZLIB)
+    {
+        char* data = 0;
+        if(entry->size <= INT_MAX && entry->length <= INT_MAX)
+        {
+            data = malloc(entry->size ? entry->size : 1);
+        }
+        if(!data)
+        {
+            slot->error = OC_IO_ERR_MEM;
+        }
+        else if(stbi_zlib_decode_buffer(data, (int)entry->size, pack->base + entry->offset, (int)entry->length) != (int)entry->size)
+        {
+            free(data);
+            slot->error = OC_IO_ERR_PHYSICAL;
+        }
+        else
+        {
+            oc_pack_file* file = &pack->files[slot - table->slots];
+            file->entry = entry;
+            file->data = data;
+            file->pos = 0;
+        }
+
+        if(slot->error)
+        {
+            slot->fatal = true;
+            cmp.error = slot->error;
+        }
+    }
+    else
+    {
+        oc_pack_file* file = &pack->files[slot - table->slots];
+        file->entry = entry;
+        file->data = pack->base + entry->offset;
+        file->pos = 0;
+    }
+    return (cmp);
+}
+
+static oc_io_cmp oc_pack_file_req(oc_pack_file* file, oc_file_slot* slot, oc_file_table* table, oc_io_req* req)
+{
+    oc_io_cmp cmp = { 0 };
+    oc_pack_entry* entry = file->entry;
+
+    switch(req->op)
+    {
+        case OC_IO_CLOSE:
+            if(entry->flags & OC_PACK_ENTRY_ZLIB)
+            {
+                free(file->data);
+            }
+            file->entry = 0;
+            file->data = 0;
+            oc_file_slot_recycle(table, slot);
+            break;
+
+        case OC_IO_FSTAT:
+        {
+            if(req->size < sizeof(oc_file_status))
+            {
+                cmp.error = OC_IO_ERR_ARG;
+            }
+            else
+            {
+                oc_file_status* status = (oc_file_status*)req->buffer;
+                memset(status, 0, sizeof(oc_file_status));
+                status->type = OC_FILE_REGULAR;
+                status->perm = OC_FILE_OWNER_READ | OC_FILE_GROUP_READ | OC_FILE_OTHER_READ;
+                status->size = entry->size;
+            }
+        }
+        break;
+
+        case OC_IO_SEEK:
+        {
+            i64 base = 0;
+            switch(req->whence)
+            {
+                case OC_FILE_SEEK_SET:
+                    base = 0;
+                    break;
+                case OC_FILE_SEEK_END:
+                    base = entry->size;
+                    break;
+                case OC_FILE_SEEK_CURRENT:
+                    base = file->pos;
+                    break;
+            }
+            if(base + req->offset < 0)
+            {
+                slot->error = OC_IO_ERR_ARG;
+                cmp.error = slot->error;
+                cmp.result = -1;
+            }
+            else
+            {
+                file->pos = base + req->offset;
+                cmp.offset = file->pos;
+            }
+        }
+        break;
+
+        case OC_IO_READ:
+        {
+            u64 size = 0;
+            if(file->pos < entry->size)
+            {
+                size = entry->size - file->pos;
+                if(req->size < size)
+                {
+                    size = req->size;
+                }
+                memcpy(req->buffer, file->data + file->pos, size);
+                file->pos += size;
+            }
+            cmp.size = size;
+        }
+        break;
+
+        case OC_IO_WRITE:
+            slot->error = OC_IO_ERR_PERM;
+            cmp.error = slot->error;
+            break;
+
+        case OC_OC_IO_ERROR:
+            cmp.result = slot->error;
+            break;
+
+        default:
+            cmp.error = OC_IO_ERR_OP;
+            break;
+    }
+    return (cmp);
+}
+
+//------------------------------------------------------------------------
+// IO bridge
+//------------------------------------------------------------------------
+
 oc_io_cmp oc_bridge_io_single_rect(oc_io_req* wasmReq)
 {
     oc_runtime* orca = oc_runtime_get();
@@ -27,11 +412,30 @@ oc_io_cmp oc_bridge_io_single_rect(oc_io_req* wasmReq)
         {
             if(req.handle.h == 0)
             {
+                //NOTE: files in the resource pack shadow app/data
+                oc_pack_entry* entry = oc_pack_find(&orca->pack, oc_str8_from_buffer(req.size, req.buffer));
+                if(entry)
+                {
+                    return (oc_pack_open_entry(&orca->pack, &orca->fileTable, entry, &req));
+                }
+
                 //NOTE: change root to app local folder
                 req.handle = orca->rootDir;
                 req.open.flags |= OC_FILE_OPEN_RESTRICT;
             }
         }
+        else
+        {
+            oc_file_slot* slot = oc_file_slot_from_handle(&orca->fileTable, req.handle);
+            if(slot)
+            {
+                oc_pack_file* file = &orca->pack.files[slot - orca->fileTable.slots];
+                if(file->entry)
+                {
+                    return (oc_pack_file_req(file, slot, &orca->fileTable, &req));
+                }
+            }
+        }
         cmp = oc_io_wait_single_req_for_table(&req, &orca->fileTable);
     }
     else
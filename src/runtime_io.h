@@ -0,0 +1,96 @@
+/*************************************************************************
+*
+*  Orca
+*  Copyright 2023 Martin Fouilleul and the Orca project contributors
+*  See LICENSE.txt for licensing information
+*
+**************************************************************************/
+#ifndef __RUNTIME_IO_H_
+#define __RUNTIME_IO_H_
+
+#include "platform/platform_io_internal.h"
+
+//------------------------------------------------------------------------
+// Packed resources
+//------------------------------------------------------------------------
+/*NOTE:
+    When an app is bundled with --pack-resources, its data files are stored in a single archive,
+    app/data.pack, instead of as loose files under app/data. The archive is mapped into memory at
+    startup, files opened relative to the app's root directory are looked up in it first, and reads
+    are served straight from the mapping. Anything that isn't in the archive still goes through
+    app/data, so apps can keep creating and writing files there.
+
+    All values are little-endian. The archive is written by scripts/pack.py:
+
+        header      oc_pack_header
+        toc         oc_pack_entry[entryCount], sorted by pathHash
+        names       the '/'-separated path of each entry, relative to app/data
+        payloads    each aligned to its entry's alignment (the page size for large payloads)
+
+    Entries for files with identical contents share a payload. Payloads flagged OC_PACK_ENTRY_ZLIB
+    are zlib-compressed, and are expanded into a buffer of their own when the file is opened.
+*/
+
+#define OC_PACK_MAGIC "ORCAPACK"
+
+enum
+{
+    OC_PACK_VERSION = 2,
+};
+
+typedef u32 oc_pack_entry_flags;
+
+enum oc_pack_entry_flags_enum
+{
+    OC_PACK_ENTRY_ZLIB = 1 << 0,
+};
+
+typedef struct oc_pack_header
+{
+    char magic[8];
+    u32 version;
+    u32 entryCount;
+    u64 tocOffset;
+    u64 namesOffset;
+    u64 namesSize;
+    u8 key[32]; // only used by the bundler, to tell whether the pack is up to date
+
+} oc_pack_header;
+
+typedef struct oc_pack_entry
+{
+    u64 pathHash; // 64-bit FNV-1a
+    u32 nameOffset;
+    u32 nameLen;
+    u64 offset;
+    u64 length; // stored in the pack
+    u64 size;   // once expanded
+    u32 alignment;
+    oc_pack_entry_flags flags;
+
+} oc_pack_entry;
+
+typedef struct oc_pack_file
+{
+    oc_pack_entry* entry; // null if the file table slot isn't a packed file
+    char* data;           // in the mapping, or an expanded copy if the entry is compressed
+    u64 pos;
+
+} oc_pack_file;
+
+typedef struct oc_pack
+{
+    char* base;
+    u64 size;
+
+    u32 entryCount;
+    oc_pack_entry* entries;
+    oc_str8 names;
+
+    oc_pack_file files[OC_IO_MAX_FILE_SLOTS]; // indexed like the runtime's file table
+
+} oc_pack;
+
+bool oc_pack_open(oc_pack* pack, oc_str8 path);
+
+#endif //__RUNTIME_IO_H_
@@ -828,6 +828,16 @@ u64 orca_glDrawElementsIndirect_indirect_length(IM3Runtime runtime, const void*
 // Fully manual bindings
 //------------------------------------------------------------------------
 
+#if OC_BINDGEN_CAPTURE
+//NOTE: ids of the manual stubs that are captured (the others don't change GL state)
+enum
+{
+    MANUAL_GLES_CAPTURE_SHADER_SOURCE,
+    MANUAL_GLES_CAPTURE_VERTEX_ATTRIB_POINTER,
+    MANUAL_GLES_CAPTURE_VERTEX_ATTRIB_I_POINTER,
+};
+#endif
+
 const void* glShaderSource_stub(IM3Runtime runtime, IM3ImportContext _ctx, uint64_t* _sp, void* _mem)
 {
     i32 shader = *(i32*)&_sp[0];
@@ -846,6 +856,20 @@ const void* glShaderSource_stub(IM3Runtime runtime, IM3ImportContext _ctx, uint6
 
     int* lengthArray = lengthArrayOffset ? (int*)((char*)_mem + lengthArrayOffset) : 0;
 
+#if OC_BINDGEN_CAPTURE
+    if(oc_bindgen_capture_enabled())
+    {
+        oc_bindgen_capture_call(OC_BINDGEN_API_GLES_MANUAL, MANUAL_GLES_CAPTURE_SHADER_SOURCE);
+        oc_bindgen_capture_write(&shader, sizeof(shader));
+        oc_bindgen_capture_write(&count, sizeof(count));
+        for(int i = 0; i < count; i++)
+        {
+            u64 length = (lengthArray && lengthArray[i] >= 0) ? lengthArray[i] : strlen(stringArray[i]);
+            oc_bindgen_capture_buffer(stringArray[i], length);
+        }
+    }
+#endif
+
     glShaderSource(shader, count, stringArray, lengthArray);
 
     oc_scratch_end(scratch);
@@ -893,6 +917,19 @@ const void* glVertexAttribPointer_stub(IM3Runtime runtime, IM3ImportContext _ctx
         //NOTE: don't do bounds checking since pointer is really an offset in a GPU buffer
         const void* pointer = (void*)(intptr_t) * (u32*)&_sp[5];
 
+#if OC_BINDGEN_CAPTURE
+        if(oc_bindgen_capture_enabled())
+        {
+            oc_bindgen_capture_call(OC_BINDGEN_API_GLES_MANUAL, MANUAL_GLES_CAPTURE_VERTEX_ATTRIB_POINTER);
+            oc_bindgen_capture_write(&index, sizeof(index));
+            oc_bindgen_capture_write(&size, sizeof(size));
+            oc_bindgen_capture_write(&type, sizeof(type));
+            oc_bindgen_capture_write(&normalized, sizeof(normalized));
+            oc_bindgen_capture_write(&stride, sizeof(stride));
+            oc_bindgen_capture_write(&_sp[5], sizeof(u32));
+        }
+#endif
+
         glVertexAttribPointer(index, size, type, normalized, stride, pointer);
     }
     else
@@ -922,6 +959,18 @@ const void* glVertexAttribIPointer_stub(IM3Runtime runtime, IM3ImportContext _ct
         //NOTE: don't do bounds checking since pointer is really an offset in a GPU buffer
         const void* pointer = (void*)(intptr_t) * (u32*)&_sp[4];
 
+#if OC_BINDGEN_CAPTURE
+        if(oc_bindgen_capture_enabled())
+        {
+            oc_bindgen_capture_call(OC_BINDGEN_API_GLES_MANUAL, MANUAL_GLES_CAPTURE_VERTEX_ATTRIB_I_POINTER);
+            oc_bindgen_capture_write(&index, sizeof(index));
+            oc_bindgen_capture_write(&size, sizeof(size));
+            oc_bindgen_capture_write(&type, sizeof(type));
+            oc_bindgen_capture_write(&stride, sizeof(stride));
+            oc_bindgen_capture_write(&_sp[4], sizeof(u32));
+        }
+#endif
+
         glVertexAttribIPointer(index, size, type, stride, pointer);
     }
     else
@@ -1117,40 +1166,80 @@ const void* glGetStringi_stub(IM3Runtime runtime, IM3ImportContext _ctx, uint64_
     return (0);
 }
 
-int manual_link_gles_api(IM3Module module)
+#if OC_BINDGEN_CAPTURE
+void manual_gles_api_replay(u32 index, oc_bindgen_replay_reader* reader)
 {
-#define M3_LINK_ERROR_HANDLING(name)                                  \
-    if(res != m3Err_none && res != m3Err_functionLookupFailed)        \
-    {                                                                 \
-        oc_log_error("Couldn't link function " #name " (%s)\n", res); \
-        ret = -1;                                                     \
-    }
-
-    M3Result res;
-    int ret = 0;
-
-    res = m3_LinkRawFunction(module, "*", "glShaderSource", "v(iiii)", glShaderSource_stub);
-    M3_LINK_ERROR_HANDLING(glShaderSource)
-
-    res = m3_LinkRawFunction(module, "*", "glGetUniformIndices", "v(iiii)", glGetUniformIndices_stub);
-    M3_LINK_ERROR_HANDLING(glGetUniformIndices)
-
-    res = m3_LinkRawFunction(module, "*", "glGetVertexAttribPointerv", "v(iii)", glGetVertexAttribPointerv_stub);
-    M3_LINK_ERROR_HANDLING(glGetVertexAttribPointerv)
-
-    res = m3_LinkRawFunction(module, "*", "glGetString", "i(i)", glGetString_stub);
-    M3_LINK_ERROR_HANDLING(glGetGetString)
-
-    res = m3_LinkRawFunction(module, "*", "glGetStringi", "i(ii)", glGetStringi_stub);
-    M3_LINK_ERROR_HANDLING(glGetStringi)
-
-    res = m3_LinkRawFunction(module, "*", "glVertexAttribPointer", "v(iiiiii)", glVertexAttribPointer_stub);
-    M3_LINK_ERROR_HANDLING(glVertexAttribPointer)
+    switch(index)
+    {
+        case MANUAL_GLES_CAPTURE_SHADER_SOURCE:
+        {
+            GLuint shader;
+            GLsizei count;
+            oc_bindgen_replay_read(reader, &shader, sizeof(shader));
+            oc_bindgen_replay_read(reader, &count, sizeof(count));
+
+            oc_arena_scope scratch = oc_scratch_begin();
+            const char** stringArray = oc_arena_push_array(scratch.arena, const char*, count);
+            GLint* lengthArray = oc_arena_push_array(scratch.arena, GLint, count);
+            for(int i = 0; i < count; i++)
+            {
+                u64 length = 0;
+                stringArray[i] = oc_bindgen_replay_buffer(reader, &length);
+                lengthArray[i] = (GLint)length;
+            }
+            glShaderSource(shader, count, stringArray, lengthArray);
+            oc_scratch_end(scratch);
+        }
+        break;
 
-    res = m3_LinkRawFunction(module, "*", "glVertexAttribIPointer", "v(iiiii)", glVertexAttribIPointer_stub);
-    M3_LINK_ERROR_HANDLING(glVertexAttribIPointer)
+        case MANUAL_GLES_CAPTURE_VERTEX_ATTRIB_POINTER:
+        {
+            GLuint attribIndex;
+            GLint size;
+            GLenum type;
+            GLboolean normalized;
+            GLsizei stride;
+            u32 offset;
+            oc_bindgen_replay_read(reader, &attribIndex, sizeof(attribIndex));
+            oc_bindgen_replay_read(reader, &size, sizeof(size));
+            oc_bindgen_replay_read(reader, &type, sizeof(type));
+            oc_bindgen_replay_read(reader, &normalized, sizeof(normalized));
+            oc_bindgen_replay_read(reader, &stride, sizeof(stride));
+            oc_bindgen_replay_read(reader, &offset, sizeof(offset));
+            glVertexAttribPointer(attribIndex, size, type, normalized, stride, (void*)(intptr_t)offset);
+        }
+        break;
 
-#undef M3_LINK_ERROR_HANDLING
+        case MANUAL_GLES_CAPTURE_VERTEX_ATTRIB_I_POINTER:
+        {
+            GLuint attribIndex;
+            GLint size;
+            GLenum type;
+            GLsizei stride;
+            u32 offset;
+            oc_bindgen_replay_read(reader, &attribIndex, sizeof(attribIndex));
+            oc_bindgen_replay_read(reader, &size, sizeof(size));
+            oc_bindgen_replay_read(reader, &type, sizeof(type));
+            oc_bindgen_replay_read(reader, &stride, sizeof(stride));
+            oc_bindgen_replay_read(reader, &offset, sizeof(offset));
+            glVertexAttribIPointer(attribIndex, size, type, stride, (void*)(intptr_t)offset);
+        }
+        break;
 
-    return (ret);
+        default:
+            oc_bindgen_replay_fail(reader, "unknown manual gles function");
+            break;
+    }
 }
+#endif
+
+//NOTE: sorted by name, see oc_bindgen_link_imports()
+static const oc_bindgen_import manual_gles_api_imports[] = {
+    { "glGetString", "i(i)", glGetString_stub },
+    { "glGetStringi", "i(ii)", glGetStringi_stub },
+    { "glGetUniformIndices", "v(iiii)", glGetUniformIndices_stub },
+    { "glGetVertexAttribPointerv", "v(iii)", glGetVertexAttribPointerv_stub },
+    { "glShaderSource", "v(iiii)", glShaderSource_stub },
+    { "glVertexAttribIPointer", "v(iiiii)", glVertexAttribIPointer_stub },
+    { "glVertexAttribPointer", "v(iiiiii)", glVertexAttribPointer_stub },
+};
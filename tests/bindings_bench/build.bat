@@ -0,0 +1,27 @@
+@echo off
+setlocal enabledelayedexpansion
+
+set ORCA_DIR=..\..
+set STDLIB_DIR=%ORCA_DIR%\src\libc-shim
+
+set wasmFlags=--target=wasm32^
+       --no-standard-libraries ^
+       -mbulk-memory ^
+       -g -O2 ^
+       -D__ORCA__ ^
+       -Wl,--no-entry ^
+       -Wl,--export-dynamic ^
+       -isystem %STDLIB_DIR%\include ^
+       -I%ORCA_DIR%\src ^
+       -I%ORCA_DIR%\src\ext
+
+:: --batch builds liborca and the app with batched GLES calls
+if "%1"=="--batch" set wasmFlags=%wasmFlags% -DOC_GLES_BATCH=1
+
+clang %wasmFlags% -Wl,--relocatable -o .\liborca.a %ORCA_DIR%\src\orca.c %ORCA_DIR%\src\libc-shim\src\*.c
+IF %ERRORLEVEL% NEQ 0 EXIT /B %ERRORLEVEL%
+
+clang %wasmFlags% -L . -lorca -o module.wasm main.c
+IF %ERRORLEVEL% NEQ 0 EXIT /B %ERRORLEVEL%
+
+orca bundle --orca-dir %ORCA_DIR% --name BindingsBench module.wasm
@@ -0,0 +1,27 @@
+#!/bin/bash
+
+set -euo pipefail
+
+ORCA_DIR=../..
+STDLIB_DIR=$ORCA_DIR/src/libc-shim
+
+wasmFlags="--target=wasm32 \
+  --no-standard-libraries \
+  -mbulk-memory \
+  -g -O2 \
+  -D__ORCA__ \
+  -Wl,--no-entry \
+  -Wl,--export-dynamic \
+  -isystem $STDLIB_DIR/include \
+  -I $ORCA_DIR/src \
+  -I $ORCA_DIR/src/ext"
+
+# --batch builds liborca and the app with batched GLES calls
+if [ "${1:-}" == "--batch" ]; then
+  wasmFlags="$wasmFlags -DOC_GLES_BATCH=1"
+fi
+
+clang $wasmFlags -Wl,--relocatable -o ./liborca.a $ORCA_DIR/src/orca.c $STDLIB_DIR/src/*.c
+clang $wasmFlags -L . -lorca -o module.wasm main.c
+
+orca bundle --orca-dir $ORCA_DIR --name BindingsBench module.wasm
@@ -0,0 +1,136 @@
+/*************************************************************************
+*
+*  Orca
+*  Copyright 2023 Martin Fouilleul and the Orca project contributors
+*  See LICENSE.txt for licensing information
+*
+**************************************************************************/
+
+//NOTE: microbenchmark of the bindings' host stubs. Times a few GLES calls that take
+//      pointer arguments (which the stubs bounds check) against a call that takes none,
+//      logs the time per call and quits. Build with --batch to time the batched GLES calls
+//      instead (glFinish() submits the batch, so its execution is included).
+
+#include <orca.h>
+
+#define BENCH_ITERATIONS 100000
+
+typedef void (*bench_proc)(int i);
+
+oc_surface surface;
+GLuint program;
+GLint uniform;
+GLuint buffer;
+GLuint texture;
+GLfloat values[4 * 16];
+GLubyte pixels[16 * 16 * 4];
+GLint params[4];
+
+const char* vshaderSource =
+    "attribute vec4 vPosition;\n"
+    "uniform vec4 color;\n"
+    "varying vec4 vColor;\n"
+    "void main()\n"
+    "{\n"
+    "   vColor = color;\n"
+    "   gl_Position = vPosition;\n"
+    "}\n";
+
+const char* fshaderSource =
+    "precision mediump float;\n"
+    "varying vec4 vColor;\n"
+    "void main()\n"
+    "{\n"
+    "    gl_FragColor = vColor;\n"
+    "}\n";
+
+void bench_uniform4f(int i)
+{
+    glUniform4f(uniform, (float)i, 0, 0, 1);
+}
+
+void bench_uniform4fv(int i)
+{
+    values[0] = (float)i;
+    glUniform4fv(uniform, 1, values);
+}
+
+void bench_buffer_sub_data(int i)
+{
+    values[0] = (float)i;
+    glBufferSubData(GL_ARRAY_BUFFER, 0, sizeof(values), values);
+}
+
+void bench_tex_sub_image_2d(int i)
+{
+    pixels[0] = (GLubyte)i;
+    glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, 16, 16, GL_RGBA, GL_UNSIGNED_BYTE, pixels);
+}
+
+void bench_get_integerv(int i)
+{
+    glGetIntegerv(GL_VIEWPORT, params);
+}
+
+void bench(const char* name, bench_proc proc)
+{
+    //NOTE: warm up, then time
+    for(int i = 0; i < BENCH_ITERATIONS / 10; i++)
+    {
+        proc(i);
+    }
+    glFinish();
+
+    f64 start = oc_clock_time(OC_CLOCK_MONOTONIC);
+    for(int i = 0; i < BENCH_ITERATIONS; i++)
+    {
+        proc(i);
+    }
+    glFinish();
+    f64 elapsed = oc_clock_time(OC_CLOCK_MONOTONIC) - start;
+
+    oc_log_info("%s: %.1f ns/call\n", name, elapsed * 1e9 / BENCH_ITERATIONS);
+}
+
+void compile_shader(GLuint shader, const char* source)
+{
+    glShaderSource(shader, 1, &source, 0);
+    glCompileShader(shader);
+}
+
+ORCA_EXPORT void oc_on_init(void)
+{
+    oc_window_set_title(OC_STR8("bindings bench"));
+
+    surface = oc_surface_gles();
+    oc_surface_select(surface);
+
+    GLuint vshader = glCreateShader(GL_VERTEX_SHADER);
+    GLuint fshader = glCreateShader(GL_FRAGMENT_SHADER);
+    program = glCreateProgram();
+
+    compile_shader(vshader, vshaderSource);
+    compile_shader(fshader, fshaderSource);
+
+    glAttachShader(program, vshader);
+    glAttachShader(program, fshader);
+    glLinkProgram(program);
+    glUseProgram(program);
+    uniform = glGetUniformLocation(program, "color");
+
+    glGenBuffers(1, &buffer);
+    glBindBuffer(GL_ARRAY_BUFFER, buffer);
+    glBufferData(GL_ARRAY_BUFFER, sizeof(values), values, GL_DYNAMIC_DRAW);
+
+    glGenTextures(1, &texture);
+    glBindTexture(GL_TEXTURE_2D, texture);
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, 16, 16, 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels);
+
+    bench("glUniform4f (no pointer)", bench_uniform4f);
+    bench("glUniform4fv", bench_uniform4fv);
+    bench("glBufferSubData", bench_buffer_sub_data);
+    bench("glTexSubImage2D", bench_tex_sub_image_2d);
+    bench("glGetIntegerv", bench_get_integerv);
+
+    oc_request_quit();
+}
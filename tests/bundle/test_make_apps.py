@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+from argparse import ArgumentParser
+from unittest import mock
+
+from scripts import bundle, log
+
+
+class MakeAppsTest(unittest.TestCase):
+    # Bundling a --manifest with apps that fail, one by raising and one by exiting,
+    # still bundles the others and reports which ones failed.
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(log.errors.clear)
+        self.addCleanup(log.finish_reports.clear)
+
+    def make_args(self, names):
+        manifest = os.path.join(self.tmp.name, "apps.json")
+        with open(manifest, "w") as f:
+            json.dump([{"name": name, "module": f"{name}.wasm"} for name in names], f)
+
+        parser = ArgumentParser()
+        bundle.init_parser(parser)
+        return parser.parse_args([
+            "--manifest", manifest,
+            "--out-dir", self.tmp.name,
+            "--report", os.path.join(self.tmp.name, "report.json"),
+            "--jobs", "2",
+        ])
+
+    def test_failing_apps_dont_stop_the_others(self):
+        bundled = []
+
+        def bundle_app(app):
+            if app.name == "raises":
+                raise bundle.BundleError("no icon")
+            if app.name == "exits":
+                exit(1)
+            bundled.append(app.name)
+            return {"phases": {}, "files": []}
+
+        args = self.make_args(["first", "raises", "exits", "last"])
+        with mock.patch.object(bundle, "bundle_app", side_effect=bundle_app), \
+             mock.patch.object(bundle.platform, "system", return_value="Darwin"):
+            with self.assertRaises(SystemExit) as exited:
+                bundle.make_apps(args)
+
+        self.assertEqual(exited.exception.code, 1)
+        self.assertEqual(sorted(bundled), ["first", "last"])
+
+        failures = [entry.msgs[0] for entry in log.errors]
+        self.assertEqual(len(failures), 2)
+        self.assertIn("failed to bundle raises: no icon", failures[0])
+        self.assertIn("failed to bundle exits: exited with code 1", failures[1])
+
+        with open(args.report, "r") as f:
+            report = json.load(f)
+        self.assertEqual(sorted(app["name"] for app in report["apps"]), ["first", "last"])
+
+
+if __name__ == "__main__":
+    unittest.main()